@@ -0,0 +1,333 @@
+"""
+Knowledge-base compaction and eviction for generated articles
+
+Every analyzed claim can add a row to knowledge_base: an "auto-generated"
+article from the classifier and a "fact-check" from the backend. Left alone
+the table, its HNSW index and so match_articles latency grow with traffic.
+This job, meant to run from cron, works in three passes over generated rows
+only (curated articles are never touched):
+
+1. Collapse: articles of the same source type with the same normalized title
+   or near-identical embeddings form a cluster. The most valuable article of
+   each cluster is kept and inherits the others' retrieval hits; the rest are
+   deleted.
+2. Evict: unverified articles older than the minimum age that were retrieved
+   at most KB_EVICT_MAX_HITS times are deleted.
+3. Trim: while the table is above the target size, the lowest-value articles
+   are deleted. Value is retrieval hits, halved for every half-life since the
+   article was last retrieved, and weighted up when verified.
+
+Runs as a dry run unless --apply is given. match_articles latency is measured
+with the same sample queries before and after. With --apply it also creates
+the knowledge_base date partitions for the coming quarters, so inserts never
+land in the catch-all default partitions.
+
+Usage (from ai-service/):
+    python -m app.kb_maintenance
+    python -m app.kb_maintenance --apply --target-size 200000
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.services.kb_dedup import DEDUP_EMBEDDING_THRESHOLD, normalize_title
+from app.services.rag_system import KB_VECTOR_SEARCH, parse_embedding, vector_literal
+
+logger = logging.getLogger(__name__)
+
+# Source types written per analyzed claim; everything else is curated
+GENERATED_SOURCE_TYPES = os.getenv("KB_GENERATED_SOURCE_TYPES", "auto-generated,fact-check").split(",")
+# Table size to trim to; 0 disables the trim pass
+KB_TARGET_SIZE = int(os.getenv("KB_TARGET_SIZE", "0"))
+# Articles younger than this are never evicted for lack of hits
+KB_EVICT_MIN_AGE_DAYS = float(os.getenv("KB_EVICT_MIN_AGE_DAYS", "30"))
+# Unverified articles retrieved at most this many times are evicted once old enough
+KB_EVICT_MAX_HITS = int(os.getenv("KB_EVICT_MAX_HITS", "0"))
+# Days after which an unused article's retrieval hits count half
+KB_VALUE_HALF_LIFE_DAYS = float(os.getenv("KB_VALUE_HALF_LIFE_DAYS", "30"))
+# Value multiplier for verified articles
+KB_VERIFIED_WEIGHT = float(os.getenv("KB_VERIFIED_WEIGHT", "4"))
+
+PAGE_SIZE = 1000
+# Ids per DELETE; each id adds ~40 bytes to the request URL
+DELETE_BATCH = 200
+# Articles compared against the kept ones per matrix product
+CLUSTER_BLOCK = 1024
+# Same arguments as RAGSystem.search_by_embedding (in the configured KB_VECTOR_SEARCH mode)
+MATCH_THRESHOLD = 0.7
+MATCH_COUNT = 5
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def article_value(article: Dict[str, Any], now: datetime) -> float:
+    """Worth of keeping an article; higher survives clustering and trimming."""
+    last_used = article["last_retrieved_at"] or article["created_at"]
+    idle_days = max(0.0, (now - last_used).total_seconds() / 86400)
+    value = (1 + article["retrieval_hits"]) * 0.5 ** (idle_days / KB_VALUE_HALF_LIFE_DAYS)
+    return value * KB_VERIFIED_WEIGHT if article["verified"] else value
+
+
+def load_generated_articles(client) -> List[Dict[str, Any]]:
+    """Every generated article with its embedding, paged by id (keyset, not offset)."""
+    articles = []
+    for source_type in GENERATED_SOURCE_TYPES:
+        last_id = None
+        while True:
+            query = (
+                client.table("knowledge_base")
+                .select("id, title, source_type, verified, retrieval_hits, last_retrieved_at, created_at, embedding")
+                .eq("source_type", source_type)
+                .order("id")
+                .limit(PAGE_SIZE)
+            )
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.execute().data or []
+            for row in rows:
+                articles.append({
+                    "id": str(row["id"]),
+                    "title": row.get("title") or "",
+                    "source_type": source_type,
+                    "verified": bool(row.get("verified")),
+                    "retrieval_hits": int(row.get("retrieval_hits") or 0),
+                    "last_retrieved_at": _parse_time(row.get("last_retrieved_at")),
+                    "created_at": _parse_time(row.get("created_at")) or datetime.now(timezone.utc),
+                    "embedding": parse_embedding(row.get("embedding")),
+                })
+            if len(rows) < PAGE_SIZE:
+                break
+            last_id = rows[-1]["id"]
+    return articles
+
+
+def cluster_duplicates(articles: List[Dict[str, Any]], threshold: float) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Greedy clustering in descending value order: an article joins the first kept
+    article of its source type with the same normalized title or an embedding
+    similarity at or above the threshold, and is kept itself otherwise.
+    Articles without an embedding are matched by title only. Articles must
+    carry a precomputed "value".
+
+    Returns:
+        Kept article id -> the duplicates collapsed into it (only non-empty clusters).
+    """
+    clusters: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    by_type: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for article in articles:
+        by_type[article["source_type"]].append(article)
+
+    for group in by_type.values():
+        group.sort(key=lambda a: a["value"], reverse=True)
+        titles: Dict[str, str] = {}
+        kept_ids: List[str] = []
+        kept_vectors = np.zeros((0, 0), dtype=np.float32)
+        for start in range(0, len(group), CLUSTER_BLOCK):
+            block = group[start:start + CLUSTER_BLOCK]
+            with_vectors = [a for a in block if a["embedding"] is not None]
+            if with_vectors and kept_vectors.shape[1] == 0:
+                kept_vectors = np.zeros((0, with_vectors[0]["embedding"].shape[0]), dtype=np.float32)
+            vectors = _unit(np.stack([a["embedding"] for a in with_vectors])) if with_vectors else None
+            row_of = {id(a): i for i, a in enumerate(with_vectors)}
+            # Similarities to articles kept in earlier blocks, in one matrix product
+            earlier = vectors @ kept_vectors.T if vectors is not None and len(kept_ids) else None
+            block_kept: List[int] = []  # rows of `vectors` kept within this block
+            earlier_count = len(kept_ids)
+
+            for article in block:
+                leader = titles.get(normalize_title(article["title"]))
+                row = row_of.get(id(article))
+                if leader is None and row is not None:
+                    if earlier is not None:
+                        best = int(np.argmax(earlier[row]))
+                        if earlier[row, best] >= threshold:
+                            leader = kept_ids[best]
+                    if leader is None and block_kept:
+                        similarities = vectors[block_kept] @ vectors[row]
+                        best = int(np.argmax(similarities))
+                        if similarities[best] >= threshold:
+                            leader = kept_ids[earlier_count + best]
+                if leader is not None:
+                    clusters[leader].append(article)
+                    continue
+                titles.setdefault(normalize_title(article["title"]), article["id"])
+                if row is not None:
+                    block_kept.append(row)
+                    kept_ids.append(article["id"])
+
+            if block_kept:
+                kept_vectors = np.vstack([kept_vectors, vectors[block_kept]])
+    return dict(clusters)
+
+
+def plan(articles: List[Dict[str, Any]], total_rows: int, target_size: int, now: datetime,
+         threshold: float = DEDUP_EMBEDDING_THRESHOLD) -> Dict[str, Any]:
+    """
+    Decides what to delete without touching the database.
+
+    Args:
+        articles: Generated articles from load_generated_articles.
+        total_rows: Current size of the whole table, curated articles included.
+        target_size: Size to trim to; 0 skips trimming.
+        now: Reference time for ages.
+        threshold: Embedding similarity at which two articles are duplicates.
+
+    Returns:
+        {"merges": {kept id: [duplicates]}, "evict": [articles], "trim": [articles], "remaining": rows left}
+    """
+    for article in articles:
+        article["value"] = article_value(article, now)
+    clusters = cluster_duplicates(articles, threshold)
+    collapsed = {a["id"] for members in clusters.values() for a in members}
+    survivors = [a for a in articles if a["id"] not in collapsed]
+    merged_hits = {leader: sum(a["retrieval_hits"] for a in members) for leader, members in clusters.items()}
+
+    evict = []
+    for article in survivors:
+        age_days = (now - article["created_at"]).total_seconds() / 86400
+        hits = article["retrieval_hits"] + merged_hits.get(article["id"], 0)
+        if not article["verified"] and hits <= KB_EVICT_MAX_HITS and age_days >= KB_EVICT_MIN_AGE_DAYS:
+            evict.append(article)
+    evicted = {a["id"] for a in evict}
+
+    remaining = total_rows - len(collapsed) - len(evict)
+    trim = []
+    if target_size and remaining > target_size:
+        candidates = sorted((a for a in survivors if a["id"] not in evicted), key=lambda a: a["value"])
+        trim = candidates[:remaining - target_size]
+        remaining -= len(trim)
+    return {"merges": clusters, "evict": evict, "trim": trim, "remaining": remaining}
+
+
+def apply_plan(client, actions: Dict[str, Any]) -> None:
+    """Moves collapsed articles' hits to the kept article, then deletes in batches."""
+    for leader_id, members in actions["merges"].items():
+        hits = sum(a["retrieval_hits"] for a in members)
+        if hits:
+            leader = client.table("knowledge_base").select("retrieval_hits").eq("id", leader_id).execute().data
+            if leader:
+                client.table("knowledge_base").update(
+                    {"retrieval_hits": int(leader[0]["retrieval_hits"] or 0) + hits}
+                ).eq("id", leader_id).execute()
+
+    doomed = [a["id"] for members in actions["merges"].values() for a in members]
+    doomed += [a["id"] for a in actions["evict"]] + [a["id"] for a in actions["trim"]]
+    for start in range(0, len(doomed), DELETE_BATCH):
+        client.table("knowledge_base").delete().in_("id", doomed[start:start + DELETE_BATCH]).execute()
+        logger.info(f"Deleted {min(start + DELETE_BATCH, len(doomed))}/{len(doomed)} articles")
+
+
+def measure_search_latency(client, queries: List[np.ndarray]) -> Dict[str, float]:
+    """match_articles latency in milliseconds over the given query embeddings."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        client.rpc("match_articles", {
+            "query_embedding": vector_literal(query),
+            "match_threshold": MATCH_THRESHOLD,
+            "match_count": MATCH_COUNT,
+            "search_mode": KB_VECTOR_SEARCH
+        }).execute()
+        latencies.append((time.perf_counter() - start) * 1000)
+    if not latencies:
+        return {}
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 1),
+        "mean_ms": round(statistics.fmean(latencies), 1),
+    }
+
+
+def count_rows(client) -> int:
+    return client.table("knowledge_base").select("id", count="exact").limit(1).execute().count or 0
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def _summary(actions: Dict[str, Any], total_rows: int, generated: int) -> List[Tuple[str, Any]]:
+    collapsed = sum(len(members) for members in actions["merges"].values())
+    return [
+        ("rows", total_rows),
+        ("generated_rows", generated),
+        ("clusters_collapsed", len(actions["merges"])),
+        ("duplicates_deleted", collapsed),
+        ("evicted_unused", len(actions["evict"])),
+        ("trimmed_low_value", len(actions["trim"])),
+        ("rows_after", actions["remaining"]),
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="Delete and update rows (default: report only)")
+    parser.add_argument("--target-size", type=int, default=KB_TARGET_SIZE, help="Rows to trim the table to (0: no trim)")
+    parser.add_argument("--similarity", type=float, default=DEDUP_EMBEDDING_THRESHOLD,
+                        help="Embedding similarity at which two articles are duplicates")
+    parser.add_argument("--latency-queries", type=int, default=50, help="match_articles calls per latency measurement")
+    parser.add_argument("--json", default="", help="Write the report to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    load_dotenv()
+    from supabase import create_client
+
+    client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+    total_rows = count_rows(client)
+    articles = load_generated_articles(client)
+    print(f"{total_rows} knowledge-base rows, {len(articles)} generated ({', '.join(GENERATED_SOURCE_TYPES)})")
+
+    # Stored embeddings double as realistic claim queries
+    with_vectors = [a["embedding"] for a in articles if a["embedding"] is not None]
+    queries = random.Random(0).sample(with_vectors, min(args.latency_queries, len(with_vectors)))
+    before = measure_search_latency(client, queries)
+
+    actions = plan(articles, total_rows, args.target_size, datetime.now(timezone.utc), args.similarity)
+    report: Dict[str, Any] = dict(_summary(actions, total_rows, len(articles)))
+    report["applied"] = args.apply
+    report["search_latency_before"] = before
+    if args.target_size and actions["remaining"] > args.target_size:
+        print(f"Only generated articles are trimmed; {actions['remaining']} rows remain above the target of {args.target_size}")
+
+    if args.apply:
+        apply_plan(client, actions)
+        client.rpc("ensure_knowledge_base_partitions", {}).execute()
+        report["rows_after"] = count_rows(client)
+        report["search_latency_after"] = measure_search_latency(client, queries)
+
+    for key, value in report.items():
+        print(f"{key:28s} {value}")
+    if args.apply:
+        print("Run VACUUM ANALYZE public.knowledge_base so the HNSW index and planner drop the deleted rows.")
+    else:
+        print("Dry run; pass --apply to delete.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
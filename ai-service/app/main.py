@@ -5,10 +5,16 @@ TruthGuard AI Service
 AI microservice for content analysis, OCR, transcription, and fact-checking
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
+import numpy as np
 
 # Load environment variables first
 load_dotenv()
@@ -16,13 +22,25 @@ load_dotenv()
 # 1. Models are now imported from a central schemas file
 from app.models.schemas import (
     AnalysisRequest, AnalysisResponse, OCRRequest,
-    TranscriptionRequest, RAGRequest
+    TranscriptionRequest, RAGRequest, BatchAnalysisRequest, BatchAnalysisItem
 )
 
 # Import services
-from app.services.content_extraction import OCRService, TranscriptionService
+from app.services.content_extraction import OCRService, TranscriptionService, local_file_path
 from app.services.rag_system import RAGSystem
-from app.services.claim_classifier import ClaimClassifier
+from app.services.claim_classifier import ClaimClassifier, WebSearchCache
+from app.services.prior_analysis import PriorAnalysisIndex
+from app.services.reranker import RERANK_ENABLED, CrossEncoderReranker
+from app.services.singleflight import SingleFlight, fingerprint, file_fingerprint, normalize_text
+from app.services.admission import AdmissionRejected, admission_stats
+from app.services.deadline import DeadlineExceeded, DeadlineMiddleware, check_deadline
+from app.services.metrics import REGISTRY, HTTP_LATENCY, track_stage, record_cache_lookup
+from app.services.pipeline_context import PipelineContext, activate, deactivate
+
+# Default cap on concurrent LLM calls within one /analyze-batch request
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+# Cosine similarity above which two claims in a batch share one analysis
+BATCH_DEDUP_THRESHOLD = float(os.getenv("BATCH_DEDUP_THRESHOLD", "0.95"))
 
 
 # Initialize FastAPI app
@@ -35,15 +53,150 @@ app = FastAPI(
 # 2. A dictionary to hold the services once they are loaded on startup
 services = {}
 
+# In-flight request coalescing, one group per expensive operation
+flights = {
+    "analyze": SingleFlight("analyze"),
+    "ocr": SingleFlight("ocr"),
+    "transcribe": SingleFlight("transcribe"),
+    "search": SingleFlight("search")
+}
+
+def _component_metrics():
+    """Reports counters owned by the coalescing groups, the prior-analysis index and the LLM router."""
+    yield ("truthguard_coalesced_requests_total", "counter",
+           "Requests that waited on an identical in-flight execution.",
+           [("truthguard_coalesced_requests_total", {"operation": name}, f.coalesced) for name, f in flights.items()])
+    yield ("truthguard_coalesced_executions_total", "counter",
+           "Executions started by the first request for a fingerprint.",
+           [("truthguard_coalesced_executions_total", {"operation": name}, f.executed) for name, f in flights.items()])
+    yield ("truthguard_startup_seconds", "gauge",
+           "Time taken to load each model component at startup.",
+           [("truthguard_startup_seconds", {"component": name}, seconds) for name, seconds in startup_state["timings"].items()])
+    if "prior" in services:
+        prior = services["prior"].stats()
+        yield ("truthguard_prior_analysis_entries", "gauge",
+               "Analyses held in the prior-analysis index.",
+               [("truthguard_prior_analysis_entries", {}, prior["entries"])])
+        yield ("truthguard_prior_analysis_forced_total", "counter",
+               "Lookups skipped because re-analysis was forced.",
+               [("truthguard_prior_analysis_forced_total", {}, prior["forced_reanalysis"])])
+
+    if "classifier" in services:
+        yield from services["classifier"].llm_router.collect_metrics()
+
+REGISTRY.register_collector(_component_metrics)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Overloaded stages fail fast with 429 so callers can back off and retry."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "stage": exc.stage, "reason": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    """The caller's deadline passed mid-pipeline; stop instead of finishing work nobody will read."""
+    return JSONResponse(status_code=504, content={"detail": str(exc), "stage": exc.stage})
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observes per-route latency; routes are labelled by template to keep cardinality low."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code)
+        )
+
+# Registered last so it is the outermost layer: applies X-Request-Deadline and
+# cancels the whole stack when the client disconnects or time runs out
+app.add_middleware(DeadlineMiddleware)
+
+# Heavy components load in background threads so the process is live immediately.
+# Each entry maps a service name to the factory that builds it.
+MODEL_LOADERS = {
+    "ocr": OCRService,
+    "transcription": TranscriptionService,
+    "rag": RAGSystem
+}
+if RERANK_ENABLED:
+    MODEL_LOADERS["reranker"] = CrossEncoderReranker
+# Services each kind of claim needs before it can be analyzed
+CAPABILITIES = {
+    "text": ("rag", "classifier"),
+    "image": ("rag", "classifier", "ocr"),
+    "video": ("rag", "classifier", "transcription")
+}
+CAPABILITIES["url"] = CAPABILITIES["text"]
+
+startup_state = {"started_at": None, "timings": {}, "errors": {}, "tasks": {}}
+
+def _load_component(name: str) -> None:
+    """Builds one service in a worker thread and records how long it took."""
+    start = time.perf_counter()
+    try:
+        component = MODEL_LOADERS[name]()
+    except Exception as e:
+        startup_state["errors"][name] = str(e)
+        print(f"AI Service: Failed to load {name}: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    services[name] = component
+    startup_state["timings"][name] = round(elapsed, 3)
+    if name == "rag" and "classifier" in services:
+        services["classifier"].rag_system = component
+    if name == "reranker" and "classifier" in services:
+        services["classifier"].reranker = component
+    print(f"AI Service: {name} ready in {elapsed:.2f}s")
+
 @app.on_event("startup")
 async def startup_event():
-    """Load heavy AI models when the application starts."""
+    """Start loading heavy AI models concurrently; the API is live while they load."""
     print("AI Service: Loading AI models...")
-    services["ocr"] = OCRService()
-    services["transcription"] = TranscriptionService()
-    services["rag"] = RAGSystem()
-    services["classifier"] = ClaimClassifier()
-    print("AI Service: Models loaded successfully.")
+    startup_state["started_at"] = time.perf_counter()
+    # Cheap components are available immediately
+    services["classifier"] = ClaimClassifier(rag_system=services.get("rag"), reranker=services.get("reranker"))
+    services["prior"] = PriorAnalysisIndex()
+
+    loop = asyncio.get_event_loop()
+    executor = ThreadPoolExecutor(max_workers=len(MODEL_LOADERS), thread_name_prefix="model-loader")
+    for name in MODEL_LOADERS:
+        if name not in services:
+            startup_state["tasks"][name] = loop.run_in_executor(executor, _load_component, name)
+    executor.shutdown(wait=False)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if "classifier" in services:
+        await services["classifier"].llm_router.close()
+
+def _missing_services(capability: str) -> List[str]:
+    return [name for name in CAPABILITIES.get(capability, CAPABILITIES["text"]) if name not in services]
+
+def _require_services(names, purpose: str) -> None:
+    """Rejects a request with 503 while the models it needs are still loading."""
+    missing = [name for name in names if name not in services]
+    if not missing:
+        return
+    failed = [name for name in missing if name in startup_state["errors"]]
+    if failed:
+        detail = f"Service cannot handle {purpose}: failed to load {', '.join(failed)}"
+    else:
+        detail = f"Service not ready for {purpose}: waiting for {', '.join(missing)}"
+    raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+def _require_capability(capability: str) -> None:
+    _require_services(CAPABILITIES.get(capability, CAPABILITIES["text"]), f"{capability} claims")
 
 @app.get("/")
 async def root():
@@ -56,58 +209,335 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check to confirm models are loaded"""
+    """Detailed health check: liveness, per-capability readiness and model load timings"""
+    loading = [name for name in MODEL_LOADERS if name not in services and name not in startup_state["errors"]]
     return {
         "status": "healthy",
+        "live": True,
+        "ready": {capability: not _missing_services(capability) for capability in CAPABILITIES},
         "services": {
-            "ocr": "loaded" if "ocr" in services else "unavailable",
-            "transcription": "loaded" if "transcription" in services else "unavailable",
-            "rag": "loaded" if "rag" in services else "unavailable",
-            "classifier": "loaded" if "classifier" in services else "unavailable"
-        }
+            name: "loaded" if name in services
+            else "failed" if name in startup_state["errors"]
+            else "loading"
+            for name in list(MODEL_LOADERS) + ["classifier"]
+        },
+        "loading": loading,
+        "startup_seconds": startup_state["timings"],
+        "startup_errors": startup_state["errors"]
     }
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving HTTP"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(capability: str = "text"):
+    """Readiness probe for one capability (text, url, image or video); 503 until its models load"""
+    missing = _missing_services(capability)
+    if missing:
+        return JSONResponse(status_code=503, content={"ready": False, "capability": capability, "waiting_for": missing})
+    return {"ready": True, "capability": capability}
+
+async def _extract_content(ctx: PipelineContext) -> None:
+    """Adds OCR or transcription text from the attached file to the claim text."""
+    # 3. CRITICAL CHANGE: Use file_url instead of file_path
+    if ctx.content_type == "image" and ctx.file_url:
+        ctx.set_extracted("Extracted text from image", await _extract_text_coalesced(ctx.file_url))
+
+    elif ctx.content_type == "video" and ctx.file_url:
+        ctx.set_extracted("Transcription from video", await _transcribe_coalesced(ctx.file_url))
+
+def _file_key(file_ref: str) -> str:
+    """Coalescing key part for an attached file; rejects local paths outside LOCAL_FILE_DIR with 400."""
+    try:
+        local_file_path(file_ref)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return file_fingerprint(file_ref)
+
+async def _extract_text_coalesced(image_url: str) -> str:
+    key = fingerprint(_file_key(image_url))
+    return await flights["ocr"].do(key, lambda: services["ocr"].extract_text(image_url))
+
+async def _transcribe_coalesced(video_url: str) -> str:
+    key = fingerprint(_file_key(video_url))
+    return await flights["transcribe"].do(key, lambda: services["transcription"].transcribe(video_url))
+
+async def _embed_claim(ctx: PipelineContext) -> None:
+    """Embeds the claim once so the prior lookup, retrieval and auto-KB insert can share it."""
+    rag = services["rag"]
+    if not rag.embeddings_enabled:
+        return
+    try:
+        ctx.embedding = await rag.embed(ctx.text)
+    except (AdmissionRejected, DeadlineExceeded):
+        raise
+    except Exception as e:
+        print(f"ERROR embedding claim: {e}")
+
+def _match_prior_analysis(ctx: PipelineContext) -> Optional[AnalysisResponse]:
+    """Returns a stored analysis for a near-identical claim, unless re-analysis is forced."""
+    if ctx.embedding is None:
+        return None
+    if ctx.force_reanalysis:
+        services["prior"].record_forced()
+        return None
+    with track_stage("prior_lookup"):
+        match = services["prior"].lookup(ctx.embedding)
+    record_cache_lookup("prior_analysis", match is not None)
+    if match is None:
+        return None
+    result, prior_claim_id, similarity = match
+    result["matched_prior_analysis"] = {"claim_id": prior_claim_id, "similarity": similarity}
+    return AnalysisResponse(**result)
+
+def _retrieval_count() -> int:
+    """Knowledge-base articles to fetch: extra candidates when a reranker will trim them."""
+    reranker = services["classifier"].reranker
+    return reranker.candidates if reranker is not None else 5
+
+async def _retrieve(ctx: PipelineContext) -> None:
+    """Fetches knowledge-base articles and the nearest prior verdicts for the claim."""
+    rag = services["rag"]
+    if ctx.embedding is not None:
+        ctx.retrieved = await rag.search_by_embedding(ctx.embedding, _retrieval_count())
+    else:
+        ctx.retrieved = await rag.search_similar(ctx.text, _retrieval_count())
+    # Verdicts of the nearest prior analyses, for the classifier's fast path
+    if ctx.embedding is not None and not ctx.force_reanalysis:
+        ctx.prior_neighbours = services["prior"].nearest(ctx.embedding, services["classifier"].fast_path.neighbours)
+
+def _remember_analysis(ctx: PipelineContext, result: Dict) -> None:
+    # Fast-path verdicts are not fed back, so the index only votes with full analyses
+    if ctx.embedding is not None and not result.get("fast_path"):
+        services["prior"].add(ctx.claim_id, ctx.embedding, result)
+
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_claim(request: AnalysisRequest):
     """Main analysis endpoint - processes claims through the full AI pipeline"""
     try:
-        content = request.content
-        
-        # 3. CRITICAL CHANGE: Use file_url instead of file_path
-        if request.content_type == "image" and request.file_url:
-            extracted_text = await services["ocr"].extract_text(request.file_url)
-            content = f"{content}\n\nExtracted text from image: {extracted_text}"
-            
-        elif request.content_type == "video" and request.file_url:
-            transcription = await services["transcription"].transcribe(request.file_url)
-            content = f"{content}\n\nTranscription from video: {transcription}"
-        
-        # Step 2: Retrieve relevant information using RAG
-        relevant_articles = await services["rag"].search_similar(content)
-        
-        # Step 3: Classify and analyze the claim
-        analysis_result = await services["classifier"].analyze_claim(
-            claim_text=content,
-            retrieved_context=relevant_articles
+        ctx = PipelineContext.from_request(request)
+        _require_capability(request.content_type)
+        # Identical concurrent submissions wait on a single pipeline execution;
+        # the file only counts for content types that read it
+        uses_file = request.content_type in ("image", "video") and request.file_url
+        key = fingerprint(
+            ctx.normalized_text,
+            request.content_type,
+            _file_key(request.file_url) if uses_file else "",
+            request.force_reanalysis
         )
-        
-        return AnalysisResponse(**analysis_result)
-        
+        return await flights["analyze"].do(key, lambda: _run_analysis(ctx))
+    except (HTTPException, AdmissionRejected, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"ERROR in /analyze: {e}") 
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@track_stage("analyze_pipeline")
+async def _run_analysis(ctx: PipelineContext) -> AnalysisResponse:
+    """Runs the OCR/transcription -> RAG -> LLM pipeline for one request."""
+    token = activate(ctx)
+    try:
+        check_deadline("extract")
+        with track_stage("extract"):
+            await _extract_content(ctx)
+
+        # Step 1b: Short-circuit paraphrases of claims we already analyzed
+        await _embed_claim(ctx)
+        prior_response = _match_prior_analysis(ctx)
+        if prior_response is not None:
+            return prior_response
+
+        # Step 2: Retrieve relevant information using RAG
+        check_deadline("retrieval")
+        await _retrieve(ctx)
+
+        # Step 3: Classify and analyze the claim
+        check_deadline("classify")
+        with track_stage("classify"):
+            analysis_result = await services["classifier"].analyze_claim(ctx)
+
+        _remember_analysis(ctx, analysis_result)
+        return AnalysisResponse(**analysis_result)
+    finally:
+        deactivate(token)
+        ctx.dump()
+
+def _group_near_duplicates(contents: List[str], embeddings: Optional[np.ndarray], threshold: float) -> List[int]:
+    """
+    Maps every claim to the index of the claim whose analysis it can reuse.
+    Unique claims map to themselves. Exact matches are found on normalized text,
+    near matches by cosine similarity of the claim embeddings.
+    """
+    representatives = list(range(len(contents)))
+    by_text: Dict[str, int] = {}
+    kept: List[int] = []
+    unit = None
+    if embeddings is not None:
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        unit = embeddings / np.clip(norms, 1e-12, None)
+
+    for i, text in enumerate(contents):
+        key = normalize_text(text)
+        if key in by_text:
+            representatives[i] = by_text[key]
+            continue
+        if unit is not None and kept:
+            similarities = unit[kept] @ unit[i]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                representatives[i] = kept[best]
+                by_text[key] = kept[best]
+                continue
+        by_text[key] = i
+        kept.append(i)
+    return representatives
+
+@app.post("/analyze-batch")
+async def analyze_batch(batch: BatchAnalysisRequest):
+    """
+    Batch analysis endpoint for bulk submissions.
+    Claims are embedded together, duplicates are analyzed once, web searches are
+    shared across the batch and LLM calls are capped. Results stream back as
+    newline-delimited JSON, one BatchAnalysisItem per claim, in completion order.
+    """
+    _require_capability("text")
+    requests = batch.requests
+    max_concurrency = batch.max_concurrency or BATCH_LLM_CONCURRENCY
+    llm_slots = asyncio.Semaphore(max_concurrency)
+    extraction_slots = asyncio.Semaphore(max_concurrency)
+    search_cache = WebSearchCache()
+    rag = services["rag"]
+
+    def line(item: BatchAnalysisItem) -> str:
+        return item.model_dump_json() + "\n"
+
+    async def extract(ctx: PipelineContext) -> None:
+        _require_capability(ctx.content_type)
+        async with extraction_slots:
+            token = activate(ctx)
+            try:
+                await _extract_content(ctx)
+            finally:
+                deactivate(token)
+
+    async def stream():
+        # Step 1: Pull text out of attached media
+        ctxs = [PipelineContext.from_request(r) for r in requests]
+        extracted = await asyncio.gather(*(extract(ctx) for ctx in ctxs), return_exceptions=True)
+        positions = []
+        for i, outcome in enumerate(extracted):
+            if isinstance(outcome, AdmissionRejected):
+                yield line(BatchAnalysisItem(claim_id=requests[i].claim_id, error=str(outcome), retry_after=outcome.retry_after))
+            elif isinstance(outcome, DeadlineExceeded):
+                yield line(BatchAnalysisItem(claim_id=requests[i].claim_id, error=str(outcome)))
+            elif isinstance(outcome, BaseException):
+                print(f"ERROR in /analyze-batch extraction for {requests[i].claim_id}: {outcome}")
+                yield line(BatchAnalysisItem(claim_id=requests[i].claim_id, error=f"Extraction failed: {outcome}"))
+            else:
+                positions.append(i)
+        contexts = [ctxs[i] for i in positions]
+        contents = [ctx.text for ctx in contexts]
+        if not contents:
+            return
+
+        # Step 2: Embed every claim in one pass and collapse duplicates
+        embeddings = None
+        if rag.embeddings_enabled:
+            try:
+                embeddings = await rag.embed_batch(contents)
+            except Exception as e:
+                print(f"ERROR in /analyze-batch embedding: {e}")
+        if embeddings is not None:
+            for ctx, embedding in zip(contexts, embeddings):
+                ctx.embedding = embedding
+        representatives = _group_near_duplicates(contents, embeddings, BATCH_DEDUP_THRESHOLD)
+        duplicates: Dict[int, List[int]] = {}
+        for k, rep in enumerate(representatives):
+            if rep != k:
+                duplicates.setdefault(rep, []).append(k)
+
+        # Step 3: Retrieve and classify each unique claim
+        async def analyze_one(k: int):
+            ctx = contexts[k]
+            token = activate(ctx)
+            try:
+                prior_response = _match_prior_analysis(ctx)
+                if prior_response is not None:
+                    return k, prior_response, None, None
+                await _retrieve(ctx)
+                analysis_result = await services["classifier"].analyze_claim(
+                    ctx, search_cache=search_cache, llm_slots=llm_slots
+                )
+                _remember_analysis(ctx, analysis_result)
+                return k, AnalysisResponse(**analysis_result), None, None
+            except AdmissionRejected as e:
+                return k, None, str(e), e.retry_after
+            except DeadlineExceeded as e:
+                return k, None, str(e), None
+            except Exception as e:
+                print(f"ERROR in /analyze-batch for {ctx.claim_id}: {e}")
+                return k, None, f"Analysis failed: {e}", None
+            finally:
+                deactivate(token)
+                ctx.dump()
+
+        tasks = [asyncio.ensure_future(analyze_one(k)) for k, rep in enumerate(representatives) if rep == k]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                k, response, error, retry_after = await next_done
+                claim_id = requests[positions[k]].claim_id
+                yield line(BatchAnalysisItem(claim_id=claim_id, result=response, error=error, retry_after=retry_after))
+                for dup in duplicates.get(k, []):
+                    yield line(BatchAnalysisItem(
+                        claim_id=requests[positions[dup]].claim_id,
+                        result=response,
+                        error=error,
+                        retry_after=retry_after,
+                        duplicate_of=claim_id
+                    ))
+        finally:
+            # Stop outstanding work if the client goes away mid-stream
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/stats")
+async def pipeline_stats():
+    """Runtime counters for the analysis pipeline's shortcut stages"""
+    return {
+        "prior_analysis": services["prior"].stats() if "prior" in services else None,
+        "coalescing": {name: flight.stats() for name, flight in flights.items()},
+        "admission": admission_stats(),
+        "llm": services["classifier"].llm_router.stats() if "classifier" in services else None,
+        "fast_path": services["classifier"].fast_path.stats() if "classifier" in services else None,
+        "rerank": services["reranker"].stats() if "reranker" in services else None,
+        "kb_dedup": services["rag"].dedup.stats() if "rag" in services else None,
+        "embeddings": services["rag"].embedding_stats() if "rag" in services else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, in-flight gauges, error counters and cache ratios"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 class AddArticleRequest(BaseModel):
     title: str
     content: str
     source_url: Optional[str] = None
     source_type: str = "fact-check"
     verified: bool = True
+    verdict: Optional[str] = None # Verdict of the claim this fact-check covers; lets the fast path reuse it
+    claim_id: Optional[str] = None # That claim, so the fast path counts its analysis once
 
 @app.post("/add-article")
 async def add_knowledge_base_article(request: AddArticleRequest):
     """Adds a new article to the RAG system's knowledge base."""
     try:
+        _require_services(["rag"], "knowledge base updates")
         success = await services["rag"].add_article(request.model_dump())
         if not success:
             # Let FastAPI propagate a clear error instead of swallowing it later
@@ -116,6 +546,8 @@ async def add_knowledge_base_article(request: AddArticleRequest):
     except HTTPException as he:
         # Preserve original HTTPException details (avoids empty detail)
         raise he
+    except (AdmissionRejected, DeadlineExceeded):
+        raise
     except Exception as e:
         # Include the actual error message for easier debugging
         raise HTTPException(status_code=500, detail=f"Add article failed: {e}")
@@ -123,8 +555,11 @@ async def add_knowledge_base_article(request: AddArticleRequest):
 async def extract_text_from_image(request: OCRRequest):
     """Extract text from image using a public URL"""
     try:
-        text = await services["ocr"].extract_text(request.image_url)
+        _require_services(["ocr"], "OCR")
+        text = await _extract_text_coalesced(request.image_url)
         return {"extracted_text": text}
+    except (HTTPException, AdmissionRejected, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR failed: {str(e)}")
 
@@ -132,8 +567,11 @@ async def extract_text_from_image(request: OCRRequest):
 async def transcribe_video(request: TranscriptionRequest):
     """Transcribe audio from a video file using a public URL"""
     try:
-        transcription = await services["transcription"].transcribe(request.video_url)
+        _require_services(["transcription"], "transcription")
+        transcription = await _transcribe_coalesced(request.video_url)
         return {"transcription": transcription}
+    except (HTTPException, AdmissionRejected, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
@@ -141,8 +579,20 @@ async def transcribe_video(request: TranscriptionRequest):
 async def search_knowledge_base(request: RAGRequest):
     """Search knowledge base for similar content"""
     try:
-        results = await services["rag"].search_similar(request.query, request.top_k)
+        _require_services(["rag"], "search")
+        filters = request.filters.model_dump(exclude_defaults=True) if request.filters else None
+        prefer = request.prefer.model_dump(exclude_defaults=True) if request.prefer else None
+        key = fingerprint(
+            normalize_text(request.query), request.top_k,
+            request.filters.model_dump_json() if request.filters else None,
+            request.prefer.model_dump_json() if request.prefer else None
+        )
+        results = await flights["search"].do(
+            key, lambda: services["rag"].search_similar(request.query, request.top_k, filters, prefer)
+        )
         return {"results": results}
+    except (HTTPException, AdmissionRejected, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
     
@@ -1,6 +1,6 @@
 # ai-service/app/models/schemas.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 
 class AnalysisRequest(BaseModel):
@@ -8,6 +8,7 @@ class AnalysisRequest(BaseModel):
     content: str
     content_type: str  # 'text', 'url', 'image', 'video'
     file_url: Optional[str] = None # Changed from file_path
+    force_reanalysis: bool = False # Skip the prior-analysis lookup and run the full pipeline
 
 class EvidenceItem(BaseModel):
     source: str
@@ -15,6 +16,15 @@ class EvidenceItem(BaseModel):
     credibility_score: Optional[float]
     url: Optional[str]
 
+class PriorAnalysisMatch(BaseModel):
+    claim_id: str # Claim whose stored analysis was returned
+    similarity: float
+
+class FastPathDecision(BaseModel):
+    verdict: str
+    confidence: float # Similarity-weighted share of neighbours voting for the verdict
+    votes: int # Labelled neighbours that voted
+
 class AnalysisResponse(BaseModel):
     verdict: str
     confidence_score: float
@@ -22,6 +32,19 @@ class AnalysisResponse(BaseModel):
     evidence: List[EvidenceItem]
     sources: List[Dict[str, Any]]
     reasoning: str
+    matched_prior_analysis: Optional[PriorAnalysisMatch] = None # Set when a prior verdict was reused
+    fast_path: Optional[FastPathDecision] = None # Set when neighbours' verdicts answered without the LLM
+
+class BatchAnalysisRequest(BaseModel):
+    requests: List[AnalysisRequest] = Field(..., min_length=1, max_length=500)
+    max_concurrency: Optional[int] = Field(None, ge=1, le=32) # Caps concurrent LLM calls
+
+class BatchAnalysisItem(BaseModel):
+    claim_id: str
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+    duplicate_of: Optional[str] = None # claim_id whose analysis was reused
+    retry_after: Optional[int] = None # set when the claim was shed under load; seconds before resubmitting
 
 class OCRRequest(BaseModel):
     image_url: str # Changed from image_path
@@ -29,6 +52,13 @@ class OCRRequest(BaseModel):
 class TranscriptionRequest(BaseModel):
     video_url: str # Changed from video_path
 
+class KBFilter(BaseModel):
+    source_types: Optional[List[str]] = None # e.g. ["fact-check"]; only those partitions are searched
+    since_days: Optional[int] = Field(None, ge=1) # Only articles added in the last N days
+    verified_only: bool = False
+
 class RAGRequest(BaseModel):
     query: str
-    top_k: int = 5
\ No newline at end of file
+    top_k: int = 5
+    filters: Optional[KBFilter] = None # Every result must match
+    prefer: Optional[KBFilter] = None # Searched first; other matches only fill the remaining slots
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""
+Pre-fork multi-worker server for the TruthGuard AI Service
+
+`uvicorn --workers N` spawns fresh interpreters, so every worker loads its own
+copy of EasyOCR, torch and the embedding model. This runner loads the models
+once in a master process, freezes them, and then forks the workers. The model
+weights are never written after the fork, so the workers share those memory
+pages through copy-on-write.
+
+Usage (from ai-service/):
+    python -m app.prefork --workers 4 --port 8001
+    python -m app.prefork --workers 4 --report-memory
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ONNX Runtime sessions own native thread pools that do not survive fork(),
+# so with an ONNX embedding backend each worker loads its own RAG model.
+FORK_UNSAFE_BACKENDS = ("onnx", "onnx-int8")
+
+def preload_components(names: List[str]) -> Dict[str, float]:
+    """Builds the requested services synchronously in this process and returns load timings."""
+    from app import main as service
+
+    for name in names:
+        if name in service.MODEL_LOADERS:
+            service._load_component(name)
+    if "rag" in service.services and "classifier" in service.services:
+        service.services["classifier"].rag_system = service.services["rag"]
+    return dict(service.startup_state["timings"])
+
+def freeze_models() -> int:
+    """
+    Stops gradient tracking on every loaded torch module and moves all live
+    objects into the GC's permanent generation, so neither autograd nor the
+    garbage collector writes to the shared pages after fork. Returns the
+    number of modules frozen.
+    """
+    from app import main as service
+
+    frozen = 0
+    try:
+        import torch
+    except ImportError:
+        torch = None
+
+    if torch is not None:
+        torch.set_grad_enabled(False)
+        candidates = []
+        for component in service.services.values():
+            candidates.append(component)
+            candidates.extend(vars(component).values() if hasattr(component, "__dict__") else [])
+        reader = getattr(service.services.get("ocr"), "reader", None)
+        if reader is not None:
+            candidates.extend([getattr(reader, "detector", None), getattr(reader, "recognizer", None)])
+        cross_encoder = getattr(service.services.get("reranker"), "model", None)
+        if cross_encoder is not None:
+            # Older sentence-transformers wrap the transformer instead of subclassing nn.Module
+            candidates.append(getattr(cross_encoder, "model", None))
+        seen = set()
+        for candidate in candidates:
+            if isinstance(candidate, torch.nn.Module) and id(candidate) not in seen:
+                seen.add(id(candidate))
+                candidate.eval()
+                for parameter in candidate.parameters():
+                    parameter.requires_grad_(False)
+                frozen += 1
+
+    gc.collect()
+    gc.freeze()
+    return frozen
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock: socket.socket, threads: int, log_level: str) -> None:
+    """Entry point of a forked worker: serve the already-initialized app on the shared socket."""
+    import uvicorn
+    from app import main as service
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+
+    config = uvicorn.Config(service.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+def fork_worker(sock: socket.socket, threads: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, threads, log_level)
+        finally:
+            os._exit(0)
+    return pid
+
+def memory_usage(pid: int) -> Optional[Dict[str, int]]:
+    """Reads resident, proportional, shared and private memory (kB) from /proc/<pid>/smaps_rollup."""
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared_clean", "Shared_Dirty": "shared_dirty",
+              "Private_Clean": "private_clean", "Private_Dirty": "private_dirty"}
+    usage: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = int(rest.split()[0])
+    except OSError:
+        return None
+    usage["shared"] = usage.get("shared_clean", 0) + usage.get("shared_dirty", 0)
+    usage["private"] = usage.get("private_clean", 0) + usage.get("private_dirty", 0)
+    return usage
+
+def memory_report(master_pid: int, worker_pids: List[int]) -> str:
+    """
+    Formats per-process memory and the estimated saving versus independent workers.
+    PSS divides shared pages among the processes mapping them, so the PSS sum is the
+    real footprint; independent workers would each hold roughly one RSS.
+    """
+    rows = [("master", master_pid, memory_usage(master_pid))]
+    rows += [(f"worker-{i}", pid, memory_usage(pid)) for i, pid in enumerate(worker_pids)]
+    rows = [row for row in rows if row[2]]
+    lines = [f"{'process':<10} {'pid':>7} {'rss MB':>9} {'pss MB':>9} {'shared MB':>10} {'private MB':>11}"]
+    for name, pid, usage in rows:
+        lines.append(
+            f"{name:<10} {pid:>7} {usage['rss'] / 1024:>9.1f} {usage['pss'] / 1024:>9.1f} "
+            f"{usage['shared'] / 1024:>10.1f} {usage['private'] / 1024:>11.1f}"
+        )
+    workers = [usage for name, _, usage in rows if name != "master"]
+    if workers:
+        total_pss = sum(usage["pss"] for _, _, usage in rows) / 1024
+        independent = sum(usage["rss"] for usage in workers) / 1024
+        lines.append("")
+        lines.append(f"Total PSS (master + {len(workers)} workers): {total_pss:.1f} MB")
+        lines.append(f"Per-worker PSS: {sum(u['pss'] for u in workers) / 1024 / len(workers):.1f} MB")
+        lines.append(f"Independent workers would need about {independent:.1f} MB "
+                     f"(saving ~{independent - total_pss:.1f} MB, {100 * (1 - total_pss / independent):.0f}%)")
+    return "\n".join(lines)
+
+def wait_until_ready(host: str, port: int, timeout: float) -> bool:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    url = f"http://{'127.0.0.1' if host in ('0.0.0.0', '::') else host}:{port}/health/ready"
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve the AI service with models shared across forked workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--threads-per-worker", type=int, default=int(os.getenv("TORCH_THREADS_PER_WORKER", "0")),
+                        help="torch intra-op threads per worker (0 keeps the torch default)")
+    parser.add_argument("--preload", default="ocr,transcription,rag,reranker",
+                        help="Comma-separated services to load before forking (reranker only if RERANK_ENABLED)")
+    parser.add_argument("--report-memory", action="store_true",
+                        help="Print per-worker memory once the workers are ready")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    names = [name.strip() for name in args.preload.split(",") if name.strip()]
+    if os.getenv("EMBEDDING_BACKEND", "torch").lower() in FORK_UNSAFE_BACKENDS and "rag" in names:
+        logger.warning("ONNX embedding backends are not fork-safe; each worker will load its own RAG model.")
+        names.remove("rag")
+
+    start = time.perf_counter()
+    timings = preload_components(names)
+    frozen = freeze_models()
+    print(f"Master: loaded {', '.join(timings) or 'nothing'} in {time.perf_counter() - start:.1f}s "
+          f"{timings}; froze {frozen} torch modules")
+
+    sock = bind_socket(args.host, args.port)
+    workers = {fork_worker(sock, args.threads_per_worker, args.log_level) for _ in range(args.workers)}
+    print(f"Master {os.getpid()}: serving on {args.host}:{args.port} with workers {sorted(workers)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if args.report_memory:
+        if wait_until_ready(args.host, args.port, timeout=300):
+            print(memory_report(os.getpid(), sorted(workers)))
+        else:
+            print("Workers did not become ready; skipping memory report.")
+
+    # Supervise: replace workers that die unexpectedly, exit once all have stopped
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Master: worker {pid} exited with status {status}; starting a replacement")
+            workers.add(fork_worker(sock, args.threads_per_worker, args.log_level))
+    sock.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Background re-embedding of the knowledge base for an embedding-model upgrade
+
+Stored vectors are only comparable with query vectors from the same model, so
+changing EMBEDDING_MODEL needs every knowledge_base row re-embedded. This job
+does that without downtime:
+
+1. Begin: adds an empty, indexed embedding_next column for the new model and
+   records it in knowledge_base_embedding_models. Services started with
+   EMBEDDING_MODEL_NEXT set to the new model write both columns from then on.
+2. Backfill: streams rows still missing a new vector by keyset pagination on
+   id, encodes them in batches on a worker pool and writes each batch with
+   one RPC. --rows-per-second, --workers and --threads bound the load so live
+   traffic is not starved. Interrupted runs resume where they stopped.
+3. Cutover (--cutover): swaps the columns in one transaction once no row is
+   missing, catching up first if rows were added meanwhile. match_articles
+   routes each query by its model, so services still on the old model keep
+   searching the old vectors (now embedding_prev) until they are redeployed
+   with EMBEDDING_MODEL set to the new one.
+4. Retire (--retire-previous): drops embedding_prev when no service uses it.
+
+Usage (from ai-service/):
+    python -m app.reembed --model BAAI/bge-small-en-v1.5 --rows-per-second 100
+    python -m app.reembed --model BAAI/bge-small-en-v1.5 --cutover
+    python -m app.reembed --retire-previous
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from app.services.embedding_backends import load_embedding_model
+from app.services.rag_system import vector_literal
+
+logger = logging.getLogger(__name__)
+
+TARGET_COLUMN = "embedding_next"
+# Catch-up passes before giving up on a cutover that keeps finding new rows
+MAX_CUTOVER_ATTEMPTS = 5
+
+
+def stream_missing(client, page_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Pages of rows without a new vector, in id order; each page starts after the last id seen."""
+    last_id = None
+    while True:
+        query = (
+            client.table("knowledge_base")
+            .select("id, title, content, embedded_text")
+            .is_(TARGET_COLUMN, "null")
+            .order("id")
+            .limit(page_size)
+        )
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.execute().data or []
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+
+def count_missing(client) -> int:
+    return client.table("knowledge_base").select("id", count="exact").is_(TARGET_COLUMN, "null").limit(1).execute().count or 0
+
+
+def encode_and_store(client, model: Any, rows: List[Dict[str, Any]]) -> int:
+    """
+    Embeds each row from the text its current vectors came from (embedded_text, or
+    title and content like RAGSystem.add_article) and writes them in one call.
+    """
+    texts = [row.get("embedded_text") or f"{row['title']} {row['content']}" for row in rows]
+    vectors = model.encode(texts, batch_size=len(texts), show_progress_bar=False)
+    client.rpc("store_article_embeddings", {
+        "target_column": TARGET_COLUMN,
+        "article_ids": [row["id"] for row in rows],
+        "embeddings": [vector_literal(vector) for vector in vectors]
+    }).execute()
+    return len(rows)
+
+
+def backfill(client, model: Any, batch_size: int, workers: int, rows_per_second: float) -> int:
+    """
+    Re-embeds every row missing a new vector.
+
+    Args:
+        client: Supabase client with the service key.
+        model: The new embedding model.
+        batch_size: Rows per encode call and per write.
+        workers: Batches encoded concurrently.
+        rows_per_second: Upper bound on throughput; 0 for no limit.
+
+    Returns:
+        Number of rows written.
+    """
+    total = count_missing(client)
+    logger.info(f"{total} rows to re-embed")
+    done = 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reembed") as pool:
+        for page in stream_missing(client, batch_size * workers):
+            batches = [page[i:i + batch_size] for i in range(0, len(page), batch_size)]
+            done += sum(pool.map(lambda batch: encode_and_store(client, model, batch), batches))
+            elapsed = time.monotonic() - start
+            if rows_per_second > 0 and done / rows_per_second > elapsed:
+                time.sleep(done / rows_per_second - elapsed)
+                elapsed = time.monotonic() - start
+            rate = done / elapsed if elapsed > 0 else 0.0
+            eta = (total - done) / rate if rate and total > done else 0.0
+            logger.info(f"Re-embedded {done}/{total} rows ({rate:.0f} rows/s, ~{eta / 60:.1f} min left)")
+    return done
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="New embedding model (Hugging Face id or local path)")
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--batch-size", type=int, default=64, help="Rows per encode call and per write")
+    parser.add_argument("--workers", type=int, default=1, help="Batches encoded concurrently")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads per process (0: library default)")
+    parser.add_argument("--rows-per-second", type=float, default=0, help="Throughput cap (0: unlimited)")
+    parser.add_argument("--cutover", action="store_true", help="Switch retrieval to the new vectors when done")
+    parser.add_argument("--retire-previous", action="store_true", help="Drop the vectors replaced by the last cutover")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    load_dotenv()
+    from supabase import create_client
+
+    client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+    if args.retire_previous:
+        client.rpc("retire_previous_embedding", {}).execute()
+        print("Dropped embedding_prev.")
+        return 0
+    if not args.model:
+        parser.error("--model is required unless --retire-previous is given")
+
+    if args.threads:
+        try:
+            import torch
+            torch.set_num_threads(args.threads)
+        except ImportError:
+            pass
+    model = load_embedding_model(args.model, args.backend)
+    dimensions = len(model.encode("dimension probe"))
+    client.rpc("begin_embedding_migration", {"new_model": args.model, "new_dimensions": dimensions}).execute()
+    print(f"Re-embedding knowledge_base with {args.model} ({dimensions}-d) into {TARGET_COLUMN}")
+
+    written = backfill(client, model, args.batch_size, args.workers, args.rows_per_second)
+    print(f"Backfill wrote {written} rows")
+    if not args.cutover:
+        print("Run again with --cutover to switch retrieval to the new vectors.")
+        return 0
+
+    for _ in range(MAX_CUTOVER_ATTEMPTS):
+        missing = client.rpc("complete_embedding_migration", {"new_model": args.model}).execute().data
+        if not missing:
+            print(f"Retrieval switched to {args.model}. Redeploy the services with EMBEDDING_MODEL={args.model} "
+                  f"(and without EMBEDDING_MODEL_NEXT), then run --retire-previous.")
+            return 0
+        logger.info(f"{missing} rows were added during the backfill; catching up")
+        backfill(client, model, args.batch_size, args.workers, args.rows_per_second)
+    print("Rows keep arriving without new vectors; set EMBEDDING_MODEL_NEXT on the services and retry --cutover.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Admission control for TruthGuard AI
+Caps concurrent work per expensive stage and bounds how many callers may wait,
+so overload is rejected quickly instead of timing out everything.
+"""
+
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from app.services.deadline import budget, check_deadline
+from app.services.metrics import REGISTRY
+
+# Default (concurrency, max waiting) per stage; override with
+# ADMISSION_<STAGE>_CONCURRENCY and ADMISSION_<STAGE>_QUEUE.
+STAGE_DEFAULTS = {
+    "ocr": (2, 8),
+    "transcription": (1, 4),
+    "embedding": (4, 64),
+    "rerank": (2, 32),
+    "llm": (8, 32),
+}
+# Longest a caller waits for a slot before being rejected
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    "truthguard_admission_rejections_total",
+    "Requests rejected by admission control, by stage and reason (queue_full or queue_timeout).",
+    ["stage", "reason"]
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a stage is saturated; the API maps it to 429 with Retry-After."""
+
+    def __init__(self, stage: str, reason: str, retry_after: int):
+        super().__init__(f"{stage} is overloaded ({reason}); retry after {retry_after}s")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """
+    Bounded-concurrency gate for one stage.
+
+    At most `concurrency` callers run at once and at most `max_queue` wait for a
+    slot. Anyone beyond that, or anyone waiting longer than `queue_timeout`, gets
+    AdmissionRejected with a Retry-After estimated from recent service times.
+    """
+
+    def __init__(self, stage: str, concurrency: int, max_queue: int, queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.stage = stage
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Exponentially weighted average of how long a slot is held
+        self._avg_service_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained through the slots."""
+        backlog = (self.waiting + 1) / self.concurrency
+        return max(1, math.ceil(backlog * self._avg_service_seconds))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        ADMISSION_REJECTIONS.inc(stage=self.stage, reason=reason)
+        return AdmissionRejected(self.stage, reason, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending, so concurrent callers see it as taken
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=budget(self.queue_timeout, self.stage))
+            except asyncio.TimeoutError:
+                check_deadline(self.stage)
+                raise self._reject("queue_timeout") from None
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * (time.perf_counter() - start)
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_seconds": round(self._avg_service_seconds, 3),
+        }
+
+
+def _build_limiters() -> Dict[str, StageLimiter]:
+    limiters = {}
+    for stage, (concurrency, max_queue) in STAGE_DEFAULTS.items():
+        prefix = f"ADMISSION_{stage.upper()}"
+        limiters[stage] = StageLimiter(
+            stage,
+            concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+            max_queue=int(os.getenv(f"{prefix}_QUEUE", max_queue))
+        )
+    return limiters
+
+LIMITERS = _build_limiters()
+
+
+def admit(stage: str):
+    """Async context manager holding one slot of `stage`: `async with admit("ocr"): ...`"""
+    return LIMITERS[stage].slot()
+
+
+def admission_stats() -> Dict[str, Dict[str, float]]:
+    return {stage: limiter.stats() for stage, limiter in LIMITERS.items()}
+
+
+def _admission_collector():
+    limiters = LIMITERS.values()
+    yield ("truthguard_admission_queue_depth", "gauge", "Callers waiting for a stage slot.",
+           [("truthguard_admission_queue_depth", {"stage": l.stage}, l.waiting) for l in limiters])
+    yield ("truthguard_admission_active", "gauge", "Callers currently holding a stage slot.",
+           [("truthguard_admission_active", {"stage": l.stage}, l.active) for l in limiters])
+    yield ("truthguard_admission_concurrency_limit", "gauge", "Configured concurrent slots per stage.",
+           [("truthguard_admission_concurrency_limit", {"stage": l.stage}, l.concurrency) for l in limiters])
+    yield ("truthguard_admission_queue_limit", "gauge", "Configured maximum waiting callers per stage.",
+           [("truthguard_admission_queue_limit", {"stage": l.stage}, l.max_queue) for l in limiters])
+
+REGISTRY.register_collector(_admission_collector)
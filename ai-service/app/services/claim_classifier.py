@@ -2,38 +2,115 @@ from bs4 import BeautifulSoup
 import httpx
 import asyncio
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 import json
 import re
 
 # 🔧 Import RAG system for automatic KB updates
 from app.services.rag_system import RAGSystem
+from app.services.admission import AdmissionRejected, admit
+from app.services.deadline import DeadlineExceeded, budget, check_deadline
+from app.services.fast_path import VerdictFastPath
+from app.services.llm_router import LLMRouter, LLMUnavailable
+from app.services.metrics import REGISTRY, track_stage, record_cache_lookup
+from app.services.pipeline_context import CONTEXT_SNIPPET_CHARS, PipelineContext
+from app.services.reranker import RERANK_MIN_SCORE, CrossEncoderReranker
 
 logger = logging.getLogger(__name__)
 
+# Articles handed to the LLM (and to the weak-context check)
+CONTEXT_ARTICLES = 5
+
+CONTEXT_CHECKS = REGISTRY.counter(
+    "truthguard_context_checks_total",
+    "Knowledge-base context checks before the LLM; weak context falls back to a live web search.",
+    ["result", "reranked"]
+)
+
+
+class WebSearchCache:
+    """
+    Shares live web searches and scraped pages between the claims of one batch.
+    Identical queries and URLs are fetched once; later callers await the same task.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    def get_or_create(self, key: str, factory) -> asyncio.Future:
+        task = self._tasks.get(key)
+        record_cache_lookup("web_search", task is not None)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        return task
+
+
 class ClaimClassifier:
     """Service for analyzing and classifying fact-checking claims."""
     
-    def __init__(self):
+    def __init__(self, rag_system: Optional[RAGSystem] = None, reranker: Optional[CrossEncoderReranker] = None):
         """Initialize claim classifier, loading credentials from environment."""
-        self.openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
-        self.model_name = os.getenv("MODEL_NAME")
         self.serper_api_key = os.getenv("SERPER_API_KEY")
+        # Prioritized LLM endpoints (MODEL_NAME on OpenRouter unless LLM_ENDPOINTS is set)
+        self.llm_router = LLMRouter.from_env()
+        # Overridable so benchmarks and tests can point at a local fake
+        self.serper_url = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+        # Shared RAG system used for auto-KB inserts; attached once it has loaded
+        self.rag_system = rag_system
+        # Answers from labelled neighbours' verdicts when they agree, skipping search and the LLM
+        self.fast_path = VerdictFastPath()
+        # Optional cross-encoder that reorders retrieved articles; attached once it has loaded
+        self.reranker = reranker
+
+    async def analyze_claim(
+        self,
+        ctx: PipelineContext,
+        search_cache: Optional[WebSearchCache] = None,
+        llm_slots: Optional[asyncio.Semaphore] = None
+    ) -> Dict[str, Any]:
+        """
+        Orchestrates the full analysis of a claim, performing a live web search if needed.
 
-    async def analyze_claim(self, claim_text: str, retrieved_context: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Orchestrates the full analysis of a claim, performing a live web search if needed."""
+        Reads the claim text, embedding, retrieved articles and prior neighbours
+        from the context, and stores the reranked articles, scraped pages and
+        prompt context back on it.
+
+        Args:
+            ctx: The request's pipeline context, after retrieval.
+            search_cache: Optional cache shared by a batch so identical web searches run once.
+            llm_slots: Optional semaphore bounding concurrent LLM calls across a batch.
+        """
         try:
-            final_context = retrieved_context
+            if not ctx.force_reanalysis:
+                fast_result = self._fast_path_analysis(ctx.retrieved[:CONTEXT_ARTICLES], ctx.prior_neighbours)
+                if fast_result is not None:
+                    return fast_result
+
+            if self.reranker is not None:
+                ctx.retrieved = await self.reranker.rerank(ctx.text, ctx.retrieved)
+            ctx.retrieved = ctx.retrieved[:CONTEXT_ARTICLES]
 
             # Check if the context from the internal DB is sufficient.
-            if self._is_context_weak(retrieved_context):
-                logger.info(f"Internal context is weak for claim '{claim_text}'. Performing live web search...")
-                web_context = await self._perform_live_web_search(claim_text)
-                final_context = retrieved_context + web_context
+            weak = self._is_context_weak(ctx.retrieved)
+            CONTEXT_CHECKS.inc(
+                result="weak" if weak else "sufficient",
+                reranked="true" if any("rerank_score" in a for a in ctx.retrieved) else "false"
+            )
+            if weak:
+                logger.info(f"Internal context is weak for claim '{ctx.text}'. Performing live web search...")
+                ctx.scraped = await self._perform_live_web_search(ctx.text, search_cache)
 
-            context_text = self._prepare_context(final_context)
-            analysis_result = await self._call_llm_for_analysis(claim_text, context_text)
+            final_context = ctx.documents
+            ctx.context_text = self._prepare_context(final_context)
+            check_deadline("llm")
+            if llm_slots is not None:
+                async with llm_slots, admit("llm"):
+                    analysis_result = await self._call_llm_for_analysis(ctx.text, ctx.context_text)
+            else:
+                async with admit("llm"):
+                    analysis_result = await self._call_llm_for_analysis(ctx.text, ctx.context_text)
             
             evidence = self._extract_evidence(final_context)
             sources = self._prepare_sources(final_context)
@@ -45,63 +122,121 @@ class ClaimClassifier:
 
             # --- 🧠 AUTO-KB INSERTION START ---
             try:
-                rag = RAGSystem()
-                if rag.embeddings_enabled and rag.supabase:
-                    # Build a rich article from the AI analysis
-                    enriched_article = {
-                        "title": claim_text[:120],
-                        "content": f"{analysis_result.get('summary','')}\n\nReasoning:\n{analysis_result.get('reasoning','')}",
-                        "source_url": None,
-                        "source_type": "auto-generated",
-                        "verified": analysis_result.get("verdict", "uncertain") == "true"
-                    }
-
-                    # Avoid duplicate insertions by checking existing title
-                    existing = rag.supabase.table("knowledge_base").select("id").eq("title", enriched_article["title"]).execute()
-                    if existing.data:
-                        logger.info(f"[Auto-KB] Skipping duplicate article: {enriched_article['title']}")
-                    else:
-                        success = await rag.add_article(enriched_article)
-                        if success:
+                with track_stage("auto_kb"):
+                    rag = self.rag_system
+                    if rag is not None and rag.embeddings_enabled and rag.supabase:
+                        # Build a rich article from the AI analysis
+                        enriched_article = {
+                            "title": ctx.text[:120],
+                            "content": f"{analysis_result.get('summary','')}\n\nReasoning:\n{analysis_result.get('reasoning','')}",
+                            "source_url": None,
+                            "source_type": "auto-generated",
+                            "verified": analysis_result.get("verdict", "uncertain") == "true",
+                            # Lets the fast path reuse this verdict for similar claims, once per claim
+                            "verdict": analysis_result.get("verdict", "uncertain"),
+                            "claim_id": ctx.claim_id
+                        }
+
+                        # Near-duplicates of earlier claims are merged into their article instead of inserted;
+                        # the article is indexed by the claim embedding already computed for retrieval
+                        action = await rag.add_or_merge_article(
+                            enriched_article, ctx.retrieved, claim_text=ctx.text, claim_embedding=ctx.embedding
+                        )
+                        if action == "inserted":
                             logger.info(f"[Auto-KB] Successfully added new AI-analyzed claim to knowledge base: {enriched_article['title']}")
-                        else:
-                            logger.warning(f"[Auto-KB] Failed to add article: {enriched_article['title']}")
-                else:
-                    logger.warning("[Auto-KB] RAG system not fully initialized. Skipping KB insert.")
+                    else:
+                        logger.warning("[Auto-KB] RAG system not fully initialized. Skipping KB insert.")
             except Exception as e:
                 logger.error(f"[Auto-KB] Failed to auto-add article: {e}", exc_info=True)
             # --- 🧠 AUTO-KB INSERTION END ---
 
             return final_result
-            
+
+        except (AdmissionRejected, DeadlineExceeded):
+            raise
         except Exception as e:
             logger.error(f"Claim analysis pipeline failed: {str(e)}", exc_info=True)
             return self._get_fallback_analysis()
 
+    def _fast_path_analysis(
+        self, retrieved_context: List[Dict[str, Any]], prior_neighbours: List[Tuple[float, str, str]]
+    ) -> Optional[Dict[str, Any]]:
+        """Builds an analysis from neighbours' verdicts if they are decisive, otherwise None."""
+        # Only knowledge-base rows that record a verdict can vote; rows derived from an
+        # analysis carry its claim_id, so that analysis is not counted again
+        kb_neighbours = [
+            (article.get("similarity", 0.0), article["verdict"], article.get("claim_id"))
+            for article in retrieved_context if article.get("verdict")
+        ]
+        with track_stage("fast_path"):
+            decision = self.fast_path.decide(prior_neighbours + kb_neighbours)
+        record_cache_lookup("fast_path", decision is not None)
+        if decision is None:
+            return None
+
+        logger.info(f"Fast path answered '{decision['verdict']}' from {decision['votes']} neighbours")
+        return {
+            "verdict": decision["verdict"],
+            "confidence_score": decision["confidence"],
+            "summary": f"This claim closely matches {decision['votes']} previously fact-checked claims rated '{decision['verdict']}'.",
+            "reasoning": (
+                "The verdict was taken from the most similar previously analyzed claims and knowledge base "
+                f"fact-checks, which agreed with a weighted share of {decision['confidence']:.0%}. "
+                "Request re-analysis to run the full AI review."
+            ),
+            "evidence": self._extract_evidence(retrieved_context),
+            "sources": self._prepare_sources(retrieved_context),
+            "fast_path": decision
+        }
+
     # -----------------------------------------------------------------------
     # Below: All existing helper methods remain unchanged
     # -----------------------------------------------------------------------
     def _is_context_weak(self, context: List[Dict[str, Any]]) -> bool:
         if not context or len(context) < 2:
             return True
+        if all("rerank_score" in article for article in context):
+            # Reranked: need at least two articles the cross-encoder judged relevant
+            return sum(1 for article in context if article["rerank_score"] >= RERANK_MIN_SCORE) < 2
         scores = [article.get('similarity', 0) for article in context]
         average_similarity = sum(scores) / len(scores) if scores else 0
         return average_similarity < 0.75
 
-    async def _perform_live_web_search(self, claim_text: str) -> List[Dict[str, Any]]:
+    async def _perform_live_web_search(self, claim_text: str, search_cache: Optional[WebSearchCache] = None) -> List[Dict[str, Any]]:
         if not self.serper_api_key:
             logger.warning("SERPER_API_KEY not found. Skipping live web search.")
             return []
+        if search_cache is not None:
+            query_key = "search:" + " ".join(claim_text.lower().split())
+            return await search_cache.get_or_create(
+                query_key, lambda: self._run_live_web_search(claim_text, search_cache)
+            )
+        return await self._run_live_web_search(claim_text)
+
+    async def _run_live_web_search(self, claim_text: str, search_cache: Optional[WebSearchCache] = None) -> List[Dict[str, Any]]:
         search_headers = {'X-API-KEY': self.serper_api_key, 'Content-Type': 'application/json'}
         search_payload = json.dumps({"q": claim_text})
         try:
             async with httpx.AsyncClient() as client:
-                search_response = await client.post("https://google.serper.dev/search", headers=search_headers, content=search_payload, timeout=10.0)
-                search_response.raise_for_status()
+                with track_stage("web_search"):
+                    search_response = await client.post(self.serper_url, headers=search_headers, content=search_payload, timeout=budget(10.0, "web_search"))
+                    search_response.raise_for_status()
                 search_results = search_response.json().get("organic", [])
-                scrape_tasks = [self._scrape_url(client, result) for result in search_results[:3] if 'link' in result]
+                scrape_tasks = []
+                for result in search_results[:3]:
+                    if 'link' not in result:
+                        continue
+                    if search_cache is not None:
+                        # Bind the loop variable so each task scrapes its own result
+                        scrape_tasks.append(search_cache.get_or_create(
+                            "scrape:" + result['link'], lambda r=result: self._scrape_url(client, r)
+                        ))
+                    else:
+                        scrape_tasks.append(self._scrape_url(client, result))
                 scraped_pages = await asyncio.gather(*scrape_tasks)
                 return [page for page in scraped_pages if page]
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Live web search failed: {e}")
             return []
@@ -111,12 +246,14 @@ class ClaimClassifier:
         title = search_result.get("title", "Unknown Source")
         try:
             scrape_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            response = await client.get(url, headers=scrape_headers, follow_redirects=True, timeout=15.0)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'lxml')
-            for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside']):
-                tag.decompose()
-            body_text = soup.get_text(separator='\n', strip=True)
+            with track_stage("scrape"):
+                response = await client.get(url, headers=scrape_headers, follow_redirects=True, timeout=budget(15.0, "scrape"))
+                response.raise_for_status()
+                soup = BeautifulSoup(response.text, 'lxml')
+                for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside']):
+                    tag.decompose()
+                # Only a snippet reaches the prompt; the rest of the page is dropped here, once
+                body_text = soup.get_text(separator='\n', strip=True)[:CONTEXT_SNIPPET_CHARS]
             return {
                 "title": title, "content": body_text, "source_url": url,
                 "source_type": "web_search", "verified": False
@@ -130,7 +267,7 @@ class ClaimClassifier:
             return "No relevant context was found."
         context_parts = []
         for i, article in enumerate(retrieved_articles[:5], 1):
-            content_snippet = article.get('content', '')[:500]
+            content_snippet = article.get('content', '')[:CONTEXT_SNIPPET_CHARS]
             context_parts.append(
                 f"Source {i} (Similarity: {article.get('similarity', 0):.3f}):\n"
                 f"Title: {article.get('title', 'N/A')}\n"
@@ -139,45 +276,28 @@ class ClaimClassifier:
         return "\n---\n".join(context_parts)
 
     async def _call_llm_for_analysis(self, claim: str, context: str) -> Dict[str, Any]:
-        if self.openrouter_api_key:
+        if self.llm_router.available:
             return await self._real_llm_analysis(claim, context)
         else:
-            logger.warning("OPENROUTER_API_KEY not set. Using simulated LLM analysis.")
+            logger.warning("No LLM endpoint configured (OPENROUTER_API_KEY not set). Using simulated LLM analysis.")
             return await self._simulate_llm_analysis(claim)
 
     async def _real_llm_analysis(self, claim: str, context: str) -> Dict[str, Any]:
         try:
             prompt = self._build_analysis_prompt(claim, context)
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
-                    headers={"Authorization": f"Bearer {self.openrouter_api_key}"},
-                    json={
-                        "model": self.model_name,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.2,
-                        "max_tokens": 1500,
-                        "stream": False
-                    },
+            with track_stage("llm"):
+                content, endpoint = await self.llm_router.complete(
+                    [{"role": "user", "content": prompt}], temperature=0.2, max_tokens=1500
                 )
-                response.raise_for_status()
-                result = response.json()
-                content = None
-                if isinstance(result, dict) and "choices" in result:
-                    choice = result["choices"][0]
-                    if isinstance(choice, dict):
-                        content = (
-                            choice.get("message", {}).get("content")
-                            or choice.get("text")
-                            or ""
-                        )
-                if not content:
-                    logger.error(f"Unexpected LLM response format: {result}")
-                    return await self._simulate_llm_analysis(claim)
-                return self._parse_llm_response(content)
-        except (httpx.TimeoutException, httpx.RequestError) as e:
-            logger.error(f"⏱️ LLM request timed out or failed: {e}")
+            logger.info(f"LLM analysis served by {endpoint}")
+            return self._parse_llm_response(content)
+        except LLMUnavailable as e:
+            # Out of budget: give up instead of returning a placeholder verdict
+            check_deadline("llm")
+            logger.error(f"⏱️ All LLM endpoints failed: {e}")
             return await self._simulate_llm_analysis(claim)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"💥 Real LLM analysis failed, falling back: {e}", exc_info=True)
             return await self._simulate_llm_analysis(claim)
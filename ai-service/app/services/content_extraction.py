@@ -3,54 +3,86 @@ Content extraction services for TruthGuard AI
 Handles OCR and transcription tasks by downloading files from URLs or reading local files.
 """
 
-import easyocr
-import cv2
-from moviepy.video.io.VideoFileClip import VideoFileClip
+# easyocr, cv2 and moviepy pull in torch/ffmpeg and are slow to import,
+# so they are imported where first needed instead of at module load.
 import os
 import tempfile
 import asyncio
 import logging
 import httpx
+from typing import Optional
+from urllib.parse import urlparse
+
+from app.services.admission import AdmissionRejected, admit
+from app.services.deadline import DeadlineExceeded, budget, check_deadline, run_blocking
+from app.services.metrics import track_stage
 
 logger = logging.getLogger(__name__)
 
+# Directory whose files API callers may reference by local path; unset, callers must send http(s) URLs
+LOCAL_FILE_DIR = os.getenv("LOCAL_FILE_DIR", "")
+
+
+def local_file_path(file_ref: str) -> Optional[str]:
+    """
+    Checks a caller-supplied file reference: None for an http(s) URL, the real
+    path for a file inside LOCAL_FILE_DIR. Anything else raises ValueError, so
+    requests cannot make the service read arbitrary files such as /dev/zero.
+    """
+    if urlparse(file_ref).scheme in ("http", "https"):
+        return None
+    if LOCAL_FILE_DIR:
+        root = os.path.realpath(LOCAL_FILE_DIR)
+        path = os.path.realpath(file_ref)
+        if os.path.commonpath([root, path]) == root and os.path.isfile(path):
+            return path
+    raise ValueError(f"File reference must be an http(s) URL or a file in LOCAL_FILE_DIR: {file_ref}")
+
+
 class OCRService:
     """Service for extracting text from images using EasyOCR"""
     
     def __init__(self):
+        import easyocr
         self.reader = easyocr.Reader(['en'], gpu=False)
 
     async def extract_text(self, image_url: str) -> str:
         """Downloads or reads an image and extracts text."""
         try:
-            # ✅ Detect if it's a local path
-            if os.path.exists(image_url):
-                logger.info(f"Reading local image: {image_url}")
-                return await self._extract_from_local(image_url)
-            else:
-                return await self._extract_from_url(image_url)
+            with track_stage("ocr"):
+                # ✅ Detect if it's a local path
+                if os.path.exists(image_url):
+                    logger.info(f"Reading local image: {image_url}")
+                    return await self._extract_from_local(image_url)
+                else:
+                    return await self._extract_from_url(image_url)
+        except (AdmissionRejected, DeadlineExceeded):
+            raise
         except Exception as e:
             logger.error(f"OCR failed for {image_url}: {str(e)}")
             return ""
 
     async def _extract_from_url(self, image_url: str) -> str:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(image_url, follow_redirects=True, timeout=30.0)
-            response.raise_for_status()
+        with track_stage("ocr_download"):
+            async with httpx.AsyncClient() as client:
+                response = await client.get(image_url, follow_redirects=True, timeout=budget(30.0, "ocr_download"))
+                response.raise_for_status()
         with tempfile.NamedTemporaryFile(delete=True, suffix=".jpg") as temp_file:
             temp_file.write(response.content)
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self._extract_text_sync, temp_file.name)
+            return await self._extract_from_local(temp_file.name)
 
     async def _extract_from_local(self, image_path: str) -> str:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._extract_text_sync, image_path)
+        async with admit("ocr"):
+            check_deadline("ocr")
+            return await run_blocking(self._extract_text_sync, image_path)
 
     def _extract_text_sync(self, image_path: str) -> str:
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(f"Could not read image from {image_path}")
-        results = self.reader.readtext(image)
+        import cv2
+        with track_stage("ocr_inference"):
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError(f"Could not read image from {image_path}")
+            results = self.reader.readtext(image)
         extracted_text = [text for (_, text, conf) in results if conf > 0.4]
         return " ".join(extracted_text)
 
@@ -66,19 +98,29 @@ class TranscriptionService:
         temp_video_path = None
         temp_audio_path = None
         try:
-            # ✅ Support both local and remote videos
-            if os.path.exists(video_url):
-                temp_video_path = video_url
-            else:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(video_url, follow_redirects=True, timeout=120.0)
-                    response.raise_for_status()
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-                    temp_video.write(response.content)
-                    temp_video_path = temp_video.name
-
-            temp_audio_path = await self._extract_audio(temp_video_path)
-            return await self._transcribe_audio(temp_audio_path)
+            with track_stage("transcription"):
+                # ✅ Support both local and remote videos
+                if os.path.exists(video_url):
+                    temp_video_path = video_url
+                else:
+                    with track_stage("video_download"):
+                        async with httpx.AsyncClient() as client:
+                            response = await client.get(video_url, follow_redirects=True, timeout=budget(120.0, "video_download"))
+                            response.raise_for_status()
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
+                        temp_video.write(response.content)
+                        temp_video_path = temp_video.name
+
+                # Decoding and speech-to-text are the CPU-heavy part; downloads stay outside the limit
+                async with admit("transcription"):
+                    check_deadline("audio_extraction")
+                    with track_stage("audio_extraction"):
+                        temp_audio_path = await self._extract_audio(temp_video_path)
+                    check_deadline("speech_to_text")
+                    with track_stage("speech_to_text"):
+                        return await self._transcribe_audio(temp_audio_path)
+        except (AdmissionRejected, DeadlineExceeded):
+            raise
         except Exception as e:
             logger.error(f"Transcription failed for {video_url}: {str(e)}")
             return ""
@@ -90,11 +132,11 @@ class TranscriptionService:
     async def _extract_audio(self, video_path: str) -> str:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
             temp_audio_path = temp_audio.name
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self._extract_audio_sync, video_path, temp_audio_path)
+        await run_blocking(self._extract_audio_sync, video_path, temp_audio_path)
         return temp_audio_path
 
     def _extract_audio_sync(self, video_path: str, audio_path: str):
+        from moviepy.video.io.VideoFileClip import VideoFileClip
         with VideoFileClip(video_path) as video:
             if video.audio is not None:
                 video.audio.write_audiofile(audio_path, verbose=False, logger=None)
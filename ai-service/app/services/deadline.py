@@ -0,0 +1,230 @@
+"""
+End-to-end request deadlines for TruthGuard AI
+
+The caller sends `X-Request-Deadline: <unix epoch seconds>`. The deadline is
+held in a context variable for the request, every stage checks it before it
+starts, and outbound calls take their timeout from the time that is left.
+A pure ASGI middleware cancels the request when the client disconnects or the
+deadline passes, so abandoned claims stop consuming CPU.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "x-request-deadline"
+# Smallest timeout handed to an outbound call, so it can at least connect and fail cleanly
+MIN_TIMEOUT_SECONDS = 0.05
+
+# Threads for blocking model and client calls; sized like asyncio's default executor
+BLOCKING_EXECUTOR = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="blocking")
+
+
+
+class Deadline:
+    """
+    A deadline on the time.monotonic() clock (None: no deadline). Held by
+    reference, so tasks and threads started from the request see it extended.
+    """
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: Optional[float]):
+        self.at = at
+
+    def extend_to(self, at: Optional[float]) -> None:
+        """Moves the deadline later, never earlier; None lifts it."""
+        if self.at is not None:
+            self.at = None if at is None else max(self.at, at)
+
+
+# Deadline of the current request, or None
+_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage starts (or waits) after the request's deadline; mapped to 504."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded before {stage} completed")
+        self.stage = stage
+
+
+def set_deadline(epoch_seconds: Optional[float]) -> contextvars.Token:
+    """Sets the deadline for the current context from a wall-clock epoch timestamp."""
+    if epoch_seconds is None:
+        return _deadline.set(None)
+    return _deadline.set(Deadline(time.monotonic() + (epoch_seconds - time.time())))
+
+def current_deadline() -> Optional[float]:
+    """The current request's deadline on the time.monotonic() clock, or None."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.at
+
+def use_deadline(deadline: Deadline) -> contextvars.Token:
+    """Makes deadline the current context's deadline, e.g. for work shared between requests."""
+    return _deadline.set(deadline)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline (may be negative), or None if there is no deadline."""
+    at = current_deadline()
+    return None if at is None else at - time.monotonic()
+
+def check_deadline(stage: str) -> None:
+    """Raises DeadlineExceeded if the current request has run out of time."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(stage)
+
+def budget(cap: float, stage: str = "request") -> float:
+    """
+    Timeout for one outbound call: the time left before the deadline, but never
+    more than the call's own cap. Without a deadline the cap is returned as is.
+    """
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded(stage)
+    return max(MIN_TIMEOUT_SECONDS, min(cap, left))
+
+async def run_blocking(func: Callable[..., Any], *args) -> Any:
+    """
+    Runs a blocking call on the shared worker pool, cancellation-aware. The call
+    sees the caller's context variables (request deadline, pipeline context), so
+    stages it times are recorded on the request.
+
+    If the awaiting task is cancelled before the job starts, the job is dropped
+    from the pool's queue. If it is already running it cannot be interrupted,
+    so this waits for it to finish before propagating the cancellation; callers
+    holding an admission slot keep it until the CPU is actually free.
+    """
+    concurrent_future = BLOCKING_EXECUTOR.submit(contextvars.copy_context().run, func, *args)
+    future = asyncio.wrap_future(concurrent_future)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if not concurrent_future.cancel():
+            try:
+                await future
+            except Exception:
+                pass
+        raise
+
+
+async def run_blocking_io(func: Callable[..., Any], *args, cap: float, stage: str) -> Any:
+    """
+    Runs a blocking network call on the worker pool for at most budget(cap, stage).
+
+    Unlike run_blocking, the caller does not wait for a call that has already
+    started: on the deadline it gets DeadlineExceeded (or TimeoutError once cap
+    passes) and the call finishes in its thread. The client must bound the call
+    to cap itself, so abandoned threads are freed soon after.
+    """
+    timeout = budget(cap, stage)
+    concurrent_future = BLOCKING_EXECUTOR.submit(contextvars.copy_context().run, func, *args)
+    future = asyncio.wrap_future(concurrent_future)
+    # An abandoned call's outcome is never awaited; retrieve it so it is not reported as lost
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        concurrent_future.cancel()
+        check_deadline(stage)
+        raise TimeoutError(f"{stage} took longer than {cap:g}s")
+    except asyncio.CancelledError:
+        concurrent_future.cancel()
+        raise
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that applies X-Request-Deadline to the request context and
+    cancels the handler when the client disconnects or the deadline passes.
+    A request that times out before its response started gets a 504.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = None
+        for name, value in scope.get("headers", []):
+            if name.decode("latin-1").lower() == DEADLINE_HEADER:
+                try:
+                    deadline = float(value.decode("latin-1"))
+                except ValueError:
+                    logger.warning(f"Ignoring malformed {DEADLINE_HEADER} header: {value!r}")
+                break
+        token = set_deadline(deadline)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        state = {"response_started": False, "disconnected": False}
+
+        async def app_receive():
+            return await queue.get()
+
+        async def app_send(message):
+            if message["type"] == "http.response.start":
+                state["response_started"] = True
+            await send(message)
+
+        async def watch_client():
+            # Forward request messages to the app; a disconnect cancels it
+            while True:
+                message = await receive()
+                await queue.put(message)
+                if message["type"] == "http.disconnect":
+                    state["disconnected"] = True
+                    app_task.cancel()
+                    return
+
+        try:
+            app_task = asyncio.ensure_future(self.app(scope, app_receive, app_send))
+            watcher = asyncio.ensure_future(watch_client())
+            try:
+                left = remaining()
+                done, _ = await asyncio.wait({app_task}, timeout=None if left is None else max(left, 0))
+                if app_task in done:
+                    app_task.result()
+                    return
+                app_task.cancel()
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    pass
+                logger.warning(f"{scope.get('path')} cancelled: deadline exceeded")
+                if not state["response_started"]:
+                    await self._send_timeout(send)
+            except asyncio.CancelledError:
+                if state["disconnected"]:
+                    logger.info(f"{scope.get('path')} cancelled: client disconnected")
+                    return
+                raise
+            finally:
+                watcher.cancel()
+                if not app_task.done():
+                    app_task.cancel()
+        finally:
+            _deadline.reset(token)
+
+    @staticmethod
+    async def _send_timeout(send) -> None:
+        body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
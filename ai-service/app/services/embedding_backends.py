@@ -0,0 +1,91 @@
+"""
+Embedding model backends for TruthGuard AI
+Loads EMBEDDING_MODEL as fp32 PyTorch, ONNX Runtime, or a dynamically quantized int8 variant
+"""
+
+from typing import Any, Optional
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Supported values for EMBEDDING_BACKEND
+#   torch       fp32 PyTorch (default, previous behaviour)
+#   torch-int8  PyTorch with Linear layers dynamically quantized to int8
+#   onnx        ONNX Runtime export of the fp32 model
+#   onnx-int8   ONNX Runtime with dynamically quantized int8 weights
+# The ONNX backends need `pip install sentence-transformers[onnx]` (optimum + onnxruntime).
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Instruction set the int8 ONNX weights are tuned for: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+ONNX_CACHE_DIR = os.getenv("EMBEDDING_ONNX_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "truthguard", "onnx"))
+
+def load_embedding_model(model_name: str, backend: Optional[str] = None) -> Any:
+    """
+    Loads a SentenceTransformer for the requested backend.
+
+    Falls back to the fp32 PyTorch model if the backend cannot be loaded or its
+    output dimensionality differs from EMBEDDING_DIM (or the model's declared
+    dimension), so vectors stay compatible with the ones already stored.
+
+    Args:
+        model_name: Hugging Face model id or local path.
+        backend: One of EMBEDDING_BACKENDS; defaults to the EMBEDDING_BACKEND env var.
+
+    Returns:
+        A model exposing SentenceTransformer's encode() API.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{backend}', using torch.")
+        backend = "torch"
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    try:
+        model = _load_backend(model_name, backend)
+        expected = _expected_dimension(model)
+        actual = len(model.encode("dimension probe"))
+        if expected is not None and actual != expected:
+            raise ValueError(f"{backend} model produces {actual}-d vectors, expected {expected}")
+        logger.info(f"Loaded {backend} embedding backend for {model_name} ({actual}-d).")
+        return model
+    except Exception as e:
+        logger.warning(f"Could not load {backend} embedding backend ({e}); falling back to fp32 torch.")
+        return SentenceTransformer(model_name)
+
+def _load_backend(model_name: str, backend: str) -> Any:
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch-int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+
+    # onnx-int8: prefer a quantized file published with the model, else export one once and cache it
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+    try:
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": file_name})
+    except Exception:
+        logger.info(f"No published {file_name} for {model_name}; exporting a quantized copy.")
+
+    local_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        onnx_model = SentenceTransformer(model_name, backend="onnx")
+        onnx_model.save(local_dir)
+        export_dynamic_quantized_onnx_model(onnx_model, ONNX_QUANTIZATION, local_dir)
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+def _expected_dimension(model: Any) -> Optional[int]:
+    """Dimensionality stored vectors use: EMBEDDING_DIM if set, otherwise what the model declares."""
+    configured = os.getenv("EMBEDDING_DIM")
+    if configured:
+        return int(configured)
+    return model.get_sentence_embedding_dimension()
@@ -0,0 +1,138 @@
+"""
+Verdict fast path for TruthGuard AI
+Votes over the verdicts of a claim's nearest labelled neighbours (prior analyses
+and knowledge-base fact-checks) and answers without the LLM when they agree.
+
+One analysis can reach the vote up to three times: from the prior-analysis
+index, as its auto-generated article and as the backend's fact-check. Each
+neighbour carries the claim it came from, and a claim votes once.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Verdicts the fast path may return; "uncertain" is always left to the LLM
+DECISIVE_VERDICTS = ("true", "false", "misleading")
+
+# Thresholds used until a calibration file from benchmarks/fast_path_eval.py is supplied
+DEFAULT_THRESHOLDS = {
+    "min_similarity": 0.85,  # neighbours less similar than this do not vote
+    "min_votes": 2,          # voting neighbours needed for a decision
+    "min_confidence": 0.9,   # similarity-weighted share of the winning verdict
+}
+
+
+# (similarity, verdict, id of the claim whose analysis it comes from, or None if unknown)
+Neighbour = Tuple[float, str, Optional[str]]
+
+
+def one_per_claim(neighbours: List[Neighbour]) -> List[Neighbour]:
+    """Keeps the most similar neighbour of each originating claim; neighbours without one all stay."""
+    best: Dict[str, Neighbour] = {}
+    kept: List[Neighbour] = []
+    for neighbour in neighbours:
+        claim_id = neighbour[2]
+        if claim_id is None:
+            kept.append(neighbour)
+        elif claim_id not in best or neighbour[0] > best[claim_id][0]:
+            best[claim_id] = neighbour
+    return kept + list(best.values())
+
+
+def vote(neighbours: List[Neighbour], min_similarity: float) -> Tuple[Optional[str], float, int]:
+    """
+    Similarity-weighted kNN vote, one vote per originating claim.
+
+    Args:
+        neighbours: (similarity, verdict, claim_id) triples.
+        min_similarity: Neighbours below this similarity are ignored.
+
+    Returns:
+        (winning verdict, its weighted share of the vote, number of voters).
+        The verdict is None when nobody voted.
+    """
+    weights: Dict[str, float] = {}
+    voters = 0
+    for similarity, verdict, _ in one_per_claim(neighbours):
+        if similarity < min_similarity or not verdict:
+            continue
+        # Weight by how far above the cut-off a neighbour is, so near-duplicates dominate
+        weights[verdict] = weights.get(verdict, 0.0) + (similarity - min_similarity) + 1e-6
+        voters += 1
+    if not weights:
+        return None, 0.0, 0
+    winner = max(weights, key=weights.get)
+    return winner, weights[winner] / sum(weights.values()), voters
+
+
+class VerdictFastPath:
+    """
+    Returns a verdict without the LLM when a claim's labelled neighbours agree.
+
+    Thresholds come from FAST_PATH_CALIBRATION (a JSON file written by
+    benchmarks/fast_path_eval.py) and can be overridden individually with
+    FAST_PATH_MIN_SIMILARITY, FAST_PATH_MIN_VOTES and FAST_PATH_MIN_CONFIDENCE.
+    """
+
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None):
+        self.enabled = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+        self.neighbours = int(os.getenv("FAST_PATH_NEIGHBOURS", "10"))
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        calibration = os.getenv("FAST_PATH_CALIBRATION")
+        if calibration:
+            try:
+                with open(calibration, encoding="utf-8") as f:
+                    calibrated = json.load(f)
+                self.thresholds.update({k: calibrated[k] for k in DEFAULT_THRESHOLDS if k in calibrated})
+                logger.info(f"Loaded fast-path calibration from {calibration}: {self.thresholds}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Ignoring fast-path calibration {calibration}: {e}")
+        for key in DEFAULT_THRESHOLDS:
+            override = os.getenv(f"FAST_PATH_{key.upper()}")
+            if override:
+                self.thresholds[key] = float(override)
+        if thresholds:
+            self.thresholds.update(thresholds)
+        self.thresholds["min_votes"] = int(self.thresholds["min_votes"])
+
+        self._lock = threading.Lock()
+        self.decisions = 0
+        self.hits = 0
+
+    def decide(self, neighbours: List[Neighbour]) -> Optional[Dict[str, Any]]:
+        """
+        Args:
+            neighbours: (similarity, verdict, claim_id) of labelled neighbours.
+
+        Returns:
+            {"verdict", "confidence", "votes"} if the vote is decisive, otherwise None.
+        """
+        if not self.enabled:
+            return None
+        verdict, confidence, voters = vote(neighbours, self.thresholds["min_similarity"])
+        hit = (
+            verdict in DECISIVE_VERDICTS
+            and voters >= self.thresholds["min_votes"]
+            and confidence >= self.thresholds["min_confidence"]
+        )
+        with self._lock:
+            self.decisions += 1
+            self.hits += int(hit)
+        if not hit:
+            return None
+        return {"verdict": verdict, "confidence": round(confidence, 4), "votes": voters}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                **self.thresholds,
+                "decisions": self.decisions,
+                "hits": self.hits,
+                "hit_rate": (self.hits / self.decisions) if self.decisions else 0.0
+            }
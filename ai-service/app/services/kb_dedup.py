@@ -0,0 +1,179 @@
+"""
+Near-duplicate detection for auto-generated knowledge-base articles
+Matches new articles against recent ones by embedding similarity, SimHash
+distance of their content and normalized title, without a database round trip.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity between article embeddings above which two articles are the same
+DEDUP_EMBEDDING_THRESHOLD = float(os.getenv("KB_DEDUP_EMBEDDING_THRESHOLD", "0.92"))
+# Differing bits (of 64) between content SimHashes at or below which two articles are the same
+DEDUP_SIMHASH_DISTANCE = int(os.getenv("KB_DEDUP_SIMHASH_DISTANCE", "4"))
+# Claim-to-article similarity from retrieval above which a retrieved auto-generated article is the same claim
+DEDUP_RETRIEVAL_THRESHOLD = float(os.getenv("KB_DEDUP_RETRIEVAL_THRESHOLD", "0.95"))
+
+_WORD = re.compile(r"\w+")
+
+AUTO_KB_WRITES = REGISTRY.counter(
+    "truthguard_auto_kb_writes_total",
+    "Auto-generated knowledge-base writes: inserted, or merged into a near-duplicate (by match reason).",
+    ["action", "reason"]
+)
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(_WORD.findall((title or "").lower()))
+
+
+def simhash(text: str, shingle: int = 1) -> int:
+    """
+    64-bit SimHash over word shingles; near-identical texts differ in few bits.
+    Single words tolerate the small rewordings LLM analyses of paraphrases show.
+    """
+    words = _WORD.findall((text or "").lower())
+    if not words:
+        return 0
+    features = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    digests = b"".join(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest() for f in features)
+    # One row of 64 bits per feature; a bit is set where most features set it
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(features), 64)
+    majority = bits.sum(axis=0) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _hamming_many(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Bit differences between one hash and an array of uint64 hashes."""
+    xor = hashes ^ np.uint64(value)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index of recent auto-generated articles: unit embeddings, content
+    SimHashes and normalized titles. Like the prior-analysis index, it is a
+    fixed-size ring buffer, so the oldest articles drop out first.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("KB_DEDUP_MAX_ENTRIES", "50000"))
+        self.enabled = os.getenv("KB_DEDUP_ENABLED", "true").lower() == "true"
+
+        self._vectors: Optional[np.ndarray] = None
+        self._simhashes = np.zeros(self.max_entries, dtype=np.uint64)
+        self._ids: List[Optional[str]] = [None] * self.max_entries
+        self._slot_titles: List[Optional[str]] = [None] * self.max_entries
+        self._titles: Dict[str, int] = {}  # normalized title -> slot
+        self._size = 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+        self.inserted = 0
+        self.merged: Dict[str, int] = {"title": 0, "embedding": 0, "simhash": 0, "retrieval": 0}
+
+    def find(
+        self, title: str, content_hash: int, embedding: np.ndarray, retrieved: Iterable[Dict[str, Any]] = ()
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Looks for an existing article the new one duplicates.
+
+        Args:
+            title: Title of the new article.
+            content_hash: SimHash of its content.
+            embedding: Its embedding (the one that would be stored).
+            retrieved: Knowledge-base matches already fetched for the claim.
+
+        Returns:
+            (article id, reason) for the closest duplicate, or None.
+        """
+        if not self.enabled:
+            return None
+        key = normalize_title(title)
+        query = self._unit(embedding)
+        with self._lock:
+            slot = self._titles.get(key)
+            if slot is not None:
+                return self._ids[slot], "title"
+            if self._size:
+                similarities = self._vectors[:self._size] @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= DEDUP_EMBEDDING_THRESHOLD:
+                    return self._ids[best], "embedding"
+                distances = _hamming_many(self._simhashes[:self._size], content_hash)
+                closest = int(np.argmin(distances))
+                if distances[closest] <= DEDUP_SIMHASH_DISTANCE:
+                    return self._ids[closest], "simhash"
+
+        # Articles written before this process started are only known through retrieval
+        for article in retrieved:
+            if article.get("source_type") != "auto-generated" or not article.get("id"):
+                continue
+            if normalize_title(article.get("title", "")) == key:
+                return str(article["id"]), "title"
+            if hamming(content_hash, simhash(article.get("content", ""))) <= DEDUP_SIMHASH_DISTANCE:
+                return str(article["id"]), "simhash"
+            if article.get("similarity", 0.0) >= DEDUP_RETRIEVAL_THRESHOLD:
+                return str(article["id"]), "retrieval"
+        return None
+
+    def add(self, article_id: str, title: str, content_hash: int, embedding: np.ndarray) -> None:
+        """Indexes an article; an article already indexed under the same title is replaced."""
+        if not self.enabled:
+            return
+        vector = self._unit(embedding)
+        key = normalize_title(title)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._titles.get(key)
+            if slot is None:
+                slot = self._next_slot
+                self._next_slot = (slot + 1) % self.max_entries
+                self._size = min(self._size + 1, self.max_entries)
+                # Forget the title of the article this slot used to hold
+                self._titles.pop(self._slot_titles[slot], None)
+            self._vectors[slot] = vector
+            self._simhashes[slot] = np.uint64(content_hash)
+            self._ids[slot] = article_id
+            self._slot_titles[slot] = key
+            self._titles[key] = slot
+
+    def record(self, reason: Optional[str]) -> None:
+        AUTO_KB_WRITES.inc(action="merged" if reason else "inserted", reason=reason or "")
+        with self._lock:
+            if reason is None:
+                self.inserted += 1
+            else:
+                self.merged[reason] = self.merged.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            merged = sum(self.merged.values())
+            return {
+                "enabled": self.enabled,
+                "entries": self._size,
+                "inserted": self.inserted,
+                "merged": dict(self.merged),
+                "merge_rate": merged / (merged + self.inserted) if merged + self.inserted else 0.0
+            }
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
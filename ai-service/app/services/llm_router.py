@@ -0,0 +1,313 @@
+"""
+LLM endpoint routing for TruthGuard AI
+Sends chat completions to the fastest healthy endpoint from a prioritized list,
+fails over on errors and can hedge slow requests with a second endpoint.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.services.deadline import DeadlineExceeded, budget
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Per-attempt timeout cap; the request deadline can shorten it further
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT", "30"))
+# Calls kept per endpoint for latency percentiles and error rate
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "50"))
+# Samples needed before an endpoint is ranked by latency instead of priority
+LLM_MIN_SAMPLES = int(os.getenv("LLM_MIN_SAMPLES", "5"))
+# Endpoints above this error rate (over the window) are skipped while others are healthy
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.5"))
+# Consecutive failures that take an endpoint out of rotation, and for how long
+LLM_FAILURE_THRESHOLD = int(os.getenv("LLM_FAILURE_THRESHOLD", "3"))
+LLM_COOLDOWN_SECONDS = float(os.getenv("LLM_COOLDOWN", "30"))
+# Hedging: after the primary's p95 latency (or LLM_HEDGE_DELAY until it has samples), race a second endpoint
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "8"))
+# Connections kept open across all endpoints; attempts reuse them instead of reconnecting
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+LLM_REQUESTS = REGISTRY.counter(
+    "truthguard_llm_requests_total", "LLM attempts by endpoint and outcome (ok, error, cancelled, deadline).", ["endpoint", "outcome"]
+)
+LLM_HEDGES = REGISTRY.counter(
+    "truthguard_llm_hedges_total", "Hedged LLM requests fired, and which side won.", ["result"]
+)
+
+
+class LLMUnavailable(Exception):
+    """Every configured endpoint failed or was skipped."""
+
+
+class LLMEndpoint:
+    """One model at one OpenAI-compatible base URL, with rolling health stats."""
+
+    def __init__(self, name: str, model: Optional[str], base_url: str, api_key: Optional[str], priority: int):
+        self.name = name
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.priority = priority
+        self._calls: deque = deque(maxlen=LLM_STATS_WINDOW)  # (latency seconds, ok)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._calls.append((latency, ok))
+        if ok:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= LLM_FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + LLM_COOLDOWN_SECONDS
+            logger.warning(f"LLM endpoint {self.name} failed {self.consecutive_failures} times; cooling down for {LLM_COOLDOWN_SECONDS:.0f}s")
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self._calls if ok)
+        if len(latencies) < LLM_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * (len(latencies) - 1) + 0.5))]
+
+    def error_rate(self) -> float:
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+    def healthy(self) -> bool:
+        if time.monotonic() < self.open_until:
+            return False
+        return len(self._calls) < LLM_MIN_SAMPLES or self.error_rate() <= LLM_MAX_ERROR_RATE
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.latency_percentile(0.5), self.latency_percentile(0.95)
+        return {
+            "model": self.model,
+            "base_url": self.base_url,
+            "priority": self.priority,
+            "healthy": self.healthy(),
+            "samples": len(self._calls),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class LLMRouter:
+    """
+    Routes chat completions across prioritized endpoints.
+
+    Healthy endpoints are tried fastest first (by rolling p50); endpoints without
+    enough samples keep their place in the priority order. On an error the next
+    endpoint is tried. With hedging on, a second endpoint is raced once the first
+    has taken longer than its own p95. All attempts share one pooled client.
+    """
+
+    def __init__(self, endpoints: List[LLMEndpoint], hedge: bool = LLM_HEDGE_ENABLED, hedge_delay: float = LLM_HEDGE_DELAY):
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled client for every endpoint; each request passes its own timeout."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @classmethod
+    def from_env(cls) -> "LLMRouter":
+        """
+        Builds endpoints from LLM_ENDPOINTS, a JSON list of
+        {"name", "model", "base_url", "api_key_env"} objects in priority order.
+        Without it, MODEL_NAME plus the comma-separated LLM_FALLBACK_MODELS are
+        used on OPENROUTER_BASE_URL with OPENROUTER_API_KEY.
+        """
+        default_base = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        default_key = os.getenv("OPENROUTER_API_KEY")
+        endpoints: List[LLMEndpoint] = []
+
+        configured = os.getenv("LLM_ENDPOINTS")
+        if configured:
+            try:
+                for priority, entry in enumerate(json.loads(configured)):
+                    model = entry["model"]
+                    api_key = os.getenv(entry["api_key_env"]) if entry.get("api_key_env") else default_key
+                    endpoints.append(LLMEndpoint(
+                        entry.get("name", model), model, entry.get("base_url", default_base), api_key, priority
+                    ))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Ignoring invalid LLM_ENDPOINTS: {e}")
+                endpoints = []
+
+        if not endpoints:
+            # MODEL_NAME may be unset, in which case OpenRouter applies the account default
+            fallbacks = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+            models = [os.getenv("MODEL_NAME")] + fallbacks
+            endpoints = [LLMEndpoint(m or "default", m, default_base, default_key, i) for i, m in enumerate(models)]
+
+        return cls([e for e in endpoints if e.api_key])
+
+    @property
+    def available(self) -> bool:
+        return bool(self.endpoints)
+
+    def ranked(self) -> List[LLMEndpoint]:
+        """
+        Healthy endpoints fastest first; unhealthy ones only as a last resort.
+        An endpoint without enough samples is taken to be as fast as the nearest
+        higher-priority endpoint that has them, so it stays behind that endpoint
+        instead of jumping ahead of every measured one.
+        """
+        keys: Dict[LLMEndpoint, Tuple[float, int]] = {}
+        inherited = 0.0
+        for endpoint in sorted(self.endpoints, key=lambda e: e.priority):
+            p50 = endpoint.latency_percentile(0.5)
+            if p50 is not None:
+                inherited = p50
+            keys[endpoint] = (p50 if p50 is not None else inherited, endpoint.priority)
+
+        healthy = sorted((e for e in self.endpoints if e.healthy()), key=lambda e: keys[e])
+        unhealthy = sorted((e for e in self.endpoints if not e.healthy()), key=lambda e: e.open_until)
+        return healthy + unhealthy
+
+    async def complete(self, messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: int = 1500) -> Tuple[str, str]:
+        """
+        Returns (content, endpoint name) from the first endpoint that answers.
+        Raises LLMUnavailable if all fail, DeadlineExceeded if time runs out.
+        """
+        payload = {"messages": messages, "temperature": temperature, "max_tokens": max_tokens, "stream": False}
+        candidates = self.ranked()
+        errors = []
+        while candidates:
+            primary = candidates.pop(0)
+            try:
+                if self.hedge and candidates:
+                    return await self._hedged(primary, candidates, payload)
+                return await self._attempt(primary, payload)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                errors.append(f"{primary.name}: {e}")
+                logger.warning(f"LLM endpoint {primary.name} failed ({e}); trying next endpoint")
+        raise LLMUnavailable("; ".join(errors) or "no LLM endpoints configured")
+
+    async def _hedged(self, primary: LLMEndpoint, candidates: List[LLMEndpoint], payload: Dict) -> Tuple[str, str]:
+        """
+        Races the next candidate against primary once primary exceeds its p95.
+        A candidate used as the hedge is removed from `candidates`.
+        """
+        delay = primary.latency_percentile(0.95) or self.hedge_delay
+        started = time.monotonic()
+        first = asyncio.ensure_future(self._attempt(primary, payload))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+
+        backup = candidates.pop(0)
+        LLM_HEDGES.inc(result="fired")
+        logger.info(f"LLM endpoint {primary.name} slower than {delay:.2f}s; hedging with {backup.name}")
+        second = asyncio.ensure_future(self._attempt(backup, payload))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.inc(result="backup_won" if task is second else "primary_won")
+                        if task is second and not first.done():
+                            # The primary took at least this long; count it so a slow endpoint
+                            # that always loses the race stops being ranked first
+                            primary.record(time.monotonic() - started, ok=True)
+                        return task.result()
+            # Both failed: surface the primary's error so the caller moves on
+            raise first.exception()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+
+    async def _attempt(self, endpoint: LLMEndpoint, payload: Dict) -> Tuple[str, str]:
+        # Raises DeadlineExceeded before anything is sent; the endpoint is not to blame
+        timeout = budget(LLM_TIMEOUT_SECONDS, "llm")
+        start = time.monotonic()
+        try:
+            response = await self.client.post(
+                f"{endpoint.base_url}/chat/completions",
+                headers={"Authorization": f"Bearer {endpoint.api_key}"},
+                json={"model": endpoint.model, **payload},
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            content = self._extract_content(response.json())
+            if not content:
+                raise ValueError("response had no message content")
+        except asyncio.CancelledError:
+            LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="cancelled")
+            raise
+        except httpx.TimeoutException:
+            if timeout < LLM_TIMEOUT_SECONDS:
+                # Cut short by the request's deadline, not the endpoint's own limit: no other
+                # endpoint would have more time, and this one did not fail
+                LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="deadline")
+                raise DeadlineExceeded("llm")
+            endpoint.record(time.monotonic() - start, ok=False)
+            LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="error")
+            raise
+        except Exception:
+            endpoint.record(time.monotonic() - start, ok=False)
+            LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="error")
+            raise
+        endpoint.record(time.monotonic() - start, ok=True)
+        LLM_REQUESTS.inc(endpoint=endpoint.name, outcome="ok")
+        return content, endpoint.name
+
+    @staticmethod
+    def _extract_content(result: Any) -> Optional[str]:
+        if isinstance(result, dict) and result.get("choices"):
+            choice = result["choices"][0]
+            if isinstance(choice, dict):
+                return (choice.get("message") or {}).get("content") or choice.get("text") or None
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hedging": self.hedge, "endpoints": {e.name: e.stats() for e in self.endpoints}}
+
+    def collect_metrics(self):
+        """Registry collector: rolling latency, error rate and health per endpoint."""
+        samples = {"p50": [], "p95": [], "errors": [], "healthy": []}
+        for e in self.endpoints:
+            labels = {"endpoint": e.name}
+            for q in ("p50", "p95"):
+                value = e.latency_percentile(0.5 if q == "p50" else 0.95)
+                if value is not None:
+                    samples[q].append(("truthguard_llm_endpoint_latency_seconds", {**labels, "quantile": q}, value))
+            samples["errors"].append(("truthguard_llm_endpoint_error_rate", labels, e.error_rate()))
+            samples["healthy"].append(("truthguard_llm_endpoint_healthy", labels, 1 if e.healthy() else 0))
+        yield ("truthguard_llm_endpoint_latency_seconds", "gauge",
+               "Rolling LLM latency per endpoint.", samples["p50"] + samples["p95"])
+        yield ("truthguard_llm_endpoint_error_rate", "gauge",
+               "Rolling LLM error rate per endpoint.", samples["errors"])
+        yield ("truthguard_llm_endpoint_healthy", "gauge",
+               "1 if the endpoint is in rotation.", samples["healthy"])
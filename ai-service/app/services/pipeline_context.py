@@ -0,0 +1,142 @@
+"""
+Per-request pipeline context for TruthGuard AI claim analysis
+
+Every artifact the analyze pipeline computes for a claim is stored once on a
+PipelineContext: the normalized claim, text extracted from attached media, the
+combined text that is embedded and analyzed, its embedding, the retrieved and
+scraped documents and the prompt context built from them. Later stages read
+them from the context instead of recomputing them.
+
+While a context is active, every track_stage block also adds its duration to
+the context's timings, so one request can be profiled stage by stage. Set
+PIPELINE_CONTEXT_DUMP to a file path to append each finished context to it as
+one JSON line.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.singleflight import normalize_text
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_CONTEXT_DUMP = os.getenv("PIPELINE_CONTEXT_DUMP", "")
+# Characters of a document that reach the prompt; scraped pages are cut to this once
+CONTEXT_SNIPPET_CHARS = 500
+
+_current: contextvars.ContextVar[Optional["PipelineContext"]] = contextvars.ContextVar("pipeline_context", default=None)
+_dump_lock = threading.Lock()
+_timings_lock = threading.Lock()
+
+
+@dataclass
+class PipelineContext:
+    """Artifacts and stage timings of one claim's analysis."""
+
+    claim_id: str
+    content_type: str
+    # Claim as submitted, and normalized for fingerprints and duplicate checks
+    raw_text: str
+    normalized_text: str
+    file_url: Optional[str] = None
+    force_reanalysis: bool = False
+    # OCR or transcription text of the attached file
+    extracted_text: Optional[str] = None
+    # Claim plus extracted text: what is embedded, searched and analyzed
+    text: str = ""
+    embedding: Optional[np.ndarray] = None
+    # (similarity, verdict, claim_id) of the nearest previously analyzed claims
+    prior_neighbours: List[Tuple[float, str, str]] = field(default_factory=list)
+    # Knowledge-base matches, reranked and cut to the articles the LLM sees once classified
+    retrieved: List[Dict[str, Any]] = field(default_factory=list)
+    # Pages from the live web search, content already cut to CONTEXT_SNIPPET_CHARS
+    scraped: List[Dict[str, Any]] = field(default_factory=list)
+    context_text: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def __post_init__(self):
+        if not self.text:
+            self.text = self.raw_text
+
+    @classmethod
+    def from_request(cls, request) -> "PipelineContext":
+        """Context for an AnalysisRequest, before any stage has run."""
+        return cls(
+            claim_id=request.claim_id,
+            content_type=request.content_type,
+            raw_text=request.content,
+            normalized_text=normalize_text(request.content),
+            file_url=request.file_url,
+            force_reanalysis=request.force_reanalysis
+        )
+
+    def set_extracted(self, label: str, extracted_text: str) -> None:
+        """Records media text and builds the combined claim text from it."""
+        self.extracted_text = extracted_text
+        self.text = f"{self.raw_text}\n\n{label}: {extracted_text}"
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        """Everything the analysis is grounded on: retrieved articles, then scraped pages."""
+        return self.retrieved + self.scraped
+
+    def record_timing(self, stage: str, seconds: float) -> None:
+        # Stages that run more than once (scrape, embedding) accumulate; worker threads record too
+        with _timings_lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Profiling summary: sizes and timings rather than the raw texts and vectors."""
+        return {
+            "claim_id": self.claim_id,
+            "content_type": self.content_type,
+            "text_chars": len(self.text),
+            "extracted_chars": len(self.extracted_text) if self.extracted_text is not None else None,
+            "embedding_dims": int(self.embedding.shape[-1]) if self.embedding is not None else None,
+            "prior_neighbours": len(self.prior_neighbours),
+            "retrieved": [
+                {"id": doc.get("id"), "similarity": doc.get("similarity"), "rerank_score": doc.get("rerank_score")}
+                for doc in self.retrieved
+            ],
+            "scraped": [{"url": doc.get("source_url"), "chars": len(doc.get("content", ""))} for doc in self.scraped],
+            "context_chars": len(self.context_text) if self.context_text is not None else None,
+            "timings": {stage: round(seconds, 4) for stage, seconds in self.timings.items()},
+            "total_seconds": round(time.perf_counter() - self.started_at, 4)
+        }
+
+    def dump(self) -> None:
+        """Appends the profiling summary to PIPELINE_CONTEXT_DUMP, if set."""
+        if not PIPELINE_CONTEXT_DUMP:
+            return
+        line = json.dumps(self.to_dict())
+        try:
+            with _dump_lock, open(PIPELINE_CONTEXT_DUMP, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write pipeline context to {PIPELINE_CONTEXT_DUMP}: {e}")
+
+
+def activate(ctx: PipelineContext) -> contextvars.Token:
+    """Makes ctx the current request's context; stage timings are recorded on it."""
+    return _current.set(ctx)
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+def current_context() -> Optional[PipelineContext]:
+    return _current.get()
+
+def record_stage_timing(stage: str, seconds: float) -> None:
+    """Called by track_stage; a no-op outside an analysis."""
+    ctx = _current.get()
+    if ctx is not None:
+        ctx.record_timing(stage, seconds)
@@ -0,0 +1,112 @@
+"""
+Prior analysis index for TruthGuard AI
+Remembers the verdicts of recently analyzed claims so paraphrases can skip the full pipeline
+"""
+
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+import copy
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+class PriorAnalysisIndex:
+    """
+    In-memory nearest-neighbour index over the embeddings of analyzed claims.
+
+    Vectors live in a fixed-size ring buffer, so once max_entries is reached the
+    oldest analyses are overwritten first.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("PRIOR_MATCH_THRESHOLD", "0.92"))
+        self.max_entries = max_entries or int(os.getenv("PRIOR_INDEX_MAX_ENTRIES", "20000"))
+        self.enabled = os.getenv("PRIOR_MATCH_ENABLED", "true").lower() == "true"
+
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: list = [None] * self.max_entries # (claim_id, result) per slot
+        self._size = 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+        # Counters for match-rate reporting
+        self.lookups = 0
+        self.matches = 0
+        self.forced = 0
+
+    def lookup(self, embedding: np.ndarray) -> Optional[Tuple[Dict[str, Any], str, float]]:
+        """
+        Finds the most similar prior analysis.
+
+        Args:
+            embedding: Embedding of the incoming claim.
+
+        Returns:
+            (stored result, prior claim_id, similarity) if above the threshold, otherwise None.
+        """
+        if not self.enabled:
+            return None
+        query = self._unit(embedding)
+        with self._lock:
+            self.lookups += 1
+            if self._size == 0:
+                return None
+            similarities = self._vectors[:self._size] @ query
+            best = int(np.argmax(similarities))
+            similarity = min(float(similarities[best]), 1.0)
+            if similarity < self.threshold:
+                return None
+            self.matches += 1
+            claim_id, result = self._entries[best]
+        return copy.deepcopy(result), claim_id, similarity
+
+    def nearest(self, embedding: np.ndarray, k: int) -> List[Tuple[float, str, str]]:
+        """Returns (similarity, verdict, claim_id) of the k most similar prior analyses, best first, regardless of threshold."""
+        if not self.enabled or k <= 0:
+            return []
+        query = self._unit(embedding)
+        with self._lock:
+            if self._size == 0:
+                return []
+            similarities = self._vectors[:self._size] @ query
+            top = np.argsort(-similarities)[:k]
+            return [(min(float(similarities[i]), 1.0), self._entries[i][1].get("verdict"), self._entries[i][0]) for i in top]
+
+    def add(self, claim_id: str, embedding: np.ndarray, result: Dict[str, Any]) -> None:
+        """Stores a completed analysis. Uncertain verdicts are not reused and are skipped."""
+        if not self.enabled or result.get("verdict", "uncertain") == "uncertain":
+            return
+        vector = self._unit(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._next_slot
+            self._vectors[slot] = vector
+            self._entries[slot] = (claim_id, copy.deepcopy(result))
+            self._next_slot = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def record_forced(self) -> None:
+        """Counts a lookup skipped because the caller asked for re-analysis."""
+        with self._lock:
+            self.forced += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": self._size,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "matches": self.matches,
+                "forced_reanalysis": self.forced,
+                "match_rate": (self.matches / self.lookups) if self.lookups else 0.0
+            }
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
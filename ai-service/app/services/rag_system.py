@@ -4,22 +4,97 @@ Handles similarity search against a persistent vector database (pgvector)
 """
 
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Set
 import asyncio
+import importlib.util
+import json
 import logging
 import os
-from supabase import create_client, Client
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv # Import load_dotenv
 
-try:
-    from sentence_transformers import SentenceTransformer
-    EMBEDDINGS_AVAILABLE = True
-except ImportError:
-    EMBEDDINGS_AVAILABLE = False
+from app.services.admission import AdmissionRejected, admit
+from app.services.deadline import DeadlineExceeded, check_deadline, run_blocking, run_blocking_io
+from app.services.metrics import track_stage
+from app.services.embedding_backends import load_embedding_model
+from app.services.kb_dedup import NearDuplicateIndex, simhash
+
+# sentence-transformers imports torch, so only check that it is installed here;
+# the actual import happens when RAGSystem loads the model.
+EMBEDDINGS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+if not EMBEDDINGS_AVAILABLE:
     logging.warning("Sentence transformers not available. RAG system will not function.")
 
 logger = logging.getLogger(__name__)
 
+# Cap on one knowledge-base query or write; the request's deadline can shorten the wait for it
+KB_DB_TIMEOUT_SECONDS = float(os.getenv("KB_DB_TIMEOUT", "10"))
+# Seconds between writes of accumulated retrieval hits (read by the compaction job)
+KB_HIT_FLUSH_SECONDS = float(os.getenv("KB_HIT_FLUSH_SECONDS", "60"))
+# Seconds between reloads of which knowledge_base column holds which model's vectors (see app.reembed)
+KB_EMBEDDING_MAP_REFRESH_SECONDS = float(os.getenv("KB_EMBEDDING_MAP_REFRESH_SECONDS", "30"))
+# Column the vectors live in on deployments that never ran a re-embedding
+DEFAULT_EMBEDDING_COLUMN = "embedding"
+# Index match_articles searches: exact (full-precision HNSW), halfvec (float16 HNSW) or
+# binary (bit HNSW); the compact modes rescore their candidates with the full vectors
+KB_VECTOR_SEARCH = os.getenv("KB_VECTOR_SEARCH", "exact").lower()
+# Candidates fetched from a compact index for rescoring; 0 lets match_articles choose
+KB_RESCORE_CANDIDATES = int(os.getenv("KB_RESCORE_CANDIDATES", "0"))
+# Partition hint for claim analysis: these knowledge-base partitions are searched first and
+# the rest only fills missing results, e.g. KB_PREFER_SOURCE_TYPES=fact-check
+KB_PREFER_SOURCE_TYPES = [t for t in os.getenv("KB_PREFER_SOURCE_TYPES", "").split(",") if t]
+KB_PREFER_SINCE_DAYS = int(os.getenv("KB_PREFER_SINCE_DAYS", "0"))
+KB_PREFER_VERIFIED = os.getenv("KB_PREFER_VERIFIED", "false").lower() == "true"
+DEFAULT_PREFER = {
+    key: value for key, value in (
+        ("source_types", KB_PREFER_SOURCE_TYPES),
+        ("since_days", KB_PREFER_SINCE_DAYS),
+        ("verified_only", KB_PREFER_VERIFIED),
+    ) if value
+}
+
+def vector_literal(vector: Any) -> str:
+    """
+    pgvector text form with float32 precision. JSON lists of Python floats print
+    up to 17 digits per value; 7 significant digits are about half the bytes.
+    """
+    return "[" + ",".join(f"{x:.7g}" for x in np.asarray(vector, dtype=np.float32).ravel()) + "]"
+
+def parse_embedding(value: Any) -> Optional[np.ndarray]:
+    """pgvector columns arrive through PostgREST as "[...]" strings."""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32) if value else None
+
+def combine_filters(filters: Optional[Dict[str, Any]], extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Knowledge-base filter matching both: shared source types, the shorter window, verified if either asks."""
+    filters, extra = filters or {}, extra or {}
+    combined = {}
+    types = [t for t in (filters.get("source_types"), extra.get("source_types")) if t]
+    if types:
+        combined["source_types"] = [t for t in types[0] if all(t in other for other in types[1:])]
+    windows = [d for d in (filters.get("since_days"), extra.get("since_days")) if d]
+    if windows:
+        combined["since_days"] = min(windows)
+    if filters.get("verified_only") or extra.get("verified_only"):
+        combined["verified_only"] = True
+    return combined
+
+def filter_params(filters: Optional[Dict[str, Any]], prefix: str = '') -> Dict[str, Any]:
+    """match_articles arguments for a knowledge-base filter; prefix 'prefer_' gives the hint's."""
+    filters = filters or {}
+    params: Dict[str, Any] = {}
+    if filters.get('source_types') is not None:
+        params[prefix + 'source_types'] = list(filters['source_types'])
+    if filters.get('since_days'):
+        params[prefix + 'since'] = (datetime.now(timezone.utc) - timedelta(days=filters['since_days'])).isoformat()
+    if filters.get('verified_only'):
+        params[prefix + 'verified_only'] = True
+    return params
+
 class RAGSystem:
     """RAG system for retrieving relevant information from a persistent knowledge base"""
 
@@ -30,7 +105,22 @@ class RAGSystem:
 
         self.embeddings_enabled = False
         self.embedding_model = None
+        self.embedding_backend = None
+        self.model_name = None
+        # Second model written alongside the first while app.reembed migrates to it
+        self.next_model_name = os.getenv("EMBEDDING_MODEL_NEXT") or None
+        self.next_model = None
+        self._embedding_columns: Dict[str, str] = {}  # model -> knowledge_base column
+        self._columns_loaded_at = float("-inf")
         self.supabase = None # Initialize supabase client as None
+        # Recent auto-generated articles, so near-duplicates are merged without a lookup query
+        self.dedup = NearDuplicateIndex()
+        # Times each article was retrieved since the last flush
+        self._pending_hits: Counter = Counter()
+        self._hits_flushed_at = time.monotonic()
+        self._flushing_hits = False
+        # Fire-and-forget work (column map reloads, hit flushes); referenced until done
+        self._background: Set[asyncio.Future] = set()
 
         if not EMBEDDINGS_AVAILABLE:
             logger.error("RAG System disabled: sentence-transformers library not found.")
@@ -39,9 +129,18 @@ class RAGSystem:
         try:
             # Load the model name from an environment variable
             model_name = os.getenv("EMBEDDING_MODEL", 'sentence-transformers/all-MiniLM-L6-v2')
-            self.embedding_model = SentenceTransformer(model_name)
+            # EMBEDDING_BACKEND selects fp32 torch (default), torch-int8, onnx or onnx-int8
+            self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")
+            self.embedding_model = load_embedding_model(model_name, self.embedding_backend)
+            self.model_name = model_name
             self.embeddings_enabled = True
-            logger.info(f"Loaded embedding model: {model_name}")
+            logger.info(f"Loaded embedding model: {model_name} ({self.embedding_backend})")
+            if self.next_model_name and self.next_model_name != model_name:
+                try:
+                    self.next_model = load_embedding_model(self.next_model_name, self.embedding_backend)
+                    logger.info(f"Dual-writing knowledge-base embeddings for {self.next_model_name}")
+                except Exception as e:
+                    logger.error(f"Could not load EMBEDDING_MODEL_NEXT {self.next_model_name}; not dual-writing: {e}")
 
             # --- FIX: Initialize Supabase client using correct env vars ---
             # Use SUPABASE_URL and SUPABASE_SERVICE_KEY for write access
@@ -56,8 +155,13 @@ class RAGSystem:
                 raise ValueError(f"{', '.join(missing)} not found in environment for RAG system.")
 
             # Create the client using the service key
-            self.supabase: Client = create_client(supabase_url, supabase_service_key)
+            # The client's own timeout frees the thread of a call the request stopped waiting for
+            self.supabase: Client = create_client(
+                supabase_url, supabase_service_key, options=ClientOptions(postgrest_client_timeout=KB_DB_TIMEOUT_SECONDS)
+            )
             logger.info("RAG System Supabase client initialized with service key.")
+            self._load_embedding_columns()
+            self._warm_dedup_index()
 
         except ValueError as ve: # Catch specific ValueError
              logger.error(f"Failed to initialize RAGSystem Supabase client: {ve}")
@@ -66,13 +170,41 @@ class RAGSystem:
             logger.error(f"Failed to initialize RAGSystem: {e}", exc_info=True)
             self.embeddings_enabled = False
 
-    async def search_similar(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    async def embed(self, text: str) -> np.ndarray:
+        """Encodes a single text into its embedding vector."""
+        async with admit("embedding"):
+            check_deadline("embedding")
+            with track_stage("embedding"):
+                return await run_blocking(self.embedding_model.encode, text)
+
+    async def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Encodes many texts in one forward pass.
+
+        Args:
+            texts: Texts to encode.
+
+        Returns:
+            A (len(texts), dim) array of embeddings, row-aligned with texts.
+        """
+        async with admit("embedding"):
+            check_deadline("embedding_batch")
+            with track_stage("embedding_batch"):
+                return await run_blocking(
+                    lambda: self.embedding_model.encode(texts, batch_size=32, show_progress_bar=False)
+                )
+
+    async def search_similar(
+        self, query: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None, prefer: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Encodes a query and searches for similar articles in the vector database.
 
         Args:
             query: Query text to search for.
             top_k: Number of top results to return.
+            filters: Restricts results (source_types, since_days, verified_only).
+            prefer: Partition hint searched first; defaults to the KB_PREFER_* settings.
 
         Returns:
             A list of similar articles with their similarity scores.
@@ -83,19 +215,72 @@ class RAGSystem:
 
         try:
             # Generate embedding for the query
-            loop = asyncio.get_event_loop()
-            query_embedding = await loop.run_in_executor(
-                None,
-                self.embedding_model.encode,
-                query
-            )
+            query_embedding = await self.embed(query)
+        except (AdmissionRejected, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"Query embedding failed: {str(e)}", exc_info=True)
+            return []
+
+        return await self.search_by_embedding(query_embedding, top_k, filters, prefer)
+
+    async def search_by_embedding(
+        self, query_embedding: np.ndarray, top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None, prefer: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches the vector database with an already computed query embedding.
 
-            # Call the database function to find matching articles
-            result = self.supabase.rpc('match_articles', {
-                'query_embedding': query_embedding.tolist(),
+        With a partition hint, only the preferred partitions are searched first;
+        the filtered search over everything runs only if they return fewer than
+        top_k matches, and fills the remaining slots after the preferred ones.
+        Both happen in one match_articles_preferred call.
+
+        Args:
+            query_embedding: Embedding of the query text.
+            top_k: Number of top results to return.
+            filters: Restricts results (source_types, since_days, verified_only).
+            prefer: Partition hint; defaults to the KB_PREFER_* settings.
+
+        Returns:
+            A list of similar articles with their similarity scores.
+        """
+        if not self.embeddings_enabled or not self.supabase:
+            logger.warning("Search failed: Embeddings or Supabase client are not enabled/initialized.")
+            return []
+
+        prefer = DEFAULT_PREFER if prefer is None else prefer
+        if prefer:
+            matches = await self._match_articles(query_embedding, top_k, filters, combine_filters(filters, prefer))
+        else:
+            matches = await self._match_articles(query_embedding, top_k, filters)
+        self._record_hits(matches)
+        return matches
+
+    async def _match_articles(
+        self, query_embedding: np.ndarray, top_k: int, filters: Optional[Dict[str, Any]],
+        prefer_filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        try:
+            # Call the database function to find matching articles.
+            # The supabase client is synchronous, so keep it off the event loop.
+            params = {
+                'query_embedding': vector_literal(query_embedding),
                 'match_threshold': 0.7,  # Adjust this threshold as needed
-                'match_count': top_k
-            }).execute()
+                'match_count': top_k,
+                # Selects the column holding this model's vectors, before and after a cutover
+                'query_model': self.model_name
+            }
+            if KB_VECTOR_SEARCH != "exact":
+                params['search_mode'] = KB_VECTOR_SEARCH
+                if KB_RESCORE_CANDIDATES:
+                    params['candidate_count'] = KB_RESCORE_CANDIDATES
+            params.update(filter_params(filters))
+            if prefer_filters is not None:
+                params.update(filter_params(prefer_filters, 'prefer_'))
+            rpc = self.supabase.rpc('match_articles' if prefer_filters is None else 'match_articles_preferred', params)
+            with track_stage("match_articles"):
+                result = await run_blocking_io(rpc.execute, cap=KB_DB_TIMEOUT_SECONDS, stage="match_articles")
 
             # Check for errors in the RPC call result
             if hasattr(result, 'error') and result.error:
@@ -104,6 +289,8 @@ class RAGSystem:
 
             return result.data if result.data else []
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Vector search failed: {str(e)}", exc_info=True)
             return []
@@ -126,35 +313,242 @@ class RAGSystem:
             # Combine title and content for a richer embedding
             text_to_embed = f"{article['title']} {article['content']}"
 
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None,
-                self.embedding_model.encode,
-                text_to_embed
+            embedding = await self.embed(text_to_embed)
+            await self._insert_article(article, await self._storage_vectors(text_to_embed, embedding))
+            return True
+
+        except Exception as e:
+            # Re-raise the exception so the endpoint returns 500 with details
+            logger.error(f"Failed to add article to knowledge base: {str(e)}", exc_info=True)
+            raise e # Re-raise exception
+
+    async def add_or_merge_article(
+        self, article: Dict[str, Any], retrieved: Iterable[Dict[str, Any]] = (),
+        claim_text: Optional[str] = None, claim_embedding: Optional[np.ndarray] = None
+    ) -> str:
+        """
+        Adds an auto-generated article, or merges it into an existing near-duplicate.
+
+        Duplicates are found locally (see NearDuplicateIndex): same normalized title,
+        embedding similarity, content SimHash distance, or a retrieved auto-generated
+        article that is nearly the same claim. A merge overwrites the existing row's
+        content, verdict and embedding with the newer analysis, keeping its id and title.
+        The text the vectors came from is stored with them when it is not the row's
+        title and content, so app.reembed can re-encode the same text.
+
+        Args:
+            article: Dictionary with title, content, etc.
+            retrieved: Knowledge-base matches already fetched for the claim.
+            claim_text: The claim the article answers.
+            claim_embedding: Embedding of claim_text, if already computed. The
+                article is then indexed by it instead of embedding its own text;
+                its title is the claim, and later lookups are claims too.
+
+        Returns:
+            "inserted" or "merged".
+        """
+        if not self.embeddings_enabled or not self.supabase:
+            raise RuntimeError("Embeddings or Supabase client are not enabled/initialized.")
+
+        if claim_text is not None and claim_embedding is not None:
+            text_to_embed, embedding = claim_text, claim_embedding
+        else:
+            text_to_embed = f"{article['title']} {article['content']}"
+            embedding = await self.embed(text_to_embed)
+        vectors = await self._storage_vectors(text_to_embed, embedding)
+        content_hash = simhash(article["content"])
+        duplicate = self.dedup.find(article["title"], content_hash, embedding, retrieved)
+
+        if duplicate is None:
+            return await self._insert_new(article, content_hash, embedding, vectors, text_to_embed)
+
+        article_id, reason = duplicate
+        update = {
+            'content': article['content'],
+            'verified': article.get('verified', False),
+            # The row keeps its own title, so its vectors never come from its title and content
+            'embedded_text': text_to_embed,
+            **vectors
+        }
+        if article.get('verdict'):
+            update['verdict'] = article['verdict']
+        if article.get('claim_id'):
+            update['claim_id'] = article['claim_id']
+        with track_stage("kb_merge"):
+            result = await run_blocking_io(
+                self.supabase.table('knowledge_base').update(update).eq('id', article_id).execute,
+                cap=KB_DB_TIMEOUT_SECONDS, stage="kb_merge"
             )
+        if hasattr(result, 'error') and result.error:
+            raise Exception(f"{result.error}")
+        if not result.data:
+            # The duplicate was deleted since it was indexed (see app.kb_maintenance)
+            logger.info(f"Near-duplicate {article_id} no longer exists; inserting instead")
+            return await self._insert_new(article, content_hash, embedding, vectors, text_to_embed)
+        self.dedup.record(reason)
+        self.dedup.add(article_id, article["title"], content_hash, embedding)
+        logger.info(f"Merged article into near-duplicate {article_id} ({reason}): {article['title']}")
+        return "merged"
 
-            # Prepare data for insertion into the database
-            db_record = {
-                'title': article['title'],
-                'content': article['content'],
-                'source_url': article.get('source_url'),
-                'source_type': article.get('source_type'),
-                'verified': article.get('verified', False),
-                'embedding': embedding.tolist()
-            }
+    async def _insert_new(
+        self, article: Dict[str, Any], content_hash: int, embedding: np.ndarray, vectors: Dict[str, Any], embedded_text: str
+    ) -> str:
+        self.dedup.record(None)
+        row = await self._insert_article(article, vectors, embedded_text)
+        if row.get("id"):
+            self.dedup.add(str(row["id"]), article["title"], content_hash, embedding)
+        return "inserted"
 
-            # --- Use the service client to insert (bypasses RLS) ---
-            insert_result = self.supabase.table('knowledge_base').insert(db_record).execute()
+    async def _storage_vectors(self, text: str, embedding: np.ndarray) -> Dict[str, Any]:
+        """
+        Embedding columns to write for an article: one per loaded model that has a
+        knowledge_base column. During a re-embedding that is both the current and
+        the next column, so rows written mid-migration need no backfill.
+        """
+        self._refresh_embedding_columns()
+        vectors = {}
+        column = self._column_for(self.model_name)
+        if column:
+            vectors[column] = vector_literal(embedding)
+        else:
+            logger.error(f"No knowledge_base column holds {self.model_name} embeddings; storing the article without one")
+        next_column = self._column_for(self.next_model_name) if self.next_model is not None else None
+        if next_column and next_column != column:
+            async with admit("embedding"):
+                with track_stage("embedding_next"):
+                    vectors[next_column] = vector_literal(await run_blocking(self.next_model.encode, text))
+        return vectors
 
-            # Check for errors after insert
-            if hasattr(insert_result, 'error') and insert_result.error:
-                 # Raise the error to be caught by the endpoint handler
-                 raise Exception(f"{insert_result.error}") # Include specific error message
+    def _column_for(self, model: Optional[str]) -> Optional[str]:
+        if not self._embedding_columns:
+            return DEFAULT_EMBEDDING_COLUMN if model == self.model_name else None
+        return self._embedding_columns.get(model)
 
-            logger.info(f"Successfully added and indexed article: {article['title']}")
-            return True
+    def _load_embedding_columns(self) -> None:
+        """Reads which knowledge_base column holds each model's vectors."""
+        try:
+            rows = self.supabase.table('knowledge_base_embedding_models').select('column_name, model').execute().data or []
+            self._embedding_columns = {row['model']: row['column_name'] for row in rows}
+        except Exception as e:
+            logger.warning(f"Could not load knowledge-base embedding columns, using '{DEFAULT_EMBEDDING_COLUMN}': {e}")
+        self._columns_loaded_at = time.monotonic()
+
+    def _refresh_embedding_columns(self) -> None:
+        """Reloads the column map in the background once it is stale; callers use the current one."""
+        if time.monotonic() - self._columns_loaded_at < KB_EMBEDDING_MAP_REFRESH_SECONDS:
+            return
+        self._columns_loaded_at = time.monotonic()
+        self._in_background(run_blocking(self._load_embedding_columns))
+
+    def _in_background(self, work) -> None:
+        """Runs a coroutine without awaiting it, keeping a reference so it is not garbage-collected mid-run."""
+        task = asyncio.ensure_future(work)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def embedding_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "column": self._column_for(self.model_name),
+            "next_model": self.next_model_name if self.next_model is not None else None,
+            "next_column": self._column_for(self.next_model_name) if self.next_model is not None else None,
+            "columns": dict(self._embedding_columns)
+        }
 
+    def _record_hits(self, matches: List[Dict[str, Any]]) -> None:
+        """
+        Counts retrievals per article and periodically adds them to the rows'
+        retrieval_hits in one RPC, off the request path. Hits are best effort:
+        a failed flush is retried with the next one, and unflushed hits are
+        lost on shutdown.
+        """
+        self._pending_hits.update(str(match['id']) for match in matches if match.get('id'))
+        if (
+            self._flushing_hits
+            or not self._pending_hits
+            or time.monotonic() - self._hits_flushed_at < KB_HIT_FLUSH_SECONDS
+        ):
+            return
+        pending, self._pending_hits = self._pending_hits, Counter()
+        self._hits_flushed_at = time.monotonic()
+        self._flushing_hits = True
+        self._in_background(self._flush_hits(pending))
+
+    async def _flush_hits(self, pending: Counter) -> None:
+        try:
+            ids = list(pending)
+            rpc = self.supabase.rpc('record_article_hits', {
+                'article_ids': ids,
+                'hit_counts': [pending[article_id] for article_id in ids]
+            })
+            with track_stage("kb_record_hits"):
+                await run_blocking(rpc.execute)
         except Exception as e:
-            # Re-raise the exception so the endpoint returns 500 with details
-            logger.error(f"Failed to add article to knowledge base: {str(e)}", exc_info=True)
-            raise e # Re-raise exception
+            logger.warning(f"Could not record retrieval hits for {len(pending)} articles: {e}")
+            self._pending_hits.update(pending)
+        finally:
+            self._flushing_hits = False
+
+    async def _insert_article(self, article: Dict[str, Any], vectors: Dict[str, Any], embedded_text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Inserts one article with its embedding columns and returns the stored row.
+        embedded_text is recorded only when the vectors were not computed from the
+        title and content (NULL means they were).
+        """
+        # Prepare data for insertion into the database
+        db_record = {
+            'title': article['title'],
+            'content': article['content'],
+            'source_url': article.get('source_url'),
+            'source_type': article.get('source_type') or 'curated',  # partition key, never null
+            'verified': article.get('verified', False),
+            **vectors
+        }
+        if article.get('verdict'):
+            db_record['verdict'] = article['verdict']
+        if article.get('claim_id'):
+            db_record['claim_id'] = article['claim_id']
+        if embedded_text is not None and embedded_text != f"{article['title']} {article['content']}":
+            db_record['embedded_text'] = embedded_text
+
+        # --- Use the service client to insert (bypasses RLS) ---
+        with track_stage("kb_insert"):
+            insert_result = await run_blocking_io(
+                self.supabase.table('knowledge_base').insert(db_record).execute,
+                cap=KB_DB_TIMEOUT_SECONDS, stage="kb_insert"
+            )
+
+        # Check for errors after insert
+        if hasattr(insert_result, 'error') and insert_result.error:
+             # Raise the error to be caught by the endpoint handler
+             raise Exception(f"{insert_result.error}") # Include specific error message
+
+        logger.info(f"Successfully added and indexed article: {article['title']}")
+        return insert_result.data[0] if insert_result.data else {}
+
+    def _warm_dedup_index(self) -> None:
+        """Loads the most recent auto-generated articles into the near-duplicate index."""
+        limit = int(os.getenv("KB_DEDUP_WARM", "5000"))
+        if not self.dedup.enabled or limit <= 0:
+            return
+        column = self._column_for(self.model_name)
+        if column is None:
+            return
+        try:
+            rows = (
+                self.supabase.table('knowledge_base')
+                .select(f'id, title, content, {column}')
+                .eq('source_type', 'auto-generated')
+                .order('created_at', desc=True)
+                .limit(limit)
+                .execute()
+                .data
+            ) or []
+            # Oldest first, so the newest end up last in the ring buffer
+            for row in reversed(rows):
+                embedding = parse_embedding(row.get(column))
+                if embedding is not None:
+                    self.dedup.add(str(row['id']), row['title'], simhash(row['content']), embedding)
+            logger.info(f"Near-duplicate index warmed with {len(rows)} auto-generated articles")
+        except Exception as e:
+            logger.warning(f"Could not warm near-duplicate index: {e}")
@@ -0,0 +1,143 @@
+"""
+Cross-encoder reranking for TruthGuard AI
+Reorders retrieved articles by a cross-encoder's relevance to the claim, within
+a time budget, and caches the score of every (claim, article) pair.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from app.services.admission import admit
+from app.services.deadline import budget, run_blocking
+from app.services.metrics import REGISTRY, record_cache_lookup, track_stage
+from app.services.singleflight import normalize_text
+
+logger = logging.getLogger(__name__)
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Knowledge-base candidates fetched for reranking (the LLM still sees the top 5)
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# Longest a request waits for scores before falling back to bi-encoder order
+RERANK_BUDGET_SECONDS = float(os.getenv("RERANK_BUDGET_MS", "250")) / 1000
+# Relevance at or above which an article counts toward sufficient context
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.5"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+# Tokens per (claim, article) pair; longer articles are truncated by the tokenizer
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+
+RERANK_OUTCOMES = REGISTRY.counter(
+    "truthguard_rerank_total", "Rerank attempts by outcome (ok, cached, timeout, error).", ["outcome"]
+)
+
+
+class CrossEncoderReranker:
+    """
+    Scores (claim, article) pairs with a small CPU cross-encoder.
+
+    Uncached pairs for one claim are scored in a single batched forward pass.
+    If that takes longer than the budget the caller keeps the bi-encoder order;
+    the pass still finishes in the background and fills the cache.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL):
+        # Imported here so the service runs without sentence-transformers when reranking is off
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=RERANK_MAX_LENGTH, device="cpu")
+        self.candidates = RERANK_CANDIDATES
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        logger.info(f"Loaded cross-encoder reranker: {model_name}")
+
+    async def rerank(self, claim: str, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Returns the articles sorted by relevance, each copied with a `rerank_score`
+        in [0, 1]. Returns them unchanged if scoring misses the budget or fails.
+        """
+        if len(articles) < 2:
+            return articles
+        claim_key = hashlib.sha1(normalize_text(claim).encode("utf-8")).hexdigest()
+        keys = [(claim_key, self._article_id(article)) for article in articles]
+
+        with self._lock:
+            scores = {key: self._cache[key] for key in keys if key in self._cache}
+            for key in scores:
+                self._cache.move_to_end(key)
+        for key in keys:
+            record_cache_lookup("rerank", key in scores)
+
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        if missing:
+            task = asyncio.ensure_future(
+                self._score(claim, [articles[i] for i in missing], [keys[i] for i in missing])
+            )
+            try:
+                done, _ = await asyncio.wait({task}, timeout=budget(RERANK_BUDGET_SECONDS, "rerank"))
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            if not done:
+                RERANK_OUTCOMES.inc(outcome="timeout")
+                task.add_done_callback(self._log_late_failure)
+                logger.warning(f"Rerank exceeded {RERANK_BUDGET_SECONDS * 1000:.0f}ms; keeping retrieval order")
+                return articles
+            try:
+                scores.update(task.result())
+            except Exception as e:
+                RERANK_OUTCOMES.inc(outcome="error")
+                logger.error(f"Rerank failed, keeping retrieval order: {e}")
+                return articles
+            RERANK_OUTCOMES.inc(outcome="ok")
+        else:
+            RERANK_OUTCOMES.inc(outcome="cached")
+
+        scored = [{**article, "rerank_score": scores[key]} for article, key in zip(articles, keys)]
+        scored.sort(key=lambda article: article["rerank_score"], reverse=True)
+        return scored
+
+    async def _score(self, claim: str, articles: List[Dict[str, Any]], keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        pairs = [(claim, f"{article.get('title', '')}\n{article.get('content', '')}") for article in articles]
+        async with admit("rerank"):
+            with track_stage("rerank"):
+                # Single-label cross-encoders return sigmoid relevance from predict()
+                scores = await run_blocking(
+                    lambda: self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+                )
+        result = {key: float(score) for key, score in zip(keys, scores)}
+        with self._lock:
+            self._cache.update(result)
+            while len(self._cache) > RERANK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _article_id(article: Dict[str, Any]) -> str:
+        identifier = article.get("id") or article.get("source_url")
+        if identifier:
+            return str(identifier)
+        text = f"{article.get('title', '')}\n{article.get('content', '')}"
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _log_late_failure(task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background rerank failed: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "model": self.model_name,
+            "candidates": self.candidates,
+            "budget_ms": RERANK_BUDGET_SECONDS * 1000,
+            "min_score": RERANK_MIN_SCORE,
+            "cached_pairs": cached,
+            "outcomes": {outcome: RERANK_OUTCOMES.value(outcome=outcome) for outcome in ("ok", "cached", "timeout", "error")},
+        }
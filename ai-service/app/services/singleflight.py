@@ -0,0 +1,109 @@
+"""
+Single-flight request coalescing for TruthGuard AI
+Concurrent callers with the same content fingerprint share one execution of the pipeline
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+
+from app.services.deadline import Deadline, DeadlineExceeded, current_deadline, remaining, use_deadline
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercases and collapses whitespace so trivially different submissions match."""
+    return " ".join((text or "").lower().split())
+
+def file_fingerprint(file_ref: Optional[str]) -> str:
+    """
+    Identifies an attached file without reading it: local files by path, size
+    and modification time, remote files by their URL.
+    """
+    if not file_ref:
+        return ""
+    if os.path.isfile(file_ref):
+        stat = os.stat(file_ref)
+        return f"file:{os.path.realpath(file_ref)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return f"url:{file_ref.strip()}"
+
+def fingerprint(*parts: Any) -> str:
+    """Builds a stable key from already-normalized parts."""
+    joined = "\x1f".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "deadline")
+
+    def __init__(self, task: asyncio.Future, deadline: Deadline):
+        self.task = task
+        self.waiters = 0
+        self.deadline = deadline
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent executions keyed by fingerprint.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    await the same task. The shared task is only cancelled once every waiter
+    has gone away, so one disconnecting client never fails the others.
+
+    The shared task runs until the latest deadline among its waiters, and each
+    waiter stops waiting at its own deadline with DeadlineExceeded.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            # The task gets a deadline of its own, which later waiters can extend
+            deadline = Deadline(current_deadline())
+            context = contextvars.copy_context()
+            context.run(use_deadline, deadline)
+            call = _Call(context.run(asyncio.ensure_future, factory()), deadline)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, k=key, c=call: self._forget(k, c))
+            self.executed += 1
+        else:
+            call.deadline.extend_to(current_deadline())
+            self.coalesced += 1
+            logger.info(f"[single-flight:{self.name}] Coalesced duplicate request {key[:12]}")
+
+        call.waiters += 1
+        try:
+            left = remaining()
+            if left is None:
+                return await asyncio.shield(call.task)
+            if left <= 0:
+                raise DeadlineExceeded(self.name)
+            try:
+                return await asyncio.wait_for(asyncio.shield(call.task), left)
+            except asyncio.TimeoutError:
+                if call.task.done():
+                    raise
+                raise DeadlineExceeded(self.name)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
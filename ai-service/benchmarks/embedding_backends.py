@@ -0,0 +1,164 @@
+"""
+Embedding backend benchmark for TruthGuard AI
+
+Compares each EMBEDDING_BACKEND against the fp32 torch baseline on encode
+throughput, single-query latency, embedding drift and retrieval recall@k.
+
+Usage (from ai-service/):
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends onnx onnx-int8 --corpus claims.txt --json results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.embedding_backends import EMBEDDING_BACKENDS, load_embedding_model
+
+SAMPLE_CLAIMS = [
+    "The government has banned the sale of petrol cars from next year.",
+    "Drinking hot water with lemon cures viral infections.",
+    "The new education policy makes three languages compulsory in all schools.",
+    "A video shows floods in the capital city this morning.",
+    "5G towers are spreading the virus in rural areas.",
+    "The central bank raised interest rates by two percent overnight.",
+    "Vaccines contain microchips used to track citizens.",
+    "The prime minister announced free electricity for all households.",
+    "Scientists confirmed that the moon landing footage was staged.",
+    "The city metro will be free for students starting in June.",
+    "Eating garlic every day prevents cancer.",
+    "The election commission postponed voting in three states.",
+    "A new law allows police to seize phones without a warrant.",
+    "Unemployment has fallen to its lowest level in twenty years.",
+    "The WHO declared a new global pandemic last week.",
+    "Solar panels stop working completely on cloudy days.",
+    "The national highway toll has been abolished.",
+    "Mobile data prices will double from next month.",
+    "The river water in the city has been declared safe to drink.",
+    "The supreme court struck down the new citizenship rules.",
+]
+
+def load_corpus(path: str, size: int) -> List[str]:
+    """Reads one text per line (or JSONL with title/content), or synthesizes a corpus."""
+    if path:
+        texts = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    record = json.loads(line)
+                    line = f"{record.get('title', '')} {record.get('content', '')}".strip()
+                texts.append(line)
+        return texts[:size] if size else texts
+
+    rng = np.random.default_rng(7)
+    qualifiers = ["", "Breaking: ", "Viral post claims ", "Reports say ", "According to a forward, "]
+    suffixes = ["", " Share before it is deleted.", " Officials have not commented.", " Is this true?"]
+    return [
+        f"{qualifiers[rng.integers(len(qualifiers))]}{SAMPLE_CLAIMS[i % len(SAMPLE_CLAIMS)]}"
+        f"{suffixes[rng.integers(len(suffixes))]} (#{i})"
+        for i in range(size)
+    ]
+
+def make_queries(corpus: List[str], count: int) -> List[str]:
+    """Paraphrase-like queries: lowercased corpus entries with the last word dropped."""
+    step = max(1, len(corpus) // count)
+    return [" ".join(text.lower().split()[:-1]) for text in corpus[::step][:count]]
+
+def unit(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = unit(queries) @ unit(corpus).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def benchmark_backend(model_name: str, backend: str, corpus: List[str], queries: List[str], batch_size: int) -> Dict:
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_seconds = time.perf_counter() - start
+
+    model.encode(corpus[:batch_size], batch_size=batch_size)  # warm-up
+
+    start = time.perf_counter()
+    corpus_embeddings = np.asarray(model.encode(corpus, batch_size=batch_size, show_progress_bar=False))
+    encode_seconds = time.perf_counter() - start
+
+    latencies = []
+    query_embeddings = []
+    for query in queries:
+        start = time.perf_counter()
+        query_embeddings.append(model.encode(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    return {
+        "backend": backend,
+        "dimension": int(corpus_embeddings.shape[1]),
+        "load_seconds": round(load_seconds, 2),
+        "throughput_per_second": round(len(corpus) / encode_seconds, 1),
+        "latency_ms_p50": round(statistics.median(latencies), 2),
+        "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "corpus_embeddings": corpus_embeddings,
+        "query_embeddings": np.asarray(query_embeddings),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--backends", nargs="+", default=[b for b in EMBEDDING_BACKENDS if b != "torch"],
+                        choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--corpus", default="", help="Text or JSONL file; a synthetic corpus is used if omitted")
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=5, help="Cut-off for retrieval recall")
+    parser.add_argument("--json", default="", help="Write results to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.corpus_size)
+    queries = make_queries(corpus, args.queries)
+    print(f"Corpus: {len(corpus)} texts, {len(queries)} queries, model {args.model}\n")
+
+    baseline = benchmark_backend(args.model, "torch", corpus, queries, args.batch_size)
+    baseline_top = top_k(baseline["query_embeddings"], baseline["corpus_embeddings"], args.k)
+
+    results = []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        run = baseline if backend == "torch" else benchmark_backend(args.model, backend, corpus, queries, args.batch_size)
+        if run["dimension"] != baseline["dimension"]:
+            print(f"{backend}: dimension {run['dimension']} != baseline {baseline['dimension']}, skipping drift/recall")
+            continue
+        cosine = np.sum(unit(run["corpus_embeddings"]) * unit(baseline["corpus_embeddings"]), axis=1)
+        run_top = top_k(run["query_embeddings"], run["corpus_embeddings"], args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(run_top, baseline_top)])
+        row = {key: value for key, value in run.items() if not key.endswith("_embeddings")}
+        row.update({
+            "speedup": round(row["throughput_per_second"] / baseline["throughput_per_second"], 2),
+            "cosine_to_fp32_mean": round(float(cosine.mean()), 5),
+            "cosine_to_fp32_min": round(float(cosine.min()), 5),
+            f"recall_at_{args.k}": round(float(recall), 4),
+        })
+        results.append(row)
+
+    header = ["backend", "dimension", "throughput_per_second", "speedup", "latency_ms_p50", "latency_ms_p95",
+              "cosine_to_fp32_mean", "cosine_to_fp32_min", f"recall_at_{args.k}", "load_seconds"]
+    widths = [max(len(h), 10) for h in header]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in results:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(header, widths)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "corpus_size": len(corpus), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Local stand-ins for the AI service's external dependencies
+
+One FastAPI app serves fake OpenRouter, Serper, scrape targets, Supabase
+(the match_articles, match_articles_preferred and record_article_hits RPCs,
+and the knowledge_base table) and media files, each with a configurable
+latency, so the pipeline can be benchmarked without network.
+
+    OPENROUTER_BASE_URL  -> {base}/openrouter
+    SERPER_URL           -> {base}/serper/search
+    SUPABASE_URL         -> {base}/supabase
+    media / scrape pages -> {base}/media/<file>, {base}/pages/<slug>
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+
+# Mean latency per fake upstream, in milliseconds
+DEFAULT_LATENCIES_MS = {
+    "openrouter": 1200.0,
+    "serper": 300.0,
+    "scrape": 150.0,
+    "supabase": 25.0,
+    "media": 40.0,
+}
+VERDICTS = ["true", "false", "misleading", "uncertain"]
+
+
+class FakeUpstreams:
+    """Configuration and counters shared by the fake endpoints."""
+
+    def __init__(
+        self,
+        latencies_ms: Optional[Dict[str, float]] = None,
+        jitter: float = 0.25,
+        kb_matches: int = 3,
+        kb_similarity: float = 0.72,
+        media_dir: Optional[str] = None,
+        seed: int = 7,
+        model_latencies_ms: Optional[Dict[str, float]] = None,
+        model_error_rates: Optional[Dict[str, float]] = None
+    ):
+        self.latencies_ms = {**DEFAULT_LATENCIES_MS, **(latencies_ms or {})}
+        self.jitter = jitter
+        # Average similarity below 0.75 makes the classifier fall back to web search
+        self.kb_matches = kb_matches
+        self.kb_similarity = kb_similarity
+        self.media_dir = media_dir
+        # Per-model overrides for the fake LLM, to exercise routing, failover and hedging
+        self.model_latencies_ms = model_latencies_ms or {}
+        self.model_error_rates = model_error_rates or {}
+        self.calls: Dict[str, int] = {name: 0 for name in self.latencies_ms}
+        self._random = random.Random(seed)
+
+    async def delay(self, upstream: str, mean_ms: Optional[float] = None) -> None:
+        self.calls[upstream] = self.calls.get(upstream, 0) + 1
+        mean = (self.latencies_ms.get(upstream, 0.0) if mean_ms is None else mean_ms) / 1000
+        if mean > 0:
+            await asyncio.sleep(max(0.0, mean * (1 + self.jitter * self._random.uniform(-1, 1))))
+
+    def fails(self, model: str) -> bool:
+        return self._random.random() < self.model_error_rates.get(model, 0.0)
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def create_fake_app(upstreams: FakeUpstreams) -> FastAPI:
+    app = FastAPI(title="TruthGuard benchmark fakes")
+
+    @app.post("/openrouter/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model") or "default"
+        await upstreams.delay("openrouter", upstreams.model_latencies_ms.get(model))
+        if upstreams.fails(model):
+            return JSONResponse(status_code=503, content={"error": {"message": f"{model} is unavailable"}})
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        digest = _digest(prompt)
+        analysis = {
+            "verdict": VERDICTS[digest % len(VERDICTS)],
+            "confidence_score": round(0.55 + (digest % 40) / 100, 2),
+            "summary": "Benchmark analysis generated by the fake LLM endpoint.",
+            "reasoning": "The fake endpoint derives a stable verdict from the prompt hash."
+        }
+        return {
+            "id": f"bench-{digest}",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(analysis)}}]
+        }
+
+    @app.post("/serper/search")
+    async def serper_search(request: Request):
+        body = json.loads(await request.body() or b"{}")
+        await upstreams.delay("serper")
+        slug = _digest(body.get("q", ""))
+        base = str(request.base_url).rstrip("/")
+        return {"organic": [
+            {"title": f"Fact-check report {slug}-{i}", "link": f"{base}/pages/{slug}-{i}", "snippet": "..."}
+            for i in range(3)
+        ]}
+
+    @app.get("/pages/{slug}", response_class=HTMLResponse)
+    async def scrape_target(slug: str):
+        await upstreams.delay("scrape")
+        paragraphs = "".join(
+            f"<p>Paragraph {i} of report {slug}: officials reviewed the claim and published their findings.</p>"
+            for i in range(20)
+        )
+        return f"<html><head><title>{slug}</title><script>var x=1;</script></head><body><nav>menu</nav>{paragraphs}<footer>f</footer></body></html>"
+
+    def kb_matches(body: Dict) -> list:
+        count = min(upstreams.kb_matches, int(body.get("match_count", 5)))
+        return [
+            {
+                "id": f"00000000-0000-0000-0000-{i:012d}",
+                "title": f"Knowledge base article {i}",
+                "content": "Previously verified fact-check content used as retrieval context. " * 5,
+                "source_url": f"https://example.org/kb/{i}",
+                "source_type": "fact-check",
+                "verified": True,
+                "verdict": None,
+                "claim_id": None,
+                "similarity": upstreams.kb_similarity
+            }
+            for i in range(count)
+        ]
+
+    @app.post("/supabase/rest/v1/rpc/match_articles")
+    async def match_articles(request: Request):
+        body = await request.json()
+        await upstreams.delay("supabase")
+        return kb_matches(body)
+
+    @app.post("/supabase/rest/v1/rpc/match_articles_preferred")
+    async def match_articles_preferred(request: Request):
+        # One call either way: the preferred partitions already fill the fake's matches
+        body = await request.json()
+        await upstreams.delay("supabase")
+        return kb_matches(body)
+
+    @app.post("/supabase/rest/v1/rpc/record_article_hits")
+    async def record_article_hits(request: Request):
+        await request.json()
+        await upstreams.delay("supabase")
+        return Response(status_code=204)
+
+    @app.get("/supabase/rest/v1/knowledge_base")
+    async def select_knowledge_base():
+        await upstreams.delay("supabase")
+        return []
+
+    @app.post("/supabase/rest/v1/knowledge_base")
+    async def insert_knowledge_base(request: Request):
+        body = await request.json()
+        await upstreams.delay("supabase")
+        rows = body if isinstance(body, list) else [body]
+        return JSONResponse(status_code=201, content=[{"id": str(uuid.uuid4()), **row, "embedding": None} for row in rows])
+
+    @app.patch("/supabase/rest/v1/knowledge_base")
+    async def update_knowledge_base(request: Request):
+        body = await request.json()
+        await upstreams.delay("supabase")
+        article_id = request.query_params.get("id", "eq.").split(".", 1)[-1]
+        return [{**body, "id": article_id, "embedding": None}]
+
+    @app.get("/supabase/rest/v1/knowledge_base_embedding_models")
+    async def select_embedding_models():
+        # No re-embedding has run: the service uses the default "embedding" column
+        return []
+
+    @app.get("/media/{name}")
+    async def media(name: str):
+        await upstreams.delay("media")
+        path = os.path.join(upstreams.media_dir or "", os.path.basename(name))
+        if not upstreams.media_dir or not os.path.exists(path):
+            return Response(status_code=404)
+        return FileResponse(path)
+
+    @app.get("/calls")
+    async def calls():
+        return upstreams.calls
+
+    return app
+
+
+class FakeServer:
+    """Runs the fake app with uvicorn in a background thread."""
+
+    def __init__(self, upstreams: FakeUpstreams, host: str = "127.0.0.1", port: int = 8901):
+        import uvicorn
+
+        self.base_url = f"http://{host}:{port}"
+        config = uvicorn.Config(create_fake_app(upstreams), host=host, port=port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self, timeout: float = 10.0) -> "FakeServer":
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake upstream server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the AI service at these fakes."""
+        return {
+            "OPENROUTER_API_KEY": "benchmark",
+            "OPENROUTER_BASE_URL": f"{self.base_url}/openrouter",
+            "MODEL_NAME": "benchmark/fake-model",
+            "SERPER_API_KEY": "benchmark",
+            "SERPER_URL": f"{self.base_url}/serper/search",
+            "SUPABASE_URL": f"{self.base_url}/supabase",
+            "SUPABASE_SERVICE_KEY": "benchmark",
+        }
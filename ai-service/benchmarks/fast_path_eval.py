@@ -0,0 +1,220 @@
+"""
+Offline evaluation and calibration of the verdict fast path
+
+Replays labelled claims in submission order. Each claim is voted on by the
+earlier claims (what the prior-analysis index would hold) and by the knowledge
+base as the service would retrieve it: the auto-generated article and backend
+fact-check every earlier analysis left behind, plus optional external
+fact-checks that record a verdict. Rows derived from an earlier claim carry its
+id, so, as in the service, that claim votes once. Every threshold combination
+is scored on precision against the LLM verdicts and on the fraction of claims
+it answers without the LLM; the widest-coverage setting whose precision lower
+bound meets the target is written out as a FAST_PATH_CALIBRATION file.
+
+Input is JSONL with the claim text and the LLM's verdict per line (summary and
+reasoning, when present, make the modelled fact-check rows more faithful):
+    {"content": "...", "verdict": "false", "summary": "...", "reasoning": "..."}
+or exported from Supabase (claims joined with claim_analyses, oldest first).
+
+Usage (from ai-service/):
+    python -m benchmarks.fast_path_eval --claims labelled.jsonl --kb kb.jsonl --write-calibration fast_path.json
+    python -m benchmarks.fast_path_eval --from-supabase 5000 --target-precision 0.97
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_backends import load_embedding_model
+from app.services.fast_path import Neighbour, VerdictFastPath
+
+# Same cut-off as RAGSystem.search_by_embedding
+KB_MATCH_THRESHOLD = 0.7
+
+GRID = {
+    "min_similarity": [0.8, 0.85, 0.9, 0.93, 0.95],
+    "min_votes": [1, 2, 3, 5],
+    "min_confidence": [0.6, 0.7, 0.8, 0.9, 0.95, 1.0],
+}
+
+def load_labelled(path: str) -> List[Dict[str, str]]:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("content") or record.get("claim") or f"{record.get('title', '')} {record.get('content', '')}".strip()
+            if text and record.get("verdict"):
+                records.append({
+                    "text": text, "verdict": record["verdict"],
+                    "summary": record.get("summary", ""), "reasoning": record.get("reasoning", "")
+                })
+    return records
+
+def export_from_supabase(limit: int) -> List[Dict[str, str]]:
+    """Claims with a stored analysis, oldest first."""
+    from supabase import create_client
+
+    client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+    rows = (
+        client.table("claims")
+        .select("content, created_at, claim_analyses!inner(verdict, summary, ai_reasoning)")
+        .order("created_at")
+        .limit(limit)
+        .execute()
+        .data
+    )
+    records = []
+    for row in rows:
+        analysis = row["claim_analyses"]
+        analysis = analysis[0] if isinstance(analysis, list) else analysis
+        if analysis and analysis.get("verdict"):
+            records.append({
+                "text": row["content"], "verdict": analysis["verdict"],
+                "summary": analysis.get("summary") or "", "reasoning": analysis.get("ai_reasoning") or ""
+            })
+    return records
+
+def fact_check_text(record: Dict[str, str]) -> str:
+    """Title and content of the backend's fact-check row for an analysis (add_analysis_to_knowledge_base)."""
+    title = f"Fact-Check for claim: '{record['text'][:50]}...'"
+    return f"{title} {record['summary']}\n\nReasoning: {record['reasoning']}"
+
+def unit(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+def build_neighbours(claims: np.ndarray, verdicts: List[str], fact_checks: np.ndarray,
+                     kb: np.ndarray, kb_verdicts: List[str], k: int, kb_k: int) -> List[List[Neighbour]]:
+    """
+    Neighbours each claim would have seen at submission time: the k most similar
+    earlier claims that got a definite verdict (the prior index skips "uncertain"),
+    plus the kb_k best knowledge-base matches above the retrieval threshold. The
+    knowledge base then holds every earlier claim's auto-generated article (under
+    the claim's embedding) and fact-check row, and the external articles in kb.
+    """
+    similarities = unit(claims) @ unit(claims).T
+    fact_check_similarities = unit(claims) @ unit(fact_checks).T
+    kb_similarities = unit(claims) @ unit(kb).T if len(kb) else np.zeros((len(claims), 0))
+    indexed = np.array([v != "uncertain" for v in verdicts])
+    neighbours = []
+    for i in range(len(claims)):
+        earlier = np.flatnonzero(indexed[:i])
+        top = earlier[np.argsort(-similarities[i, earlier])[:k]] if len(earlier) else []
+        found: List[Neighbour] = [(float(similarities[i, j]), verdicts[j], str(j)) for j in top]
+        # (similarity, verdict, originating claim) of every knowledge-base row
+        rows: List[Tuple[float, str, Optional[str]]] = []
+        for j in range(i):
+            rows.append((float(similarities[i, j]), verdicts[j], str(j)))  # auto-generated article
+            rows.append((float(fact_check_similarities[i, j]), verdicts[j], str(j)))  # backend fact-check
+        rows.extend((float(kb_similarities[i, j]), kb_verdicts[j], None) for j in range(kb_similarities.shape[1]))
+        rows.sort(key=lambda row: -row[0])
+        found.extend(row for row in rows[:kb_k] if row[0] > KB_MATCH_THRESHOLD and row[1])
+        neighbours.append(found)
+    return neighbours
+
+def wilson_lower_bound(correct: int, total: int, z: float = 1.96) -> float:
+    """95% lower confidence bound on a precision, so tiny samples cannot look perfect."""
+    if total == 0:
+        return 0.0
+    p = correct / total
+    denominator = 1 + z * z / total
+    centre = p + z * z / (2 * total)
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total))
+    return (centre - margin) / denominator
+
+def evaluate(neighbours: List[List[Neighbour]], verdicts: List[str], thresholds: Dict[str, float]) -> Dict:
+    fast_path = VerdictFastPath(thresholds=thresholds)
+    fast_path.enabled = True
+    answered = correct = 0
+    for found, truth in zip(neighbours, verdicts):
+        decision = fast_path.decide(found)
+        if decision is not None:
+            answered += 1
+            correct += int(decision["verdict"] == truth)
+    return {
+        **thresholds,
+        "answered": answered,
+        "coverage": round(answered / len(verdicts), 4) if verdicts else 0.0,
+        "precision": round(correct / answered, 4) if answered else None,
+        "precision_lower_bound": round(wilson_lower_bound(correct, answered), 4),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--claims", help="JSONL of claims with their LLM verdicts, oldest first")
+    source.add_argument("--from-supabase", type=int, metavar="N", help="Export the N oldest analyzed claims")
+    parser.add_argument("--kb", default="", help="JSONL of knowledge-base articles (title, content, verdict)")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--neighbours", type=int, default=int(os.getenv("FAST_PATH_NEIGHBOURS", "10")),
+                        help="Prior analyses consulted per claim")
+    parser.add_argument("--kb-matches", type=int, default=5, help="Knowledge-base matches per claim")
+    parser.add_argument("--target-precision", type=float, default=0.95,
+                        help="Required lower bound on precision against the LLM verdicts")
+    parser.add_argument("--top", type=int, default=15, help="Rows of the coverage/precision table to print")
+    parser.add_argument("--json", default="", help="Write every evaluated setting to this file")
+    parser.add_argument("--write-calibration", default="", help="Write the chosen thresholds here (FAST_PATH_CALIBRATION)")
+    args = parser.parse_args()
+
+    records = load_labelled(args.claims) if args.claims else export_from_supabase(args.from_supabase)
+    kb_records = load_labelled(args.kb) if args.kb else []
+    if len(records) < 2:
+        print("Need at least two labelled claims.")
+        return 1
+    verdicts = [r["verdict"] for r in records]
+    print(f"{len(records)} labelled claims, {len(kb_records)} knowledge-base articles, model {args.model} ({args.backend})")
+
+    model = load_embedding_model(args.model, args.backend)
+    claims = np.asarray(model.encode([r["text"] for r in records], batch_size=32, show_progress_bar=False))
+    fact_checks = np.asarray(model.encode([fact_check_text(r) for r in records], batch_size=32, show_progress_bar=False))
+    kb = np.asarray(model.encode([r["text"] for r in kb_records], batch_size=32, show_progress_bar=False)) if kb_records else np.zeros((0, claims.shape[1]))
+    neighbours = build_neighbours(claims, verdicts, fact_checks, kb, [r["verdict"] for r in kb_records], args.neighbours, args.kb_matches)
+
+    results = [
+        evaluate(neighbours, verdicts, dict(zip(GRID, values)))
+        for values in itertools.product(*GRID.values())
+    ]
+    eligible = [r for r in results if r["answered"] and r["precision_lower_bound"] >= args.target_precision]
+    # Widest coverage first; ties go to the stricter setting
+    eligible.sort(key=lambda r: (-r["coverage"], -r["min_similarity"], -r["min_confidence"], -r["min_votes"]))
+    chosen = eligible[0] if eligible else None
+
+    header = ["min_similarity", "min_votes", "min_confidence", "answered", "coverage", "precision", "precision_lower_bound"]
+    widths = [max(len(h), 8) for h in header]
+    shown = sorted((r for r in results if r["answered"]), key=lambda r: (-r["precision_lower_bound"], -r["coverage"]))
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in shown[:args.top]:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(header, widths)))
+
+    if chosen is None:
+        print(f"\nNo setting reaches a precision lower bound of {args.target_precision}; keep the fast path disabled or collect more labels.")
+    else:
+        print(f"\nChosen: {json.dumps({k: chosen[k] for k in GRID})}")
+        print(f"Answers {chosen['coverage']:.1%} of claims without the LLM at precision {chosen['precision']:.3f} "
+              f"(lower bound {chosen['precision_lower_bound']:.3f})")
+        # What the same thresholds would do if each copy of an analysis voted on its own
+        counted_twice = evaluate([[(s, v, None) for s, v, _ in found] for found in neighbours], verdicts, {k: chosen[k] for k in GRID})
+        print(f"Counting every copy of an analysis would answer {counted_twice['coverage']:.1%} "
+              f"at precision {counted_twice['precision']} (lower bound {counted_twice['precision_lower_bound']:.3f})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"claims": len(records), "kb_articles": len(kb_records), "chosen": chosen, "results": results}, f, indent=2)
+    if args.write_calibration and chosen is not None:
+        with open(args.write_calibration, "w") as f:
+            json.dump({**{k: chosen[k] for k in GRID},
+                       "coverage": chosen["coverage"], "precision": chosen["precision"],
+                       "claims": len(records), "model": args.model}, f, indent=2)
+        print(f"Wrote {args.write_calibration}")
+    return 0 if chosen is not None else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Partitioned knowledge base: filtered search latency and recall
+
+Loads the same synthetic knowledge base into two scratch tables in a pgvector
+database: a flat table with one HNSW index, and one partitioned like
+knowledge_base in database/schema.sql (LIST by source_type, generated types
+sub-partitioned by quarter of created_at, one HNSW index per partition). It
+then times the filters match_articles accepts on both, with the SQL shape of
+its exact mode:
+
+    all          no filter
+    fact-check   source_types = ['fact-check']
+    recent       since = now - 7 days (breaking claims)
+    verified     source_types = ['fact-check'], verified_only, last 90 days
+
+For each it reports p50/p95 latency, recall@k against an exact filtered
+search done in numpy, the mean number of rows returned (a filtered HNSW scan
+on the flat table can come back short) and the share of rows in the
+partitions the filter leaves after pruning.
+
+Usage (from ai-service/):
+    python -m benchmarks.kb_partitions --rows 1000000 --dsn postgresql://postgres@localhost/bench
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.rag_system import vector_literal
+from benchmarks.vector_storage import connect, summarize, synthetic_vectors, unit
+
+# Share of rows per source type, roughly what claim traffic leaves behind
+SOURCE_MIX = {"auto-generated": 0.80, "fact-check": 0.10, "web_search": 0.07, "curated": 0.03}
+# Sub-partitioned by created_at in schema.sql; curated rows go to the default partition
+DATED_TYPES = ("fact-check", "auto-generated", "web_search")
+VERIFIED_SHARE = {"auto-generated": 0.05, "fact-check": 0.6, "web_search": 0.05, "curated": 1.0}
+FILTERS = {
+    "all": {},
+    "fact-check": {"source_types": ["fact-check"]},
+    "recent": {"since_days": 7},
+    "verified": {"source_types": ["fact-check"], "since_days": 90, "verified_only": True},
+}
+
+
+def synthetic_metadata(count: int, days: int, now: datetime, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Source type, age and verified flag per row; ages are uniform over the window."""
+    rng = np.random.default_rng(seed)
+    types = np.array(list(SOURCE_MIX))
+    source_type = rng.choice(types, size=count, p=list(SOURCE_MIX.values()))
+    age_seconds = rng.uniform(0, days * 86400, size=count)
+    verified_share = np.vectorize(VERIFIED_SHARE.get)(source_type)
+    return {
+        "source_type": source_type,
+        "created_at": np.array([now - timedelta(seconds=float(s)) for s in age_seconds]),
+        "verified": rng.random(count) < verified_share,
+    }
+
+
+def quarter_start(moment: datetime) -> datetime:
+    return datetime(moment.year, 3 * ((moment.month - 1) // 3) + 1, 1, tzinfo=timezone.utc)
+
+
+def next_quarter(start: datetime) -> datetime:
+    return datetime(start.year + start.month // 10, (start.month + 2) % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def filter_mask(meta: Dict[str, np.ndarray], filters: Dict, now: datetime) -> np.ndarray:
+    mask = np.ones(len(meta["source_type"]), dtype=bool)
+    if filters.get("source_types"):
+        mask &= np.isin(meta["source_type"], filters["source_types"])
+    if filters.get("since_days"):
+        mask &= meta["created_at"] >= now - timedelta(days=filters["since_days"])
+    if filters.get("verified_only"):
+        mask &= meta["verified"]
+    return mask
+
+
+def pruned_share(meta: Dict[str, np.ndarray], filters: Dict, now: datetime) -> float:
+    """Share of rows in the partitions left after pruning on source type and quarter."""
+    keep = np.ones(len(meta["source_type"]), dtype=bool)
+    if filters.get("source_types"):
+        keep &= np.isin(meta["source_type"], filters["source_types"])
+    if filters.get("since_days"):
+        since = quarter_start(now - timedelta(days=filters["since_days"]))
+        # Curated rows are not dated, so their partition is always scanned
+        keep &= (meta["created_at"] >= since) | ~np.isin(meta["source_type"], DATED_TYPES)
+    return float(keep.mean())
+
+
+def where_clause(filters: Dict) -> str:
+    clauses = []
+    if filters.get("source_types"):
+        clauses.append("source_type = ANY(%(types)s)")
+    if filters.get("since_days"):
+        clauses.append("created_at >= %(since)s")
+    if filters.get("verified_only"):
+        clauses.append("verified")
+    return f"WHERE {' AND '.join(clauses)} " if clauses else ""
+
+
+def create_flat(cur, table: str, dim: int) -> None:
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(
+        f"CREATE TABLE {table} (id bigint PRIMARY KEY, source_type text NOT NULL, "
+        f"created_at timestamptz NOT NULL, verified boolean NOT NULL, embedding vector({dim}))"
+    )
+
+
+def create_partitioned(cur, table: str, dim: int, oldest: datetime, now: datetime) -> None:
+    """Same layout as knowledge_base: LIST by source type, quarterly RANGE for generated types."""
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(
+        f"CREATE TABLE {table} (id bigint, source_type text NOT NULL, created_at timestamptz NOT NULL, "
+        f"verified boolean NOT NULL, embedding vector({dim}), PRIMARY KEY (id, source_type, created_at)) "
+        f"PARTITION BY LIST (source_type)"
+    )
+    for source_type in DATED_TYPES:
+        parent = f"{table}_{source_type.replace('-', '_')}"
+        cur.execute(
+            f"CREATE TABLE {parent} PARTITION OF {table} FOR VALUES IN ('{source_type}') PARTITION BY RANGE (created_at)"
+        )
+        cur.execute(f"CREATE TABLE {parent}_default PARTITION OF {parent} DEFAULT")
+        start = quarter_start(oldest)
+        while start <= now:
+            end = next_quarter(start)
+            cur.execute(
+                f"CREATE TABLE {parent}_{start.year}_q{(start.month - 1) // 3 + 1} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            start = end
+    cur.execute(f"CREATE TABLE {table}_curated PARTITION OF {table} DEFAULT")
+
+
+def copy_rows(cur, table: str, vectors: np.ndarray, meta: Dict[str, np.ndarray]) -> None:
+    with cur.copy(f"COPY {table} (id, source_type, created_at, verified, embedding) FROM STDIN") as copy:
+        for i, vector in enumerate(vectors):
+            copy.write_row((i, meta["source_type"][i], meta["created_at"][i], bool(meta["verified"][i]), vector_literal(vector)))
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, mask: np.ndarray, k: int) -> List[set]:
+    ids = np.flatnonzero(mask)
+    subset = vectors if len(ids) == len(vectors) else vectors[ids]
+    truth = []
+    for query in queries:
+        scores = subset @ query
+        top = ids[np.argpartition(-scores, min(k, len(ids)) - 1)[:k]] if len(ids) else ids
+        truth.append(set(top.tolist()))
+    return truth
+
+
+def measure(cur, sql: str, queries: np.ndarray, params: Dict, truth: List[set], k: int) -> Dict[str, float]:
+    latencies, recalls, returned = [], [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        cur.execute(sql, {**params, "q": vector_literal(query), "k": k})
+        found = {row[0] for row in cur.fetchall()}
+        latencies.append((time.perf_counter() - start) * 1000)
+        returned.append(len(found))
+        recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+    return {
+        **summarize(latencies),
+        "recall": round(float(np.mean(recalls)), 4),
+        "rows_returned": round(float(np.mean(returned)), 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True, help="PostgreSQL with pgvector >= 0.7")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--days", type=int, default=730, help="Spread of created_at over the past N days")
+    parser.add_argument("--query-count", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5, help="Results per query (match_count)")
+    parser.add_argument("--ef-search", type=int, default=40, help="hnsw.ef_search, as match_articles sets it")
+    parser.add_argument("--iterative-scan", action="store_true",
+                        help="SET hnsw.iterative_scan = relaxed_order (pgvector >= 0.8) so filtered scans keep searching")
+    parser.add_argument("--table", default="kb_partition_bench", help="Prefix of the scratch tables (dropped and recreated)")
+    parser.add_argument("--json", default="", help="Write the report to this file")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    rng = np.random.default_rng(1)
+    vectors = synthetic_vectors(args.rows, args.dim)
+    meta = synthetic_metadata(args.rows, args.days, now)
+    picks = rng.choice(args.rows, size=args.query_count, replace=False)
+    noise = rng.normal(scale=0.3 / np.sqrt(args.dim), size=(len(picks), args.dim)).astype(np.float32)
+    queries = unit(vectors[picks] + noise)
+    print(f"{args.rows} rows, {args.dim}-d, {len(queries)} queries, k={args.k}")
+
+    layouts = {"flat": f"{args.table}_flat", "partitioned": f"{args.table}_part"}
+    conn = connect(args.dsn)
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute("SET maintenance_work_mem = '2GB'")
+        create_flat(cur, layouts["flat"], args.dim)
+        create_partitioned(cur, layouts["partitioned"], args.dim, min(meta["created_at"]), now)
+        for layout, table in layouts.items():
+            print(f"Loading {layout} table {table}...")
+            copy_rows(cur, table, vectors, meta)
+            start = time.perf_counter()
+            cur.execute(f"CREATE INDEX ON {table} USING hnsw (embedding vector_cosine_ops)")
+            cur.execute(f"CREATE INDEX ON {table} (source_type, created_at)")
+            cur.execute(f"ANALYZE {table}")
+            print(f"  indexes built in {time.perf_counter() - start:.0f}s")
+        cur.execute(f"SET hnsw.ef_search = {args.ef_search}")
+        if args.iterative_scan:
+            cur.execute("SET hnsw.iterative_scan = relaxed_order")
+
+        report: Dict[str, Dict] = {}
+        for name, filters in FILTERS.items():
+            mask = filter_mask(meta, filters, now)
+            truth = exact_top_k(vectors, queries, mask, args.k)
+            params: Dict[str, Optional[object]] = {
+                "types": filters.get("source_types"),
+                "since": now - timedelta(days=filters.get("since_days") or 0),
+            }
+            row: Dict[str, object] = {
+                "matching_rows": int(mask.sum()),
+                "partition_share": round(pruned_share(meta, filters, now), 4),
+            }
+            for layout, table in layouts.items():
+                sql = f"SELECT id FROM {table} {where_clause(filters)}ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+                row[layout] = measure(cur, sql, queries, params, truth, args.k)
+            report[name] = row
+
+    print(f"\n{'filter':11s} {'rows':>8s} {'parts':>6s} {'layout':12s} {'p50 ms':>7s} {'p95 ms':>7s} {'recall':>7s} {'returned':>8s}")
+    for name, row in report.items():
+        for layout in layouts:
+            stats = row[layout]
+            print(f"{name:11s} {row['matching_rows']:>8d} {row['partition_share']:>6.1%} {layout:12s} "
+                  f"{stats['p50_ms']:>7.2f} {stats['p95_ms']:>7.2f} {stats['recall']:>7.4f} {stats['rows_returned']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": args.rows, "dim": args.dim, "k": args.k, "filters": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
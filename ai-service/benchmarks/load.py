@@ -0,0 +1,414 @@
+"""
+Offline load benchmark for the TruthGuard AI Service
+
+Boots the AI service against local fakes for OpenRouter, Serper, scrape
+targets and Supabase (see benchmarks/fakes.py), replays a corpus of text,
+image and video claims at a target rate and reports throughput, p50/p95/p99
+per endpoint and per pipeline stage (from /metrics), and the service's peak RSS.
+
+The models must already be in the local Hugging Face / EasyOCR caches; the
+service runs with HF_HUB_OFFLINE=1 so nothing is downloaded.
+
+Usage (from ai-service/):
+    python -m benchmarks.load --rate 2 --requests 200
+    python -m benchmarks.load --rate 5 --duration 60 --latency openrouter=2000 --json run.json
+    python -m benchmarks.load --baseline run.json --max-regression 0.2   # non-zero exit on regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fakes import FakeServer, FakeUpstreams
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "claims.jsonl")
+STAGE_HISTOGRAM = "truthguard_stage_duration_seconds"
+SAMPLE_LINE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})?\s+(?P<value>\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# --- Corpus and media -------------------------------------------------------
+
+def load_corpus(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def render_media(corpus: List[Dict], media_dir: str) -> List[Dict]:
+    """
+    Writes an image per OCR item and a short silent video per video item, as
+    test_extraction.py does, and drops items whose media cannot be generated.
+    """
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        cv2 = None
+
+    items = []
+    for i, item in enumerate(corpus):
+        needs_image = item.get("endpoint") == "/ocr" or item.get("content_type") == "image"
+        needs_video = item.get("content_type") == "video"
+        if (needs_image or needs_video) and cv2 is None:
+            print(f"Skipping corpus item {i}: opencv is not installed to render its media")
+            continue
+        item = dict(item)
+        if needs_image:
+            name = f"image-{i}.png"
+            img = np.ones((200, 900, 3), dtype=np.uint8) * 255
+            cv2.putText(img, item.get("media_text", "TruthGuard"), (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+            cv2.imwrite(os.path.join(media_dir, name), img)
+            item["media"] = name
+        elif needs_video:
+            name = f"video-{i}.mp4"
+            out = cv2.VideoWriter(os.path.join(media_dir, name), cv2.VideoWriter_fourcc(*"mp4v"), 5, (320, 240))
+            for _ in range(25):
+                out.write(np.ones((240, 320, 3), dtype=np.uint8) * np.random.randint(0, 255, (1, 3), dtype=np.uint8))
+            out.release()
+            item["media"] = name
+        items.append(item)
+    return items
+
+
+# --- Metrics parsing ----------------------------------------------------------
+
+def parse_stage_buckets(text: str) -> Dict[str, Dict[float, float]]:
+    """Cumulative bucket counts per stage from a Prometheus text scrape."""
+    stages: Dict[str, Dict[float, float]] = defaultdict(dict)
+    for line in text.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if not match or match.group("name") != f"{STAGE_HISTOGRAM}_bucket":
+            continue
+        labels = dict(LABEL.findall(match.group("labels") or ""))
+        bound = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+        stages[labels["stage"]][bound] = float(match.group("value"))
+    return stages
+
+def histogram_quantile(q: float, buckets: Dict[float, float]) -> Optional[float]:
+    """Linear interpolation within cumulative buckets, as Prometheus' histogram_quantile does."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if total <= 0:
+        return None
+    rank = q * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+def counter_delta(before: str, after: str, name: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+    """Per-label-set growth of one counter between two scrapes."""
+    def values(text: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+        found = {}
+        for line in text.splitlines():
+            match = SAMPLE_LINE.match(line)
+            if match and match.group("name") == name:
+                found[tuple(sorted(LABEL.findall(match.group("labels") or "")))] = float(match.group("value"))
+        return found
+    start = values(before)
+    return {labels: value - start.get(labels, 0.0) for labels, value in values(after).items()}
+
+def context_report(before: str, after: str) -> Dict[str, Optional[float]]:
+    """How often knowledge-base context was too weak and the classifier fell back to web search."""
+    checks = weak = 0.0
+    for labels, count in counter_delta(before, after, "truthguard_context_checks_total").items():
+        checks += count
+        weak += count if ("result", "weak") in labels else 0.0
+    return {"checks": int(checks), "web_search_fallback_rate": round(weak / checks, 4) if checks else None}
+
+def stage_report(before: str, after: str) -> Dict[str, Dict]:
+    start, end = parse_stage_buckets(before), parse_stage_buckets(after)
+    report = {}
+    for stage, buckets in sorted(end.items()):
+        delta = {bound: count - start.get(stage, {}).get(bound, 0.0) for bound, count in buckets.items()}
+        count = delta.get(float("inf"), 0)
+        if count <= 0:
+            continue
+        report[stage] = {"count": int(count)}
+        for q in (0.5, 0.95, 0.99):
+            value = histogram_quantile(q, delta)
+            report[stage][f"p{int(q * 100)}_ms"] = round(value * 1000, 1) if value is not None else None
+    return report
+
+
+# --- Service process ------------------------------------------------------------
+
+def start_service(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, **env}
+    )
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """High-water resident set size of a process (VmHWM), in MB."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+async def wait_ready(client: httpx.AsyncClient, capabilities: List[str], process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    pending = list(capabilities)
+    while pending:
+        if process.poll() is not None:
+            raise RuntimeError(f"AI service exited with code {process.returncode} during startup")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"AI service not ready for {pending} after {timeout:.0f}s")
+        try:
+            response = await client.get("/health/ready", params={"capability": pending[0]})
+            if response.status_code == 200:
+                pending.pop(0)
+                continue
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+
+
+# --- Replay -----------------------------------------------------------------------
+
+def build_request(item: Dict, index: int, media_base: str, unique: bool) -> Tuple[str, str, Dict]:
+    """Returns (report label, path, JSON body) for one corpus item."""
+    endpoint = item.get("endpoint", "/analyze")
+    suffix = f" (#{index})" if unique else ""
+    media_url = f"{media_base}/{item['media']}" if item.get("media") else None
+    if endpoint == "/search":
+        return endpoint, endpoint, {"query": item["query"] + suffix, "top_k": item.get("top_k", 5)}
+    if endpoint == "/ocr":
+        return endpoint, endpoint, {"image_url": media_url}
+    if endpoint == "/transcribe":
+        return endpoint, endpoint, {"video_url": media_url}
+    content_type = item.get("content_type", "text")
+    body = {
+        "claim_id": f"bench-{index}",
+        "content": item["content"] + suffix,
+        "content_type": content_type,
+        "file_url": media_url
+    }
+    return f"{endpoint}[{content_type}]", endpoint, body
+
+async def replay(client: httpx.AsyncClient, corpus: List[Dict], media_base: str, rate: float,
+                 total: int, poisson: bool, unique: bool, seed: int) -> Tuple[Dict[str, List], float]:
+    """Open-loop replay: request i is sent at its scheduled time whether or not earlier ones finished."""
+    rng = random.Random(seed)
+    results: Dict[str, List] = defaultdict(list)
+
+    async def send(label: str, path: str, body: Dict) -> None:
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, json=body)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results[label].append((time.perf_counter() - start, status))
+
+    tasks = []
+    started = time.perf_counter()
+    next_at = started
+    for i in range(total):
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        label, path, body = build_request(corpus[i % len(corpus)], i, media_base, unique)
+        tasks.append(asyncio.ensure_future(send(label, path, body)))
+        next_at += rng.expovariate(rate) if poisson else 1.0 / rate
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - started
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def endpoint_report(results: Dict[str, List], elapsed: float) -> Dict[str, Dict]:
+    report = {}
+    for label, samples in sorted(results.items()):
+        latencies = [latency for latency, status in samples if status == 200]
+        statuses: Dict[str, int] = defaultdict(int)
+        for _, status in samples:
+            statuses[str(status)] += 1
+        row = {"count": len(samples), "ok": len(latencies), "statuses": dict(statuses),
+               "throughput_per_second": round(len(latencies) / elapsed, 2)}
+        for q in (0.5, 0.95, 0.99):
+            row[f"p{int(q * 100)}_ms"] = round(percentile(latencies, q) * 1000, 1) if latencies else None
+        report[label] = row
+    return report
+
+
+# --- Reporting ----------------------------------------------------------------------
+
+def print_table(title: str, rows: Dict[str, Dict], columns: List[str]) -> None:
+    print(f"\n{title}")
+    width = max([len(name) for name in rows] + [10])
+    widths = [max(12, len(c)) for c in columns]
+    print(f"{'':<{width}}  " + "  ".join(f"{c:>{w}}" for c, w in zip(columns, widths)))
+    for name, row in rows.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{str(row.get(c, '')):>{w}}" for c, w in zip(columns, widths)))
+
+def regressions(current: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """p95 latencies (endpoint and stage) that grew by more than max_regression."""
+    found = []
+    for section in ("endpoints", "stages"):
+        for name, row in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name, {}).get("p95_ms")
+            after = row.get("p95_ms")
+            if before and after and after > before * (1 + max_regression):
+                found.append(f"{section[:-1]} {name}: p95 {before} ms -> {after} ms")
+    before_rss, after_rss = baseline.get("peak_rss_mb"), current.get("peak_rss_mb")
+    if before_rss and after_rss and after_rss > before_rss * (1 + max_regression):
+        found.append(f"peak RSS {before_rss} MB -> {after_rss} MB")
+    return found
+
+def parse_latencies(values: List[str]) -> Dict[str, float]:
+    """Parses repeated NAME=NUMBER options (latencies in ms, error rates as fractions)."""
+    latencies = {}
+    for value in values:
+        name, _, number = value.rpartition("=")
+        latencies[name.strip()] = float(number)
+    return latencies
+
+async def run(args) -> Dict:
+    corpus = load_corpus(args.corpus)
+    media_dir = tempfile.mkdtemp(prefix="truthguard-bench-")
+    corpus = render_media(corpus, media_dir)
+    if not corpus:
+        raise RuntimeError("Corpus is empty")
+
+    upstreams = FakeUpstreams(
+        latencies_ms=parse_latencies(args.latency),
+        jitter=args.jitter,
+        kb_matches=args.kb_matches,
+        kb_similarity=args.kb_similarity,
+        media_dir=media_dir,
+        seed=args.seed,
+        model_latencies_ms=parse_latencies(args.model_latency),
+        model_error_rates=parse_latencies(args.model_error)
+    )
+    fakes = FakeServer(upstreams, port=args.fake_port).start()
+    env = {
+        **fakes.env(),
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        # Replays repeat claims; keep the prior-analysis shortcut out of the numbers unless asked
+        "PRIOR_MATCH_ENABLED": "true" if args.allow_prior else "false",
+        "FAST_PATH_ENABLED": "true" if args.allow_prior else "false",
+        "RERANK_ENABLED": "true" if args.rerank else "false",
+    }
+    service = start_service(args.port, env)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+            capabilities = sorted({item.get("content_type", "text") for item in corpus if item.get("endpoint", "/analyze") == "/analyze"})
+            started = time.perf_counter()
+            await wait_ready(client, capabilities, service, args.startup_timeout)
+            startup_seconds = time.perf_counter() - started
+
+            total = args.requests or int(args.rate * args.duration)
+            if args.warmup:
+                await replay(client, corpus, f"{fakes.base_url}/media", args.rate, min(args.warmup, total), False, True, args.seed + 1)
+            before = (await client.get("/metrics")).text
+            results, elapsed = await replay(client, corpus, f"{fakes.base_url}/media", args.rate, total, args.poisson, args.unique, args.seed)
+            after = (await client.get("/metrics")).text
+    finally:
+        rss = peak_rss_mb(service.pid)
+        service.terminate()
+        try:
+            service.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            service.kill()
+        fakes.stop()
+
+    return {
+        "rate": args.rate,
+        "requests": sum(len(samples) for samples in results.values()),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_second": round(sum(1 for s in results.values() for _, status in s if status == 200) / elapsed, 2),
+        "startup_seconds": round(startup_seconds, 2),
+        "peak_rss_mb": round(rss, 1) if rss else None,
+        "fake_latencies_ms": upstreams.latencies_ms,
+        "fake_calls": upstreams.calls,
+        "endpoints": endpoint_report(results, elapsed),
+        "stages": stage_report(before, after),
+        "context": context_report(before, after),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL corpus (see benchmarks/data/claims.jsonl)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Target requests per second")
+    parser.add_argument("--requests", type=int, default=0, help="Requests to send (default: rate x duration)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to replay when --requests is not set")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests sent before measuring")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of a fixed interval")
+    parser.add_argument("--unique", action=argparse.BooleanOptionalAction, default=True,
+                        help="Suffix each claim with its index so coalescing and caches do not hide pipeline cost")
+    parser.add_argument("--allow-prior", action="store_true", help="Leave the prior-analysis and fast-path shortcuts enabled")
+    parser.add_argument("--rerank", action="store_true", help="Enable the cross-encoder rerank stage (RERANK_ENABLED)")
+    parser.add_argument("--latency", action="append", default=[], metavar="UPSTREAM=MS",
+                        help="Mean fake latency, e.g. openrouter=1500 (upstreams: openrouter, serper, scrape, supabase, media)")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=MS",
+                        help="Fake LLM latency for one model (see LLM_ENDPOINTS / LLM_FALLBACK_MODELS)")
+    parser.add_argument("--model-error", action="append", default=[], metavar="MODEL=RATE",
+                        help="Fraction of fake LLM calls for one model that fail with 503")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Uniform latency jitter as a fraction of the mean")
+    parser.add_argument("--kb-matches", type=int, default=3, help="Articles the fake match_articles returns")
+    parser.add_argument("--kb-similarity", type=float, default=0.72,
+                        help="Similarity of returned articles (below 0.75 triggers the web search path)")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--fake-port", type=int, default=8901)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request client timeout")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default="", help="Write the report to this file")
+    parser.add_argument("--baseline", default="", help="Earlier --json report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed fractional p95/RSS growth vs baseline")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    print(f"\n{report['requests']} requests in {report['elapsed_seconds']}s at target {args.rate}/s: "
+          f"{report['throughput_per_second']} ok/s, peak RSS {report['peak_rss_mb']} MB, startup {report['startup_seconds']}s")
+    print_table("Endpoints", report["endpoints"], ["count", "ok", "throughput_per_second", "p50_ms", "p95_ms", "p99_ms"])
+    print_table("Stages", report["stages"], ["count", "p50_ms", "p95_ms", "p99_ms"])
+    print(f"\nWeb search fallback rate: {report['context']['web_search_fallback_rate']} over {report['context']['checks']} context checks")
+    print(f"Fake upstream calls: {report['fake_calls']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.max_regression)
+        before_rate = baseline.get("context", {}).get("web_search_fallback_rate")
+        if before_rate is not None:
+            print(f"\nWeb search fallback rate vs baseline: {before_rate} -> {report['context']['web_search_fallback_rate']}")
+        if found:
+            print("\nRegressions against baseline:")
+            for line in found:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
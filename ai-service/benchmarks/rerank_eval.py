@@ -0,0 +1,114 @@
+"""
+Offline evaluation of the cross-encoder rerank stage
+
+Retrieves knowledge-base candidates for each claim with the bi-encoder (as
+match_articles does), then compares the classifier's weak-context check, and
+so its web-search fallback rate, on the bi-encoder top 5 against the
+cross-encoder's top 5. Also reports rerank latency against RERANK_BUDGET_MS.
+
+Usage (from ai-service/):
+    python -m benchmarks.rerank_eval --claims claims.jsonl --kb kb.jsonl
+    python -m benchmarks.rerank_eval --claims claims.jsonl --kb kb.jsonl --candidates 30 --json rerank.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.claim_classifier import CONTEXT_ARTICLES, ClaimClassifier
+from app.services.embedding_backends import load_embedding_model
+from app.services.reranker import RERANK_BUDGET_SECONDS, RERANK_CANDIDATES, RERANK_MODEL, CrossEncoderReranker
+
+# Same cut-off as RAGSystem.search_by_embedding
+KB_MATCH_THRESHOLD = 0.7
+
+def load_records(path: str) -> List[Dict]:
+    """One text per line, or JSONL with content (and optionally id and title)."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line) if line.startswith("{") else {"content": line}
+            record.setdefault("id", str(i))
+            records.append(record)
+    return records
+
+def unit(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+async def rerank_all(reranker: CrossEncoderReranker, claims: List[str], candidates: List[List[Dict]]):
+    ranked, latencies = [], []
+    for claim, articles in zip(claims, candidates):
+        start = time.perf_counter()
+        # Score directly rather than through rerank() so slow claims are measured, not cut off
+        scores = await reranker._score(claim, articles, [(claim, a["id"]) for a in articles]) if articles else {}
+        latencies.append((time.perf_counter() - start) * 1000)
+        scored = [{**a, "rerank_score": scores[(claim, a["id"])]} for a in articles]
+        ranked.append(sorted(scored, key=lambda a: a["rerank_score"], reverse=True))
+    return ranked, latencies
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", required=True, help="Claims, one per line or JSONL with content")
+    parser.add_argument("--kb", required=True, help="Knowledge-base articles as JSONL (id, title, content)")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--rerank-model", default=RERANK_MODEL)
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES, help="Bi-encoder candidates per claim")
+    parser.add_argument("--json", default="", help="Write the report to this file")
+    args = parser.parse_args()
+
+    claims = [r["content"] for r in load_records(args.claims)]
+    kb = load_records(args.kb)
+    print(f"{len(claims)} claims, {len(kb)} knowledge-base articles")
+
+    model = load_embedding_model(args.model, args.backend)
+    claim_vectors = unit(np.asarray(model.encode(claims, batch_size=32, show_progress_bar=False)))
+    kb_vectors = unit(np.asarray(model.encode([f"{a.get('title', '')} {a['content']}" for a in kb], batch_size=32, show_progress_bar=False)))
+    similarities = claim_vectors @ kb_vectors.T
+
+    candidates = []
+    for row in similarities:
+        top = [j for j in np.argsort(-row)[:args.candidates] if row[j] > KB_MATCH_THRESHOLD]
+        candidates.append([{**kb[j], "similarity": float(row[j])} for j in top])
+
+    reranker = CrossEncoderReranker(args.rerank_model)
+    ranked, latencies = asyncio.run(rerank_all(reranker, claims, candidates))
+
+    classifier = ClaimClassifier()
+    weak_before = sum(classifier._is_context_weak(c[:CONTEXT_ARTICLES]) for c in candidates)
+    weak_after = sum(classifier._is_context_weak(r[:CONTEXT_ARTICLES]) for r in ranked)
+    changed = sum(
+        [a["id"] for a in c[:CONTEXT_ARTICLES]] != [a["id"] for a in r[:CONTEXT_ARTICLES]]
+        for c, r in zip(candidates, ranked)
+    )
+    latencies.sort()
+    report = {
+        "claims": len(claims),
+        "candidates": args.candidates,
+        "web_search_fallback_rate_bi_encoder": round(weak_before / len(claims), 4),
+        "web_search_fallback_rate_reranked": round(weak_after / len(claims), 4),
+        "top5_changed_rate": round(changed / len(claims), 4),
+        "rerank_ms_p50": round(statistics.median(latencies), 1),
+        "rerank_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 1),
+        "over_budget_rate": round(sum(l > RERANK_BUDGET_SECONDS * 1000 for l in latencies) / len(latencies), 4),
+    }
+    for key, value in report.items():
+        print(f"{key:40s} {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
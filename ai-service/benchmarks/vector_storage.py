@@ -0,0 +1,275 @@
+"""
+Compact knowledge-base vectors: memory, transfer size, latency and recall
+
+Compares the full-precision embeddings match_articles searches today with the
+compact candidate searches behind KB_VECTOR_SEARCH (float16 halfvec and binary
+codes, both rescored with the full vectors), plus int8 scalar quantization for
+reference (pgvector has no int8 index type).
+
+Without --dsn the comparison runs in memory with numpy: bytes per vector,
+estimated HNSW index size, query payload size, and recall@k after rescoring
+against exact search. With --dsn it loads the vectors into a scratch table in
+a pgvector database, builds the real indexes and reports their sizes and the
+query latency of each mode, using the same SQL shapes as match_articles.
+
+Vectors come from knowledge-base JSONL encoded with the embedding model, or are
+synthetic (clustered, unit length) for scale tests.
+
+Usage (from ai-service/):
+    python -m benchmarks.vector_storage --synthetic 100000
+    python -m benchmarks.vector_storage --kb kb.jsonl --queries claims.jsonl
+    python -m benchmarks.vector_storage --synthetic 1000000 --dsn postgresql://postgres@localhost/bench
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.rag_system import vector_literal
+
+MODES = ("float32", "float16", "int8", "binary")
+# Candidates rescored per result, as match_articles defaults to (int8 matches halfvec)
+OVERSAMPLE = {"float32": 1, "float16": 4, "int8": 4, "binary": 10}
+# Layer-0 neighbour links per vector for pgvector's default m=16, 2*m links of 8 bytes (tid)
+HNSW_LINK_BYTES = 2 * 16 * 8
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    """Unit vectors around random topic centres, roughly like sentence embeddings of related claims."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, 100_000):
+        size = min(100_000, count - start)
+        picks = rng.integers(0, clusters, size=size)
+        vectors[start:start + size] = centres[picks] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32)
+    return unit(vectors)
+
+
+def unit(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def load_texts(path: str) -> List[str]:
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line) if line.startswith("{") else {"content": line}
+                texts.append(f"{record.get('title', '')} {record.get('content', '')}".strip())
+    return texts
+
+
+def bytes_per_vector(mode: str, dim: int) -> int:
+    return {"float32": 4 * dim, "float16": 2 * dim, "int8": dim, "binary": (dim + 7) // 8}[mode]
+
+
+def candidate_scores(mode: str, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Similarities as the compact representation sees them (higher is closer)."""
+    if mode == "float32":
+        return queries @ vectors.T
+    if mode == "float16":
+        return queries.astype(np.float16).astype(np.float32) @ vectors.astype(np.float16).astype(np.float32).T
+    if mode == "int8":
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        scale = np.where(high > low, (high - low) / 255, 1.0)
+        codes = np.round((vectors - low) / scale).astype(np.uint8)
+        return queries @ (codes.astype(np.float32) * scale + low).T
+    codes = np.packbits(vectors > 0, axis=1)
+    query_codes = np.packbits(queries > 0, axis=1)
+    return -np.stack([POPCOUNT[np.bitwise_xor(codes, q)].sum(axis=1) for q in query_codes]).astype(np.float32)
+
+
+def recall_in_memory(vectors: np.ndarray, queries: np.ndarray, k: int) -> Dict[str, float]:
+    """recall@k of each mode's top k*oversample candidates rescored exactly, against exact top k."""
+    exact = queries @ vectors.T
+    truth = np.argsort(-exact, axis=1)[:, :k]
+    recalls = {}
+    for mode in MODES:
+        scores = candidate_scores(mode, vectors, queries)
+        fetched = min(k * OVERSAMPLE[mode], vectors.shape[0])
+        candidates = np.argpartition(-scores, fetched - 1, axis=1)[:, :fetched]
+        rescored = np.take_along_axis(exact, candidates, axis=1)
+        top = np.take_along_axis(candidates, np.argsort(-rescored, axis=1)[:, :k], axis=1)
+        recalls[mode] = float(np.mean([len(set(t) & set(r)) / k for t, r in zip(truth, top)]))
+    return recalls
+
+
+# SQL shapes of match_articles per mode; {t} is the scratch table, {d} the dimension
+PG_QUERIES = {
+    "float32": "SELECT id FROM {t} ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s",
+    "float16": (
+        "SELECT id FROM {t} WHERE id IN (SELECT id FROM {t} ORDER BY embedding::halfvec({d}) <=> %(q)s::halfvec({d}) LIMIT %(n)s) "
+        "ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+    ),
+    "binary": (
+        "SELECT id FROM {t} WHERE id IN (SELECT id FROM {t} ORDER BY binary_quantize(embedding)::bit({d}) <~> binary_quantize(%(q)s::vector) LIMIT %(n)s) "
+        "ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+    ),
+}
+PG_INDEXES = {
+    "float32": "CREATE INDEX {t}_vec_idx ON {t} USING hnsw (embedding vector_cosine_ops)",
+    "float16": "CREATE INDEX {t}_half_idx ON {t} USING hnsw ((embedding::halfvec({d})) halfvec_cosine_ops)",
+    "binary": "CREATE INDEX {t}_bit_idx ON {t} USING hnsw ((binary_quantize(embedding)::bit({d})) bit_hamming_ops)",
+}
+
+
+def connect(dsn: str):
+    try:
+        import psycopg
+    except ImportError:
+        sys.exit("The --dsn benchmarks need psycopg: pip install 'psycopg[binary]'")
+    return psycopg.connect(dsn, autocommit=True)
+
+
+def load_table(conn, table: str, vectors: np.ndarray) -> None:
+    """(Re)creates the scratch table and COPYs the vectors in."""
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"CREATE TABLE {table} (id bigint PRIMARY KEY, embedding vector({vectors.shape[1]}))")
+        with cur.copy(f"COPY {table} (id, embedding) FROM STDIN") as copy:
+            for i, vector in enumerate(vectors):
+                copy.write_row((i, vector_literal(vector)))
+        cur.execute(f"ANALYZE {table}")
+
+
+def time_queries(conn, sql: str, queries: np.ndarray, params: Dict, ef_search: int = 40) -> List[float]:
+    latencies = []
+    with conn.cursor() as cur:
+        cur.execute(f"SET hnsw.ef_search = {ef_search}")
+        for query in queries:
+            start = time.perf_counter()
+            cur.execute(sql, {**params, "q": vector_literal(query)})
+            cur.fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+    }
+
+
+def pgvector_report(dsn: str, vectors: np.ndarray, queries: np.ndarray, k: int, table: str) -> Dict[str, Dict]:
+    conn = connect(dsn)
+    dim = vectors.shape[1]
+    print(f"Loading {len(vectors)} vectors into {table}...")
+    load_table(conn, table, vectors)
+    report: Dict[str, Dict] = {}
+    with conn.cursor() as cur:
+        cur.execute("SET maintenance_work_mem = '2GB'")
+        # Ground truth by sequential scan, before any vector index exists
+        exact_ids = []
+        for query in queries:
+            cur.execute(PG_QUERIES["float32"].format(t=table), {"q": vector_literal(query), "k": k})
+            exact_ids.append({row[0] for row in cur.fetchall()})
+        for mode, ddl in PG_INDEXES.items():
+            start = time.perf_counter()
+            cur.execute(ddl.format(t=table, d=dim))
+            build = time.perf_counter() - start
+            index = {"float32": "vec", "float16": "half", "binary": "bit"}[mode]
+            cur.execute(f"SELECT pg_relation_size('{table}_{index}_idx')")
+            size = cur.fetchone()[0]
+            fetched = k * OVERSAMPLE[mode]
+            sql = PG_QUERIES[mode].format(t=table, d=dim)
+            latencies = time_queries(conn, sql, queries, {"k": k, "n": fetched}, ef_search=max(40, fetched))
+            found = []
+            for query in queries:
+                cur.execute(sql, {"q": vector_literal(query), "k": k, "n": fetched})
+                found.append({row[0] for row in cur.fetchall()})
+            report[mode] = {
+                "index_mb": round(size / 2**20, 1),
+                "build_s": round(build, 1),
+                **summarize(latencies),
+                "recall": round(float(np.mean([len(t & f) / k for t, f in zip(exact_ids, found)])), 4),
+            }
+            # Drop it so the next mode's query cannot use this index
+            cur.execute(f"DROP INDEX {table}_{index}_idx")
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--kb", help="Knowledge-base articles as JSONL (title, content) to encode")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Generate N clustered unit vectors")
+    parser.add_argument("--queries", default="", help="Claims to query with (JSONL or text lines; default: perturbed articles)")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--query-count", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5, help="Results per query (match_count)")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--dsn", default="", help="PostgreSQL with pgvector >= 0.7 for index size and latency")
+    parser.add_argument("--table", default="kb_vector_bench", help="Scratch table (dropped and recreated)")
+    parser.add_argument("--json", default="", help="Write the report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries: Optional[np.ndarray] = None
+    if args.kb:
+        from app.services.embedding_backends import load_embedding_model
+        model = load_embedding_model(args.model, args.backend)
+        vectors = unit(model.encode(load_texts(args.kb), batch_size=32, show_progress_bar=False))
+        if args.queries:
+            queries = unit(model.encode(load_texts(args.queries)[:args.query_count], batch_size=32, show_progress_bar=False))
+    else:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    if queries is None:
+        picks = rng.choice(len(vectors), size=min(args.query_count, len(vectors)), replace=False)
+        # Paraphrase-like queries: stored vectors moved by noise of norm ~0.3
+        noise = rng.normal(scale=0.3 / np.sqrt(vectors.shape[1]), size=(len(picks), vectors.shape[1]))
+        queries = unit(vectors[picks] + noise.astype(np.float32))
+    count, dim = vectors.shape
+    print(f"{count} vectors, {dim}-d, {len(queries)} queries, k={args.k}")
+
+    json_payload = len(json.dumps(queries[0].tolist()))
+    literal_payload = len(json.dumps(vector_literal(queries[0])))
+    recall_sample = vectors if count <= 200_000 else vectors[rng.choice(count, 200_000, replace=False)]
+    recalls = recall_in_memory(recall_sample, queries, args.k)
+    report: Dict[str, object] = {
+        "vectors": count,
+        "dim": dim,
+        "query_payload_bytes": {"json_list": json_payload, "vector_literal": literal_payload},
+        "modes": {
+            mode: {
+                "bytes_per_vector": bytes_per_vector(mode, dim),
+                "est_index_mb": round(count * (bytes_per_vector(mode, dim) + HNSW_LINK_BYTES) / 2**20, 1),
+                "candidates": args.k * OVERSAMPLE[mode],
+                "recall_after_rescore": round(recalls[mode], 4),
+            }
+            for mode in MODES
+        },
+    }
+    print(f"Query payload: {json_payload} bytes as a JSON list, {literal_payload} as a vector literal")
+    print(f"{'mode':8s} {'bytes/vec':>9s} {'est index MB':>12s} {'candidates':>10s} {'recall@k':>9s}")
+    for mode, row in report["modes"].items():
+        print(f"{mode:8s} {row['bytes_per_vector']:>9d} {row['est_index_mb']:>12.1f} {row['candidates']:>10d} {row['recall_after_rescore']:>9.4f}")
+
+    if args.dsn:
+        pg = pgvector_report(args.dsn, vectors, queries, args.k, args.table)
+        report["pgvector"] = pg
+        print(f"\n{'mode':8s} {'index MB':>9s} {'build s':>8s} {'p50 ms':>7s} {'p95 ms':>7s} {'recall@k':>9s}")
+        for mode, row in pg.items():
+            print(f"{mode:8s} {row['index_mb']:>9.1f} {row['build_s']:>8.1f} {row['p50_ms']:>7.2f} {row['p95_ms']:>7.2f} {row['recall']:>9.4f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
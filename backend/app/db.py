@@ -20,8 +20,3 @@ if not supabase_url or not supabase_key:
 
 # Create the main client (using ANON key)
 supabase: Client = create_client(supabase_url, supabase_key)
-
-# Export the key separately for use in resetting auth if needed (e.g., in claims.py)
-# Note: It's generally better practice to fetch this from os.getenv() again where needed, 
-# but exporting it here if claims.py relies on importing it directly from db.py
-anon_key = supabase_key 
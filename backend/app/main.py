@@ -5,9 +5,11 @@ TruthGuard AI Backend
 Main FastAPI application for handling claims, authentication, and coordination
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import os
+import asyncio
 import httpx
 from dotenv import load_dotenv
 
@@ -15,7 +17,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import the centralized Supabase client
-from app.db import supabase
+from app.db import supabase_url
+from app.services.job_queue import get_api_queue, LANES
+from app.services.clients import get_ai_client, get_async_client, close_clients, pool_stats
+from app.services.auth import auth_stats
 
 # Import routers
 from app.routers import claims, users, comments, rti, dashboard, browse_claims
@@ -44,6 +49,11 @@ app.include_router(comments.router, prefix="/api/v1")
 app.include_router(rti.router, prefix="/api/v1")
 app.include_router(dashboard.router, prefix="/api/v1")
 app.include_router(browse_claims.router)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_clients()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -62,15 +72,15 @@ async def health_check():
     try:
         # Check AI service
         ai_service_url = os.getenv("AI_SERVICE_URL", "http://localhost:8001")
-        async with httpx.AsyncClient() as client:
-            ai_response = await client.get(f"{ai_service_url}/health", timeout=5)
-            ai_healthy = ai_response.status_code == 200
+        ai_response = await get_ai_client().get(f"{ai_service_url}/health", timeout=5)
+        ai_healthy = ai_response.status_code == 200
     except httpx.RequestError:
         ai_healthy = False
 
     try:
-        # Check database connection (uses the imported supabase client)
-        result = supabase.table("user_profiles").select("id", count="exact", head=True).limit(1).execute()
+        # Check database connection (uses the routers' async client)
+        client = await get_async_client()
+        await client.table("user_profiles").select("id", count="exact", head=True).limit(1).execute()
         db_healthy = True
     except Exception:
         db_healthy = False
@@ -85,6 +95,66 @@ async def health_check():
         }
     }
 
+def _queue_stats(window_seconds: int) -> dict:
+    service_key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not service_key:
+        raise HTTPException(status_code=503, detail="Claim queue is not configured.")
+    try:
+        return get_api_queue(supabase_url, service_key).stats(window_seconds)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Claim queue stats unavailable: {e}")
+
+@app.get("/api/v1/queue/stats")
+async def queue_stats(window_seconds: int = 3600):
+    """Claim queue depth, and wait/turnaround latency of the jobs finished within the window, overall and per lane"""
+    return await asyncio.to_thread(_queue_stats, window_seconds)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Claim queue stats per lane, this process's connection pools and token checks, in Prometheus text format"""
+    lines = ["# HELP truthguard_auth_verifications Token verifications by outcome (cache, local, remote, rejected)",
+             "# TYPE truthguard_auth_verifications counter"]
+    lines += [f'truthguard_auth_verifications{{outcome="{outcome}"}} {count}' for outcome, count in auth_stats.items()]
+    for name, key, help_text in (
+        ("truthguard_http_clients_created", "clients_created", "Pooled HTTP clients built by this process"),
+        ("truthguard_http_requests", "requests", "Requests sent through the pool"),
+        ("truthguard_http_pool_max_connections", "max_connections", "Connection limit of the pool"),
+        ("truthguard_http_pool_connections", "connections", "Open connections in the pool"),
+        ("truthguard_http_pool_idle_connections", "idle", "Open connections waiting for a request"),
+        ("truthguard_http_pool_in_flight", "in_flight", "Requests using or waiting for a connection"),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {'counter' if key in ('clients_created', 'requests') else 'gauge'}"]
+        lines += [f'{name}{{pool="{pool}"}} {values[key]}' for pool, values in pool_stats().items()]
+
+    try:
+        stats = await asyncio.to_thread(_queue_stats, 3600)
+    except HTTPException:
+        return "\n".join(lines) + "\n"
+    lane_stats = {name: (stats.get("lanes") or {}).get(name, {}) for name in LANES}
+    gauges = (
+        ("truthguard_claim_queue_queued", "queued", "Claim jobs waiting, including retries in backoff"),
+        ("truthguard_claim_queue_running", "running", "Claim jobs being processed"),
+        ("truthguard_claim_queue_due", "due", "Claim jobs ready to run"),
+        ("truthguard_claim_queue_oldest_due_seconds", "oldest_due_seconds", "Age of the oldest job ready to run"),
+        ("truthguard_claim_jobs_done", "done", "Claim jobs completed in the last hour"),
+        ("truthguard_claim_jobs_failed", "failed", "Claim jobs failed for good in the last hour"),
+        ("truthguard_claim_jobs_retried", "retried", "Finished claim jobs that took more than one attempt, last hour"),
+        ("truthguard_claim_turnaround_slo_seconds", "slo_seconds", "Turnaround target of the lane"),
+        ("truthguard_claim_turnaround_within_slo_ratio", "within_slo", "Share of finished jobs completed within the lane's target, last hour"),
+    )
+    for name, key, help_text in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{lane="{lane}"}} {values.get(key) or 0}' for lane, values in lane_stats.items()]
+    for name, prefix, help_text in (
+        ("truthguard_claim_queue_wait_seconds", "wait", "Time from enqueue to the start of the last attempt, last hour"),
+        ("truthguard_claim_turnaround_seconds", "turnaround", "Time from enqueue to completion, last hour"),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+        for lane, values in lane_stats.items():
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(f'{name}{{lane="{lane}",quantile="{quantile}"}} {values.get(f"{prefix}_{key}_seconds") or 0}')
+    return "\n".join(lines) + "\n"
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -8,8 +8,8 @@ import json
 
 load_dotenv()
 
-from app.db import supabase
 from app.services.auth import get_current_user_optional, User
+from app.services.repository import Repository, get_repository
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -64,31 +64,22 @@ async def browse_claims(
     sort: Optional[str] = Query("newest", enum=["newest", "popular", "relevant"]),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    db: Repository = Depends(get_repository),
 ):
     """Retrieve a list of claims enriched with comments, upvotes, and analysis."""
     logger.info(f"--- Received request to /browse with sort='{sort}', skip={skip}, limit={limit} ---")
     try:
-        query = supabase.table("claims").select(
-            "id, content, content_type, status, created_at, comment_count, upvote_count, "
-            "comments:claim_comments(id, content, upvotes, downvotes, is_expert_response, created_at, updated_at, user:user_profiles(id, full_name, avatar_url)), "
-            "analysis:claim_analyses(*)"
-        )
-
         if sort == "popular":
-            query = query.order("comment_count", desc=True)
+            order_column = "comment_count"
         elif sort == "relevant":
-            query = query.order("upvote_count", desc=True)
+            order_column = "upvote_count"
         else:
-            query = query.order("created_at", desc=True)
-
-        result = query.range(skip, skip + limit - 1).execute()
+            order_column = "created_at"
 
-        if hasattr(result, 'error') and result.error:
-            logger.error(f"!!! Supabase query failed: {result.error} !!!")
-            raise HTTPException(status_code=500, detail="Database query failed")
+        rows = await db.browse_claims(order_column, skip, limit)
 
         claims_out: List[ClaimOut] = []
-        for item in result.data or []:
+        for item in rows:
             # Process comments
             comment_rows = item.get("comments") or []
             comments_processed: List[CommentOut] = []
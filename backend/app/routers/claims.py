@@ -3,15 +3,19 @@ from typing import List, Optional
 import uuid
 import os
 import json
+import asyncio
 import logging
 
-from app.db import supabase, anon_key, supabase_url
+from app.db import supabase_url
 from app.models.schemas import (
     ClaimResponse, ClaimDetail, ClaimAnalysis, SearchResult,
     ContentType, ClaimStatus, Verdict, EvidenceItem, CommentVote, VoteType
 )
 from app.services.auth import get_current_user, get_current_user_optional, User
 from app.services.claim_processor import process_claim_async
+from app.services.job_queue import get_api_queue, classify_lane
+from app.services.repository import Repository, get_repository, gather_optional
+from app.services.clients import user_client
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +33,7 @@ async def submit_claim(
     current_user: User = Depends(get_current_user)
 ):
     storage_file_path = None
+    file_size = None
     auth_header = request.headers.get("Authorization")
     user_jwt = None
     if auth_header and auth_header.startswith("Bearer "):
@@ -38,83 +43,71 @@ async def submit_claim(
         logger.error(f"Submit claim failed: No JWT found for user {current_user.id}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authentication token.")
 
-    if file:
-        try:
-            content_bytes = await file.read()
-            file_extension = file.filename.split(".")[-1] if '.' in file.filename else 'bin'
-            unique_filename = f"{current_user.id}/{uuid.uuid4()}.{file_extension}"
-
-            supabase.auth.set_session(access_token=user_jwt, refresh_token='dummy_refresh_token')
-
+    # The upload and insert run as the user (for RLS) through a handle of this
+    # request only; the shared clients keep the anon key
+    async with user_client(user_jwt) as db:
+        if file:
             try:
-                upload_response = supabase.storage.from_(STORAGE_BUCKET_NAME).upload(
+                content_bytes = await file.read()
+                file_size = len(content_bytes)
+                file_extension = file.filename.split(".")[-1] if '.' in file.filename else 'bin'
+                unique_filename = f"{current_user.id}/{uuid.uuid4()}.{file_extension}"
+
+                await db.storage.from_(STORAGE_BUCKET_NAME).upload(
                     path=unique_filename, file=content_bytes, file_options={"content-type": file.content_type or 'application/octet-stream'}
                 )
                 storage_file_path = unique_filename
                 logger.info(f"File uploaded successfully for user {current_user.id}: {unique_filename}")
-            finally:
-                supabase.postgrest.auth(anon_key)
-                supabase.auth.sign_out()
-
-        except Exception as e:
-            logger.error(f"Failed to upload file for user {current_user.id}: {str(e)}", exc_info=True)
-            try:
-                supabase.postgrest.auth(anon_key)
-                supabase.auth.sign_out()
-            except Exception as reset_e:
-                logger.error(f"Failed to reset auth after upload error: {reset_e}")
-            raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
-
-    claim_data = {
-        # --- FIX for TypeError: UUID is not JSON serializable ---
-        "user_id": str(current_user.id),
-        # --- END FIX ---
-        "content": content, 
-        "content_type": content_type.value,
-        "original_url": original_url, 
-        "file_path": storage_file_path, 
-        "status": ClaimStatus.PENDING.value
-    }
-
-    result = None
-    try:
-        supabase.postgrest.auth(user_jwt)
-        
-        # --- FIX for v1.x syntax ---
-        # Use v1.x syntax: insert([...]).execute()
-        # We must pass a list, and we can't chain .select()
-        result = supabase.table("claims").insert([claim_data]).execute()
-        # --- END FIX ---
+            except Exception as e:
+                logger.error(f"Failed to upload file for user {current_user.id}: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
+
+        claim_data = {
+            # --- FIX for TypeError: UUID is not JSON serializable ---
+            "user_id": str(current_user.id),
+            # --- END FIX ---
+            "content": content,
+            "content_type": content_type.value,
+            "original_url": original_url,
+            "file_path": storage_file_path,
+            "status": ClaimStatus.PENDING.value
+        }
+
+        result = None
+        try:
+            result = await db.table("claims").insert([claim_data]).execute()
+            logger.info(f"Claim inserted successfully for user {current_user.id}")
 
-        logger.info(f"Claim inserted successfully for user {current_user.id}")
+            if not result or not result.data:
+                logger.error(f"Failed to create claim DB record for user {current_user.id}. Response: {result}")
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create claim record.")
 
-        if not result or not result.data:
-            logger.error(f"Failed to create claim DB record for user {current_user.id}. Response: {result}")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create claim record.")
+        except Exception as e:
+            logger.error(f"Database error inserting claim for user {current_user.id}: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error during claim creation.")
 
-    except Exception as e:
-        logger.error(f"Database error inserting claim for user {current_user.id}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error during claim creation.")
-    finally:
-        try:
-            supabase.postgrest.auth(anon_key)
-            logger.debug("Supabase client auth reset to anon key after claim insert.")
-        except Exception as reset_e:
-            logger.error(f"Failed to reset auth after claim insert: {reset_e}")
+        claim = result.data[0]
 
-    claim = result.data[0]
+        supabase_url_for_task = supabase_url
+        supabase_service_key_for_task = os.getenv("SUPABASE_SERVICE_KEY")
 
-    supabase_url_for_task = supabase_url 
-    supabase_service_key_for_task = os.getenv("SUPABASE_SERVICE_KEY") 
+        if not supabase_url_for_task or not supabase_service_key_for_task:
+            logger.error(f"Cannot schedule background task for claim {claim['id']}: Missing env vars.")
+            try:
+                await db.table("claims").update({"status": ClaimStatus.FAILED.value}).eq("id", claim['id']).execute()
+                logger.warning(f"Marked claim {claim['id']} as FAILED due to missing env vars for background task.")
+            except Exception as update_e:
+                logger.error(f"Failed to mark claim {claim['id']} as FAILED: {update_e}")
+            return ClaimResponse(**claim)
 
-    if not supabase_url_for_task or not supabase_service_key_for_task:
-        logger.error(f"Cannot schedule background task for claim {claim['id']}: Missing env vars.")
-        try:
-            supabase.table("claims").update({"status": ClaimStatus.FAILED.value}).eq("id", claim['id']).execute()
-            logger.warning(f"Marked claim {claim['id']} as FAILED due to missing env vars for background task.")
-        except Exception as update_e:
-            logger.error(f"Failed to mark claim {claim['id']} as FAILED: {update_e}")
-    else:
+    try:
+        queue = get_api_queue(supabase_url_for_task, supabase_service_key_for_task)
+        lane = classify_lane(content_type.value, file_size)
+        await asyncio.to_thread(queue.enqueue, claim["id"], lane)
+        logger.info(f"Claim {claim['id']} queued for processing on the {lane} lane")
+    except Exception as queue_e:
+        # Without the queue (e.g. claim_jobs not migrated yet) the claim is processed in this process
+        logger.warning(f"Could not queue claim {claim['id']}, processing it in the background instead: {queue_e}")
         background_tasks.add_task(
             process_claim_async,
             claim["id"],
@@ -129,20 +122,34 @@ async def submit_claim(
 @router.get("/{claim_id}", response_model=ClaimDetail)
 async def get_claim(
     claim_id: uuid.UUID,
-    current_user: Optional[User] = Depends(get_current_user_optional) # <-- UPDATED
+    current_user: Optional[User] = Depends(get_current_user_optional), # <-- UPDATED
+    db: Repository = Depends(get_repository)
 ):
     """Get claim details with analysis, comment count, and vote status"""
+
+    async def user_vote_or_none():
+        try:
+            vote_type = await db.get_claim_vote(str(claim_id), str(current_user.id))
+            if vote_type:
+                logger.info(f"🗳️ User {current_user.id} has voted: {vote_type}")
+            return vote_type
+        except Exception as vote_e:
+            # Log the error but don't fail the request
+            logger.warning(f"Could not fetch user vote status: {vote_e}")
+            return None
+
     try:
         logger.info(f"📥 Fetching claim {claim_id}")
-        result = supabase.table("claims").select(
-            "*, claim_analyses(*), claim_comments(count)"
-        ).eq("id", str(claim_id)).single().execute()
+        # The user's vote does not depend on the claim row, so both are fetched concurrently
+        claim_data, user_vote_status = await gather_optional(
+            db.get_claim_detail(str(claim_id)),
+            user_vote_or_none() if current_user else None
+        )
 
-        if not result.data:
+        if not claim_data:
             logger.warning(f"❌ Claim {claim_id} not found")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Claim not found")
 
-        claim_data = result.data
         logger.info(f"✅ Got claim data - status: {claim_data.get('status')}")
 
         analysis_data_list = claim_data.get("claim_analyses")
@@ -235,22 +242,6 @@ async def get_claim(
             if isinstance(count_dict, dict):
                 comment_count = count_dict.get("count", 0)
 
-        # --- START: NEW VOTE LOGIC ---
-        user_vote_status: Optional[VoteType] = None
-        if current_user:
-            try:
-                vote_result = supabase.table("claim_votes").select("vote_type").eq(
-                    "claim_id", str(claim_id)
-                ).eq("user_id", str(current_user.id)).single().execute()
-                
-                if vote_result.data:
-                    user_vote_status = vote_result.data.get("vote_type")
-                    logger.info(f"🗳️ User {current_user.id} has voted: {user_vote_status}")
-            except Exception as vote_e:
-                # Log the error but don't fail the request (e.g., if no vote found)
-                logger.warning(f"Could not fetch user vote status: {vote_e}")
-        # --- END: NEW VOTE LOGIC ---
-
         logger.info(f"🎯 Returning claim detail - has_analysis: {analysis is not None}, comment_count: {comment_count}, user_vote: {user_vote_status}")
         
         return ClaimDetail(
@@ -271,31 +262,16 @@ async def search_claims(
     q: Optional[str] = None,
     status: Optional[ClaimStatus] = None,
     page: int = 1,
-    per_page: int = 20
+    per_page: int = 20,
+    db: Repository = Depends(get_repository)
 ):
     """Search and filter claims"""
     offset = (page - 1) * per_page
     try:
-        query = supabase.table("claims").select(
-            "*, claim_analyses(*), claim_comments(count)",
-            count="exact"
-        )
-
-        if q:
-            query = query.ilike("content", f"%{q}%")
-
-        if status:
-            query = query.eq("status", status.value)
-
-        result = query.order("created_at", desc=True).range(offset, offset + per_page - 1).execute()
-
-        if result.data is None:
-            result.data = []
-        if result.count is None:
-            result.count = 0
+        rows, total_count = await db.search_claims(q, status.value if status else None, offset, per_page)
 
         claim_details = []
-        for item in result.data:
+        for item in rows:
             analysis_data_list = item.get("claim_analyses")
             analysis = None
             
@@ -365,7 +341,7 @@ async def search_claims(
 
         return SearchResult(
             claims=claim_details,
-            total_count=result.count,
+            total_count=total_count,
             page=page,
             per_page=per_page
         )
@@ -375,13 +351,13 @@ async def search_claims(
 
 
 @router.get("/{claim_id}/status")
-async def get_claim_status(claim_id: uuid.UUID):
+async def get_claim_status(claim_id: uuid.UUID, db: Repository = Depends(get_repository)):
     """Get current processing status of a claim"""
     try:
-        result = supabase.table("claims").select("status").eq("id", str(claim_id)).single().execute()
-        if not result.data:
+        claim_status = await db.get_claim_status(str(claim_id))
+        if not claim_status:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Claim not found")
-        return {"status": result.data["status"]}
+        return {"status": claim_status}
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -395,7 +371,8 @@ async def get_claim_status(claim_id: uuid.UUID):
 async def vote_on_claim(
     claim_id: uuid.UUID,
     vote: CommentVote,  # We can reuse the CommentVote schema
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Repository = Depends(get_repository)
 ):
     """
     Vote on a claim. This endpoint only supports 'up' votes for now.
@@ -412,11 +389,11 @@ async def vote_on_claim(
     }
     
     # Upsert the vote
-    supabase.table("claim_votes").upsert(vote_data).execute()
+    await db.upsert_claim_vote(vote_data)
     
     # Trigger the recalculation
     try:
-        supabase.rpc("recalculate_claim_votes", {"c_id": str(claim_id)}).execute()
+        await db.recalculate_claim_votes(str(claim_id))
     except Exception as e:
         logger.error(f"Error recalculating claim votes for {claim_id}: {e}")
         # Don't fail the whole request, the vote was still cast
@@ -4,43 +4,41 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 import uuid
 
-# Use the centralized Supabase client and schemas
-from app.db import supabase
 from app.models.schemas import CommentCreate, CommentResponse, CommentVote, VoteType
 from app.services.auth import get_current_user, get_current_user_optional, User
+from app.services.repository import Repository, get_repository, gather_optional
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
 @router.get("/{claim_id}", response_model=List[CommentResponse])
 async def get_claim_comments(
     claim_id: uuid.UUID,
-    current_user: Optional[User] = Depends(get_current_user_optional)
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: Repository = Depends(get_repository)
 ):
     """Get all comments for a claim with user data and vote status."""
-    
-    query = supabase.table("claim_comments").select(
-        "*, user:user_profiles(*)"
-    ).eq("claim_id", str(claim_id)).order("created_at", desc=True)
-    
-    result = query.execute()
 
-    if not result.data:
-        return []
-
-    # --- FIX: Get user votes for these comments (if user is logged in) ---
-    user_votes = {}
-    if current_user:
+    async def user_votes_or_empty():
         try:
-            comment_ids = [comment['id'] for comment in result.data]
-            vote_result = supabase.table("comment_votes").select("comment_id, vote_type").in_("comment_id", comment_ids).eq("user_id", str(current_user.id)).execute()
-            user_votes = {vote['comment_id']: vote['vote_type'] for vote in vote_result.data}
+            return await db.get_comment_votes(str(claim_id), str(current_user.id))
         except Exception as e:
             # Log the error but don't fail the request
             print(f"Error fetching user votes for comments: {e}")
+            return {}
+
+    # The comments and the user's votes on them are fetched concurrently
+    comments, user_votes = await gather_optional(
+        db.list_comments(str(claim_id)),
+        user_votes_or_empty() if current_user else None
+    )
+    user_votes = user_votes or {}
+
+    if not comments:
+        return []
 
     # Combine data
     comments_with_votes = []
-    for comment in result.data:
+    for comment in comments:
         comment_model = CommentResponse(**comment)
         comment_model.user_vote = user_votes.get(comment['id'])
         comments_with_votes.append(comment_model)
@@ -51,7 +49,8 @@ async def get_claim_comments(
 @router.post("/", response_model=CommentResponse)
 async def create_comment(
     comment: CommentCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Repository = Depends(get_repository)
 ):
     """Create a new comment and return the full object in one query."""
     comment_data = comment.model_dump()
@@ -66,36 +65,27 @@ async def create_comment(
 
     comment_data["is_expert_response"] = current_user.is_expert
     
-    # --- FIX for v1.x syntax ---
-    # This uses two database calls, which is less efficient but
-    # will work with your old 'supabase-python' v1.x library.
-    
     # Step 1: Insert the data.
-    insert_result = supabase.table("claim_comments").insert(comment_data).execute()
+    inserted = await db.insert_comment(comment_data)
 
-    if not insert_result.data:
+    if not inserted:
          raise HTTPException(status_code=500, detail="Failed to create comment record.")
-    
-    # Get the new comment's ID from the insert response
-    new_comment_id = insert_result.data[0]['id']
 
     # Step 2: Fetch the full comment data (with user profile)
-    result = supabase.table("claim_comments").select(
-        "*, user:user_profiles(*)"
-    ).eq("id", new_comment_id).single().execute()
+    new_comment = await db.get_comment(inserted['id'])
 
-    if not result.data:
+    if not new_comment:
         raise HTTPException(status_code=500, detail="Failed to fetch newly created comment.")
     
-    return CommentResponse(**result.data)
-    # --- END FIX ---
+    return CommentResponse(**new_comment)
 
 
 @router.post("/{comment_id}/vote")
 async def vote_on_comment(
     comment_id: uuid.UUID,
     vote: CommentVote,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Repository = Depends(get_repository)
 ):
     """
     Vote on a comment.
@@ -108,12 +98,12 @@ async def vote_on_comment(
     }
     
     # Upsert ensures the vote is created or updated in one go
-    supabase.table("comment_votes").upsert(vote_data).execute()
+    await db.upsert_comment_vote(vote_data)
     
     # --- FIX ---
     # Trigger the recalculation function in the database
     try:
-        supabase.rpc("recalculate_comment_votes", {"c_id": str(comment_id)}).execute()
+        await db.recalculate_comment_votes(str(comment_id))
     except Exception as e:
         # Log the error, but the vote was still cast.
         print(f"Error recalculating votes for comment {comment_id}: {e}")
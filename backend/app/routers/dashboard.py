@@ -1,28 +1,23 @@
 # backend/app/routers/dashboard.py
 
 from fastapi import APIRouter, Depends
-from app.db import supabase
 from app.models.schemas import DashboardStats
 from app.services.auth import get_current_user, User
+from app.services.repository import Repository, get_repository
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 
 # ------------------- DASHBOARD STATS -------------------
 @router.get("/stats", response_model=DashboardStats)
-async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
+async def get_dashboard_stats(current_user: User = Depends(get_current_user), db: Repository = Depends(get_repository)):
     """
     Get dashboard statistics for the current user.
     Safely handles all RPC response cases (empty, dict, list).
     """
 
     try:
-        result = supabase.rpc(
-            "get_user_dashboard_stats",
-            {"user_id_param": str(current_user.id)}
-        ).execute()
-
-        data = result.data
+        data = await db.get_dashboard_stats(str(current_user.id))
 
         # 🛡️ Case 1: Empty or None
         if not data:
@@ -59,22 +54,14 @@ async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
 
 # ------------------- USER CLAIMS (NEW FIX) -------------------
 @router.get("/my-claims")
-async def get_my_claims(current_user: User = Depends(get_current_user)):
+async def get_my_claims(current_user: User = Depends(get_current_user), db: Repository = Depends(get_repository)):
     """
     Get ONLY the claims created by the logged-in user.
     This fixes the issue where all app claims were shown.
     """
 
     try:
-        result = (
-            supabase.table("claims")
-            .select("*")
-            .eq("user_id", str(current_user.id))
-            .order("created_at", desc=True)
-            .execute()
-        )
-
-        return result.data or []
+        return await db.get_user_claims(str(current_user.id))
 
     except Exception as e:
         print("My Claims Error:", str(e))
@@ -3,17 +3,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 import uuid
 
-# Use the centralized Supabase client and schemas
-from app.db import supabase
 from app.models.schemas import RTIRequestCreate, RTIRequest
 from app.services.auth import get_current_user, User
+from app.services.repository import Repository, get_repository
 
 router = APIRouter(prefix="/rti", tags=["rti"])
 
 @router.post("/", response_model=RTIRequest)
 async def create_rti_request(
     rti_request: RTIRequestCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Repository = Depends(get_repository)
 ):
     """Create a new RTI request for a claim."""
     request_data = {
@@ -23,9 +23,9 @@ async def create_rti_request(
         "status": "draft"  # Default status
     }
     
-    result = supabase.table("rti_requests").insert(request_data).select("*").single().execute()
+    created = await db.insert_rti_request(request_data)
     
-    if not result.data:
+    if not created:
         raise HTTPException(status_code=500, detail="Failed to create RTI request.")
         
-    return RTIRequest(**result.data)
\ No newline at end of file
+    return RTIRequest(**created)
\ No newline at end of file
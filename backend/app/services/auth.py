@@ -1,15 +1,27 @@
 """
 Authentication service for TruthGuard AI
 Handles JWT token verification and user authentication with Supabase
+
+Tokens are verified locally: their signature against the project's JWT secret
+(SUPABASE_JWT_SECRET) or its signing keys (the JWKS at SUPABASE_URL, cached and
+refreshed in the background), then their expiry and audience. Verified tokens
+are kept in a small LRU until they expire. Only tokens that cannot be checked
+locally (no secret configured, unknown key) cost a supabase.auth.get_user call.
+Like any local JWT check, a signed-out token stays valid until it expires.
 """
 
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-# from jose import JWTError, jwt # Not needed if using supabase.auth.get_user
+from jose import JWTError, jwt
 from supabase import create_client, Client
 import os
+import time
+import asyncio
+import hashlib
+import httpx
+from collections import OrderedDict
 from dotenv import load_dotenv # Import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from pydantic import BaseModel # Corrected import
 
 # --- Load environment variables first ---
@@ -37,6 +49,128 @@ else:
 
 security = HTTPBearer()
 
+# HS256 secret of projects on the legacy JWT secret (Settings > API > JWT Secret)
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+# Signing keys of projects on asymmetric JWT keys are re-fetched this often
+SUPABASE_JWKS_REFRESH_SECONDS = float(os.getenv("SUPABASE_JWKS_REFRESH_SECONDS", "600"))
+# Verified tokens remembered until they expire
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "2048"))
+JWT_AUDIENCE = "authenticated"
+# Tokens are accepted this many seconds past exp, for clock skew
+JWT_LEEWAY_SECONDS = 30
+
+# Verifications by outcome: served from the LRU, checked locally, or looked up remotely
+auth_stats: Dict[str, int] = {"cache": 0, "local": 0, "remote": 0, "rejected": 0}
+
+
+class _LocalKeyUnavailable(Exception):
+    """The token cannot be checked locally; verify_token falls back to Supabase."""
+
+
+class JWKSCache:
+    """The project's public signing keys by kid, refreshed in the background once stale."""
+
+    def __init__(self, url: Optional[str]):
+        self.url = url
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.fetched_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    async def _fetch(self) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+            self.keys = {key["kid"]: key for key in response.json().get("keys", []) if key.get("kid")}
+        except Exception as e:
+            print(f"Auth Warning: Could not fetch signing keys from {self.url}: {e}")
+        # Failed fetches also wait a refresh interval, so a down endpoint is not hammered
+        self.fetched_at = time.monotonic()
+
+    async def get(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.url:
+            return None
+        stale = time.monotonic() - self.fetched_at >= SUPABASE_JWKS_REFRESH_SECONDS
+        if kid not in self.keys and (stale or not self.fetched_at):
+            # Unknown key (first use, or a rotation): wait for the refresh
+            await self._fetch()
+        elif stale and (self._refreshing is None or self._refreshing.done()):
+            self._refreshing = asyncio.create_task(self._fetch())
+        return self.keys.get(kid)
+
+
+_jwks = JWKSCache(f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json" if supabase_url else None)
+_token_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def _cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _cached_user(token: str) -> Optional[Dict[str, Any]]:
+    key = _cache_key(token)
+    entry = _token_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, user_data = entry
+    if expires_at <= time.time():
+        del _token_cache[key]
+        return None
+    _token_cache.move_to_end(key)
+    return user_data
+
+def _remember_user(token: str, expires_at: Optional[float], user_data: Dict[str, Any]) -> None:
+    if not expires_at:
+        return
+    _token_cache[_cache_key(token)] = (expires_at, user_data)
+    while len(_token_cache) > AUTH_TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+
+async def _verify_locally(token: str) -> Dict[str, Any]:
+    """Checks signature, expiry and audience; raises JWTError for a bad token."""
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    key: Any = None
+    if algorithm == "HS256":
+        key = SUPABASE_JWT_SECRET
+    elif algorithm in ("ES256", "RS256"):
+        key = await _jwks.get(header.get("kid"))
+    if not key:
+        raise _LocalKeyUnavailable(f"No local key for {algorithm} token")
+    return jwt.decode(
+        token, key, algorithms=[algorithm], audience=JWT_AUDIENCE,
+        options={"leeway": JWT_LEEWAY_SECONDS}
+    )
+
+async def _verify_remotely(token: str) -> Dict[str, Any]:
+    """Asks Supabase Auth for the token's user."""
+    user_response = await asyncio.to_thread(supabase.auth.get_user, token)
+
+    # Check the structure of the response
+    if user_response and hasattr(user_response, 'user') and user_response.user:
+        # Access user attributes safely
+        user_id = getattr(user_response.user, 'id', None)
+        user_email = getattr(user_response.user, 'email', None)
+        user_metadata = getattr(user_response.user, 'user_metadata', {}) or {} # Ensure it's a dict
+
+        if user_id and user_email:
+            return {
+                "id": str(user_id), # Ensure ID is string
+                "email": user_email,
+                "user_metadata": user_metadata
+            }
+        else:
+             # Log unexpected user object structure
+             print(f"Auth Warning: User object structure unexpected: {user_response.user}")
+             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user data in token")
+
+    else:
+        # Log the invalid response
+        print(f"Auth Debug: supabase.auth.get_user returned invalid response for token: {user_response}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+
 class User(BaseModel):
     id: str
     email: str
@@ -46,8 +180,36 @@ class User(BaseModel):
 
 async def verify_token(token: str) -> Dict[str, Any]:
     """
-    Verify JWT token using the initialized Supabase client
+    Verify a Supabase JWT: from the LRU of verified tokens, locally against the
+    project's keys, or with the Supabase client when no local key applies.
     """
+    user_data = _cached_user(token)
+    if user_data is not None:
+        auth_stats["cache"] += 1
+        return user_data
+
+    try:
+        claims = await _verify_locally(token)
+        if not claims.get("sub") or not claims.get("email"):
+            raise JWTError("Token has no user")
+        user_data = {
+            "id": str(claims["sub"]),
+            "email": claims["email"],
+            "user_metadata": claims.get("user_metadata") or {}
+        }
+        auth_stats["local"] += 1
+        _remember_user(token, claims.get("exp"), user_data)
+        return user_data
+    except _LocalKeyUnavailable:
+        pass
+    except JWTError as e:
+        # A token that fails a local check is not retried remotely
+        auth_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Token verification failed: {str(e)}"
+        )
+
     if not supabase: # Check if client initialized correctly
          raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -55,42 +217,24 @@ async def verify_token(token: str) -> Dict[str, Any]:
          )
 
     try:
-        # Use the Supabase client's auth method
-        user_response = supabase.auth.get_user(token)
-
-        # Check the structure of the response
-        if user_response and hasattr(user_response, 'user') and user_response.user:
-            # Access user attributes safely
-            user_id = getattr(user_response.user, 'id', None)
-            user_email = getattr(user_response.user, 'email', None)
-            user_metadata = getattr(user_response.user, 'user_metadata', {}) or {} # Ensure it's a dict
-
-            if user_id and user_email:
-                return {
-                    "id": str(user_id), # Ensure ID is string
-                    "email": user_email,
-                    "user_metadata": user_metadata
-                }
-            else:
-                 # Log unexpected user object structure
-                 print(f"Auth Warning: User object structure unexpected: {user_response.user}")
-                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user data in token")
-
-        else:
-            # Log the invalid response
-            print(f"Auth Debug: supabase.auth.get_user returned invalid response for token: {user_response}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-
+        user_data = await _verify_remotely(token)
+    except HTTPException:
+        auth_stats["rejected"] += 1
+        raise
     except Exception as e:
         # Log the specific exception
         print(f"Auth Error: Exception during token verification: {e}")
+        auth_stats["rejected"] += 1
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Token verification failed: {str(e)}" # Provide more context if safe
         )
+    auth_stats["remote"] += 1
+    try:
+        _remember_user(token, jwt.get_unverified_claims(token).get("exp"), user_data)
+    except JWTError:
+        pass
+    return user_data
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     """Get current authenticated user from token."""
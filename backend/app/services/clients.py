@@ -0,0 +1,230 @@
+"""
+Shared HTTP clients for the backend
+
+Claim processing used to build a service-role Supabase client for every claim
+and a new httpx.AsyncClient for every AI-service call, so each claim paid for
+client setup and fresh TCP/TLS connections several times over. These clients
+are instead created once per process, keep their connections alive within
+bounded pools, and report pool usage for /metrics.
+
+The routers query through an async anon-key client (app.services.repository),
+so a slow PostgREST call no longer blocks every other request on the worker.
+Requests that must act as the signed-in user (RLS on inserts and uploads) get
+a UserClient: PostgREST and storage handles that send that user's JWT but use
+the same connection pool, instead of switching the auth of a shared client.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from storage3 import AsyncStorageClient
+from supabase import create_client, acreate_client, Client, AsyncClient, AsyncClientOptions
+
+logger = logging.getLogger(__name__)
+
+# Pooled connections of the service-role Supabase client (REST, RPC and storage)
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "20"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+# Pooled connections of the routers' async Supabase client; bounds concurrent queries per process
+SUPABASE_ASYNC_MAX_CONNECTIONS = int(os.getenv("SUPABASE_ASYNC_MAX_CONNECTIONS", "50"))
+# Pooled connections to the AI service; a worker needs about one per claim slot
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+# Idle connections are kept this long before they are closed
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+_lock = threading.Lock()
+_service_client: Optional[Client] = None
+_service_http: Optional[httpx.Client] = None
+_ai_client: Optional[httpx.AsyncClient] = None
+_async_client: Optional[AsyncClient] = None
+_async_http: Optional[httpx.AsyncClient] = None
+_async_lock: Optional[asyncio.Lock] = None
+# Per pool: clients built and requests sent, for /metrics
+_counters: Dict[str, Dict[str, int]] = {
+    "supabase": {"clients_created": 0, "requests": 0},
+    "supabase_async": {"clients_created": 0, "requests": 0},
+    "ai_service": {"clients_created": 0, "requests": 0},
+}
+
+
+def _count_request(pool: str) -> None:
+    _counters[pool]["requests"] += 1
+
+
+def get_service_client(supabase_url: Optional[str] = None, supabase_service_key: Optional[str] = None) -> Client:
+    """The process's service-role Supabase client, created on first use."""
+    global _service_client, _service_http
+    if _service_client is not None:
+        return _service_client
+    supabase_url = supabase_url or os.getenv("SUPABASE_URL")
+    supabase_service_key = supabase_service_key or os.getenv("SUPABASE_SERVICE_KEY")
+    if not supabase_url or not supabase_service_key:
+        raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set.")
+
+    with _lock:
+        if _service_client is None:
+            http = httpx.Client(
+                timeout=SUPABASE_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                event_hooks={"request": [lambda request: _count_request("supabase")]}
+            )
+            try:
+                from supabase import ClientOptions
+                client = create_client(supabase_url, supabase_service_key, options=ClientOptions(httpx_client=http))
+            except (ImportError, TypeError):
+                # supabase-py before httpx_client support: its own per-service pools, without metrics
+                http.close()
+                http = None
+                client = create_client(supabase_url, supabase_service_key)
+            _service_http = http
+            _service_client = client
+            _counters["supabase"]["clients_created"] += 1
+            logger.info("Service-role Supabase client initialized")
+    return _service_client
+
+
+async def get_async_client() -> AsyncClient:
+    """The process's async anon-key Supabase client, created on first use."""
+    global _async_client, _async_http, _async_lock
+    if _async_client is not None:
+        return _async_client
+    if _async_lock is None:
+        _async_lock = asyncio.Lock()
+    async with _async_lock:
+        if _async_client is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_KEY")
+            if not supabase_url or not supabase_key:
+                raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set.")
+
+            async def count(request):
+                _count_request("supabase_async")
+
+            http = httpx.AsyncClient(
+                timeout=SUPABASE_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=SUPABASE_ASYNC_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                event_hooks={"request": [count]}
+            )
+            try:
+                client = await acreate_client(supabase_url, supabase_key, options=AsyncClientOptions(httpx_client=http))
+            except TypeError:
+                # supabase-py before httpx_client support, as for the service client
+                await http.aclose()
+                http = None
+                client = await acreate_client(supabase_url, supabase_key)
+            _async_http = http
+            _async_client = client
+            _counters["supabase_async"]["clients_created"] += 1
+            logger.info("Async Supabase client initialized")
+    return _async_client
+
+
+class UserClient:
+    """PostgREST and storage handles that authenticate as one user, for one request."""
+
+    def __init__(self, postgrest: AsyncPostgrestClient, storage: AsyncStorageClient):
+        self.postgrest = postgrest
+        self.storage = storage
+
+    def table(self, table_name: str):
+        return self.postgrest.from_(table_name)
+
+
+@asynccontextmanager
+async def user_client(user_jwt: str) -> AsyncIterator[UserClient]:
+    """
+    Handles that send user_jwt instead of the anon key. They only hold headers
+    and share the async client's pool, so building one per request is cheap.
+    """
+    client = await get_async_client()
+    headers = {**client.options.headers, "Authorization": f"Bearer {user_jwt}"}
+    rest_url, storage_url = str(client.rest_url), str(client.storage_url)
+    if _async_http is not None:
+        yield UserClient(
+            AsyncPostgrestClient(rest_url, headers=headers, http_client=_async_http),
+            AsyncStorageClient(storage_url, headers, http_client=_async_http)
+        )
+        return
+    # Without httpx_client support the handles open sessions of their own
+    handle = UserClient(AsyncPostgrestClient(rest_url, headers=headers), AsyncStorageClient(storage_url, headers))
+    try:
+        yield handle
+    finally:
+        await handle.postgrest.aclose()
+        await handle.storage.session.aclose()
+
+
+def get_ai_client() -> httpx.AsyncClient:
+    """
+    The process's client for backend -> AI service calls. Callers pass a timeout
+    per request; this one only bounds connecting. Bound to the event loop that
+    first uses it, like any httpx.AsyncClient.
+    """
+    global _ai_client
+    if _ai_client is None or _ai_client.is_closed:
+        async def count(request):
+            _count_request("ai_service")
+
+        _ai_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            event_hooks={"request": [count]}
+        )
+        _counters["ai_service"]["clients_created"] += 1
+    return _ai_client
+
+
+async def close_clients() -> None:
+    """Closes the pooled connections; called on API shutdown and when a worker stops."""
+    global _ai_client, _service_client, _service_http, _async_client, _async_http
+    if _ai_client is not None:
+        await _ai_client.aclose()
+        _ai_client = None
+    if _async_http is not None:
+        await _async_http.aclose()
+    _async_http = None
+    _async_client = None
+    if _service_http is not None:
+        _service_http.close()
+    _service_http = None
+    _service_client = None
+
+
+def _pool_usage(client: Optional[Any]) -> Dict[str, int]:
+    # httpx does not expose its pool, so read the httpcore pool behind the default transport
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return {"connections": 0, "idle": 0, "in_flight": 0}
+    connections = list(getattr(pool, "connections", []))
+    return {
+        "connections": len(connections),
+        "idle": sum(1 for connection in connections if connection.is_idle()),
+        "in_flight": len(getattr(pool, "_requests", []))
+    }
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Per pool: clients built, requests sent, and open, idle and in-flight connections."""
+    return {
+        "supabase": {**_counters["supabase"], "max_connections": SUPABASE_HTTP_MAX_CONNECTIONS, **_pool_usage(_service_http)},
+        "supabase_async": {**_counters["supabase_async"], "max_connections": SUPABASE_ASYNC_MAX_CONNECTIONS, **_pool_usage(_async_http)},
+        "ai_service": {**_counters["ai_service"], "max_connections": AI_HTTP_MAX_CONNECTIONS, **_pool_usage(_ai_client)},
+    }
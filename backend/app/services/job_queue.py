@@ -0,0 +1,185 @@
+"""
+Durable claim-processing queue backed by the claim_jobs table
+
+Submitted claims are queued as rows in public.claim_jobs instead of running as
+in-process background tasks, so they survive restarts and are processed by
+separate worker processes (app.worker) with a bounded concurrency. The SQL
+functions in database/schema.sql do the locking; this module wraps them for
+the service-role Supabase client.
+
+Jobs are put on lanes by expected cost: "fast" for text and URL claims, "media"
+for images and "heavy" for video or large files. Workers give every lane its
+own concurrency limit and share their slots between busy lanes by weight, so a
+burst of videos cannot hold up text verdicts.
+"""
+
+import os
+import random
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from supabase import Client
+
+from app.services.clients import get_service_client
+
+logger = logging.getLogger(__name__)
+
+# Attempts per claim before it is marked failed
+CLAIM_JOB_MAX_ATTEMPTS = int(os.getenv("CLAIM_JOB_MAX_ATTEMPTS", "5"))
+# How long a taken job stays invisible to other workers; workers extend it while they run
+CLAIM_JOB_VISIBILITY_TIMEOUT = int(os.getenv(
+    "CLAIM_JOB_VISIBILITY_TIMEOUT", str(int(float(os.getenv("AI_ANALYSIS_TIMEOUT", "300"))) + 60)
+))
+# Retry delays: base * 2^(attempt - 1), capped, with jitter
+CLAIM_JOB_BACKOFF_BASE = float(os.getenv("CLAIM_JOB_BACKOFF_BASE", "10"))
+CLAIM_JOB_MAX_BACKOFF = float(os.getenv("CLAIM_JOB_MAX_BACKOFF", "600"))
+# Claims pending or processing this long without a live job are queued again
+CLAIM_STUCK_AFTER_SECONDS = int(os.getenv("CLAIM_STUCK_AFTER_SECONDS", "900"))
+# Uploads above this size go to the heavy lane whatever their type
+CLAIM_HEAVY_FILE_MB = float(os.getenv("CLAIM_HEAVY_FILE_MB", "20"))
+
+
+def _lane_setting(name: str, default: str) -> Dict[str, float]:
+    """Parses "fast=4,media=2,heavy=1" style per-lane settings."""
+    values = {}
+    for part in os.getenv(name, default).split(","):
+        if "=" in part:
+            lane, value = part.split("=", 1)
+            values[lane.strip()] = float(value)
+    return values
+
+
+@dataclass(frozen=True)
+class Lane:
+    name: str
+    # Jobs of this lane one worker process runs at once
+    concurrency: int
+    # Share of a worker's slots when several lanes have jobs waiting
+    weight: float
+    # Turnaround target reported by the queue stats
+    slo_seconds: float
+
+
+_concurrency = _lane_setting("CLAIM_LANE_CONCURRENCY", "fast=4,media=2,heavy=1")
+_weights = _lane_setting("CLAIM_LANE_WEIGHTS", "fast=4,media=2,heavy=1")
+_slos = _lane_setting("CLAIM_LANE_SLO_SECONDS", "fast=10,media=60,heavy=600")
+LANES: Dict[str, Lane] = {
+    name: Lane(name, int(_concurrency.get(name, 1)), _weights.get(name, 1.0), _slos.get(name, 600.0))
+    for name in ("fast", "media", "heavy")
+}
+
+
+def classify_lane(content_type: str, file_size: Optional[int] = None) -> str:
+    """Lane for a claim by expected analysis cost (transcription >> OCR >> text)."""
+    if content_type == "video" or (file_size or 0) > CLAIM_HEAVY_FILE_MB * 1024 * 1024:
+        return "heavy"
+    if content_type == "image":
+        return "media"
+    return "fast"
+
+
+@dataclass
+class ClaimJob:
+    id: int
+    claim_id: str
+    attempts: int
+    max_attempts: int
+    lane: str = "fast"
+    enqueued_at: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "ClaimJob":
+        return cls(
+            id=row["id"],
+            claim_id=str(row["claim_id"]),
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            lane=row.get("lane") or "fast",
+            enqueued_at=row.get("enqueued_at")
+        )
+
+    @property
+    def last_attempt(self) -> bool:
+        return self.attempts >= self.max_attempts
+
+
+def backoff_delay(attempt: int) -> float:
+    """Seconds before retrying after the given (1-based) failed attempt."""
+    delay = min(CLAIM_JOB_MAX_BACKOFF, CLAIM_JOB_BACKOFF_BASE * 2 ** max(attempt - 1, 0))
+    # Full jitter on the upper half, so claims that failed together do not retry together
+    return delay * random.uniform(0.5, 1.0)
+
+
+class ClaimJobQueue:
+    """The claim_jobs RPCs, called with a service-role client (the table has no RLS policies)."""
+
+    def __init__(self, client: Client, worker_id: str = "api"):
+        self.client = client
+        self.worker_id = worker_id
+
+    def enqueue(self, claim_id: str, lane: Optional[str] = None) -> int:
+        """Queues a claim; without a lane the database picks one from the content type."""
+        result = self.client.rpc("enqueue_claim_job", {
+            "job_claim_id": claim_id,
+            "job_max_attempts": CLAIM_JOB_MAX_ATTEMPTS,
+            "job_lane": lane
+        }).execute()
+        return result.data
+
+    def dequeue(self, batch_size: int, lane: Optional[str] = None) -> List[ClaimJob]:
+        rows = self.client.rpc("dequeue_claim_jobs", {
+            "worker": self.worker_id,
+            "batch_size": batch_size,
+            "visibility_seconds": CLAIM_JOB_VISIBILITY_TIMEOUT,
+            "job_lane": lane
+        }).execute().data or []
+        return [ClaimJob.from_row(row) for row in rows]
+
+    def extend(self, job: ClaimJob) -> bool:
+        """Heartbeat; False if another worker has taken the job over."""
+        return bool(self.client.rpc("extend_claim_job", {
+            "job_id": job.id,
+            "worker": self.worker_id,
+            "visibility_seconds": CLAIM_JOB_VISIBILITY_TIMEOUT
+        }).execute().data)
+
+    def complete(self, job: ClaimJob) -> bool:
+        return bool(self.client.rpc("complete_claim_job", {"job_id": job.id, "worker": self.worker_id}).execute().data)
+
+    def retry(self, job: ClaimJob, error: str, give_up: bool = False) -> str:
+        """
+        Schedules the next attempt with backoff. Returns "queued", or "failed" after
+        the last attempt or when give_up is set.
+        """
+        status = self.client.rpc("retry_claim_job", {
+            "job_id": job.id,
+            "worker": self.worker_id,
+            "error": error,
+            "delay_seconds": backoff_delay(job.attempts),
+            "give_up": give_up
+        }).execute().data
+        return status or "failed"
+
+    def recover(self) -> Dict[str, int]:
+        rows = self.client.rpc("recover_claim_jobs", {
+            "stale_seconds": CLAIM_STUCK_AFTER_SECONDS,
+            "job_max_attempts": CLAIM_JOB_MAX_ATTEMPTS
+        }).execute().data or []
+        return rows[0] if rows else {"failed": 0, "synced": 0, "requeued": 0}
+
+    def stats(self, window_seconds: int = 3600) -> Dict[str, Any]:
+        return self.client.rpc("claim_job_stats", {
+            "window_seconds": window_seconds,
+            "lane_slo": {lane.name: lane.slo_seconds for lane in LANES.values()}
+        }).execute().data or {}
+
+
+_api_queue: Optional[ClaimJobQueue] = None
+
+def get_api_queue(supabase_url: str, supabase_service_key: str) -> ClaimJobQueue:
+    """Queue handle for the API process, on the shared service-role client."""
+    global _api_queue
+    if _api_queue is None:
+        _api_queue = ClaimJobQueue(get_service_client(supabase_url, supabase_service_key), worker_id="api")
+    return _api_queue
@@ -0,0 +1,199 @@
+"""
+Async data access for the backend routers
+
+The routers used to call the synchronous supabase-py client inside their
+async handlers, so every PostgREST round trip blocked the event loop and a
+single slow query stalled all concurrent requests on that worker. Their
+queries now live here, on the shared async client from app.services.clients,
+and handlers that need several independent results fetch them concurrently
+with asyncio.gather.
+
+Methods return plain rows (dicts), lists of rows, counts or None; the routers
+keep building their response models from them.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from supabase import AsyncClient
+
+from app.services.clients import get_async_client
+
+CLAIM_DETAIL_COLUMNS = "*, claim_analyses(*), claim_comments(count)"
+COMMENT_COLUMNS = "*, user:user_profiles(*)"
+BROWSE_COLUMNS = (
+    "id, content, content_type, status, created_at, comment_count, upvote_count, "
+    "comments:claim_comments(id, content, upvotes, downvotes, is_expert_response, created_at, updated_at, user:user_profiles(id, full_name, avatar_url)), "
+    "analysis:claim_analyses(*)"
+)
+
+
+def _first(rows: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    return rows[0] if rows else None
+
+
+class Repository:
+    """Queries of the backend routers, on one pooled AsyncClient."""
+
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+    # --- Claims ---
+
+    async def get_claim_detail(self, claim_id: str) -> Optional[Dict[str, Any]]:
+        """Claim with its analysis and comment count, or None."""
+        result = await self.client.table("claims").select(CLAIM_DETAIL_COLUMNS).eq("id", claim_id).limit(1).execute()
+        return _first(result.data)
+
+    async def get_claim_status(self, claim_id: str) -> Optional[str]:
+        result = await self.client.table("claims").select("status").eq("id", claim_id).limit(1).execute()
+        row = _first(result.data)
+        return row["status"] if row else None
+
+    async def get_claim_vote(self, claim_id: str, user_id: str) -> Optional[str]:
+        result = await self.client.table("claim_votes").select("vote_type").eq(
+            "claim_id", claim_id
+        ).eq("user_id", user_id).limit(1).execute()
+        row = _first(result.data)
+        return row["vote_type"] if row else None
+
+    async def search_claims(
+        self, q: Optional[str], status: Optional[str], offset: int, limit: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """A page of claims with analyses and comment counts, newest first, and the total match count."""
+        query = self.client.table("claims").select(CLAIM_DETAIL_COLUMNS, count="exact")
+        if q:
+            query = query.ilike("content", f"%{q}%")
+        if status:
+            query = query.eq("status", status)
+        result = await query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+        return result.data or [], result.count or 0
+
+    async def browse_claims(self, order_column: str, skip: int, limit: int) -> List[Dict[str, Any]]:
+        """A page of claims with comments, commenters and analysis, by order_column descending."""
+        result = await self.client.table("claims").select(BROWSE_COLUMNS).order(
+            order_column, desc=True
+        ).range(skip, skip + limit - 1).execute()
+        return result.data or []
+
+    async def upsert_claim_vote(self, vote_data: Dict[str, Any]) -> None:
+        await self.client.table("claim_votes").upsert(vote_data).execute()
+
+    async def recalculate_claim_votes(self, claim_id: str) -> None:
+        await self.client.rpc("recalculate_claim_votes", {"c_id": claim_id}).execute()
+
+    async def get_user_claims(self, user_id: str) -> List[Dict[str, Any]]:
+        result = await self.client.table("claims").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        return result.data or []
+
+    async def get_dashboard_stats(self, user_id: str) -> Any:
+        result = await self.client.rpc("get_user_dashboard_stats", {"user_id_param": user_id}).execute()
+        return result.data
+
+    # --- Comments ---
+
+    async def list_comments(self, claim_id: str) -> List[Dict[str, Any]]:
+        result = await self.client.table("claim_comments").select(COMMENT_COLUMNS).eq(
+            "claim_id", claim_id
+        ).order("created_at", desc=True).execute()
+        return result.data or []
+
+    async def get_comment_votes(self, claim_id: str, user_id: str) -> Dict[str, str]:
+        """The user's votes on a claim's comments, by comment id."""
+        # Joined through the comment, so this does not have to wait for the comment list
+        result = await self.client.table("comment_votes").select(
+            "comment_id, vote_type, claim_comments!inner(claim_id)"
+        ).eq("claim_comments.claim_id", claim_id).eq("user_id", user_id).execute()
+        return {vote["comment_id"]: vote["vote_type"] for vote in result.data or []}
+
+    async def insert_comment(self, comment_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = await self.client.table("claim_comments").insert(comment_data).execute()
+        return _first(result.data)
+
+    async def get_comment(self, comment_id: str) -> Optional[Dict[str, Any]]:
+        result = await self.client.table("claim_comments").select(COMMENT_COLUMNS).eq("id", comment_id).limit(1).execute()
+        return _first(result.data)
+
+    async def upsert_comment_vote(self, vote_data: Dict[str, Any]) -> None:
+        await self.client.table("comment_votes").upsert(vote_data, on_conflict="comment_id,user_id").execute()
+
+    async def recalculate_comment_votes(self, comment_id: str) -> None:
+        await self.client.rpc("recalculate_comment_votes", {"c_id": comment_id}).execute()
+
+    # --- Users ---
+
+    async def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        result = await self.client.table("user_profiles").select("*").eq("id", user_id).limit(1).execute()
+        return _first(result.data)
+
+    async def insert_profile(self, profile_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = await self.client.table("user_profiles").insert(profile_data).execute()
+        return _first(result.data)
+
+    async def update_profile(self, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = await self.client.table("user_profiles").update(update_data).eq("id", user_id).execute()
+        return _first(result.data)
+
+    async def get_recent_claims(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        result = await self.client.table("claims").select(
+            "id, content, status, created_at"
+        ).eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
+        return result.data or []
+
+    async def get_recent_comments(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        result = await self.client.table("claim_comments").select(
+            "id, content, created_at, upvotes, downvotes, claims(id, content)"
+        ).eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
+        return result.data or []
+
+    async def get_analyses_for_claims(self, claim_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Verdict and confidence of each claim's analysis, by claim id."""
+        if not claim_ids:
+            return {}
+        result = await self.client.table("claim_analyses").select(
+            "claim_id, verdict, confidence_score"
+        ).in_("claim_id", claim_ids).execute()
+        return {str(row["claim_id"]): row for row in result.data or []}
+
+    async def get_comment_counts(self, claim_ids: List[str]) -> Dict[str, int]:
+        """Number of comments on each claim, by claim id."""
+        if not claim_ids:
+            return {}
+        result = await self.client.table("claim_comments").select("claim_id").in_("claim_id", claim_ids).execute()
+        counts: Dict[str, int] = {}
+        for row in result.data or []:
+            counts[str(row["claim_id"])] = counts.get(str(row["claim_id"]), 0) + 1
+        return counts
+
+    async def count_user_claims(self, user_id: str, verdict: Optional[str] = None) -> int:
+        """Claims the user submitted; with a verdict, only those whose analysis has it."""
+        if verdict:
+            query = self.client.table("claims").select("id, claim_analyses!inner(verdict)", count="exact", head=True).eq(
+                "claim_analyses.verdict", verdict
+            )
+        else:
+            query = self.client.table("claims").select("id", count="exact", head=True)
+        result = await query.eq("user_id", user_id).execute()
+        return result.count or 0
+
+    async def count_user_comments(self, user_id: str) -> int:
+        result = await self.client.table("claim_comments").select("id", count="exact", head=True).eq("user_id", user_id).execute()
+        return result.count or 0
+
+    # --- RTI requests ---
+
+    async def insert_rti_request(self, request_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = await self.client.table("rti_requests").insert(request_data).execute()
+        return _first(result.data)
+
+
+async def get_repository() -> Repository:
+    """FastAPI dependency: the repository on the process's shared async client."""
+    return Repository(await get_async_client())
+
+
+async def gather_optional(*aws) -> Tuple[Any, ...]:
+    """asyncio.gather for independent queries, where None stands for a query that is not needed."""
+    async def none():
+        return None
+    return tuple(await asyncio.gather(*(aw if aw is not None else none() for aw in aws)))
@@ -0,0 +1,251 @@
+"""
+TruthGuard AI claim workers
+
+Processes the claims queued in public.claim_jobs, outside the API process.
+Each worker process runs its own event loop with a fixed number of analysis
+slots, takes jobs with dequeue_claim_jobs (SKIP LOCKED, so processes never
+get the same job), keeps them invisible to other workers with a heartbeat
+while they run, and retries failures with exponential backoff. The first
+process also recovers claims left behind by crashed workers.
+
+A process's slots are shared between the cost lanes of app.services.job_queue:
+no lane runs more than its own concurrency, and lanes with jobs waiting get
+free slots in proportion to their weights (stride scheduling), so text claims
+keep flowing while video claims fill the heavy lane.
+
+Run from backend/:
+
+    python -m app.worker --processes 2 --concurrency 6
+    python -m app.worker --lanes heavy --concurrency 2   # dedicated video workers
+"""
+
+import os
+import socket
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+import time
+from typing import Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+from supabase import Client
+
+from app.models.schemas import ClaimStatus
+from app.services.clients import get_service_client, close_clients, pool_stats
+from app.services.claim_processor import run_claim_analysis, mark_claim_failed, PermanentClaimError
+from app.services.job_queue import ClaimJob, ClaimJobQueue, Lane, LANES, CLAIM_JOB_VISIBILITY_TIMEOUT
+
+logger = logging.getLogger("app.worker")
+load_dotenv()
+
+# Worker processes, and claims each of them analyzes at once
+CLAIM_WORKER_PROCESSES = int(os.getenv("CLAIM_WORKER_PROCESSES", "1"))
+CLAIM_WORKER_CONCURRENCY = int(os.getenv("CLAIM_WORKER_CONCURRENCY", "6"))
+# How often an idle worker looks for new jobs
+CLAIM_QUEUE_POLL_SECONDS = float(os.getenv("CLAIM_QUEUE_POLL_SECONDS", "1"))
+# How often stuck claims are recovered and queue stats are logged
+CLAIM_QUEUE_RECOVER_SECONDS = float(os.getenv("CLAIM_QUEUE_RECOVER_SECONDS", "60"))
+# Time running claims get to finish after SIGTERM before they are left to recovery
+CLAIM_WORKER_SHUTDOWN_GRACE = float(os.getenv("CLAIM_WORKER_SHUTDOWN_GRACE", "30"))
+
+
+class LaneScheduler:
+    """
+    Splits one worker process's slots between lanes. Each lane is capped at its
+    own concurrency; among lanes below their cap, the one that has received the
+    least service relative to its weight (lowest pass) is filled next.
+    """
+
+    def __init__(self, lanes: List[Lane], concurrency: int):
+        self.lanes = lanes
+        self.concurrency = concurrency
+        self.running: Dict[str, int] = {lane.name: 0 for lane in lanes}
+        self.passes: Dict[str, float] = {lane.name: 0.0 for lane in lanes}
+        self.virtual_time = 0.0
+
+    def free(self) -> int:
+        return self.concurrency - sum(self.running.values())
+
+    def lane_free(self, lane: Lane) -> int:
+        return min(self.free(), lane.concurrency - self.running[lane.name])
+
+    def next_lane(self, skip: Set[str]) -> Optional[Lane]:
+        candidates = [lane for lane in self.lanes if lane.name not in skip and self.lane_free(lane) > 0]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda lane: (self.passes[lane.name], -lane.weight))
+
+    def started(self, lane: Lane, count: int) -> None:
+        # A lane that sat idle resumes at the current virtual time instead of
+        # claiming all the service it missed
+        self.passes[lane.name] = max(self.passes[lane.name], self.virtual_time)
+        self.virtual_time = self.passes[lane.name]
+        self.passes[lane.name] += count / lane.weight
+        self.running[lane.name] += count
+
+    def finished(self, lane: Lane) -> None:
+        self.running[lane.name] -= 1
+
+
+async def keep_visible(queue: ClaimJobQueue, job: ClaimJob, analysis: asyncio.Task) -> None:
+    """Extends the job's lock while it runs; stops the analysis if another worker took the job over."""
+    while True:
+        await asyncio.sleep(CLAIM_JOB_VISIBILITY_TIMEOUT / 3)
+        try:
+            if not await asyncio.to_thread(queue.extend, job):
+                logger.warning(f"Lost job {job.id} (claim {job.claim_id}) to another worker; stopping")
+                analysis.cancel()
+                return
+        except Exception as e:
+            # The lock has VISIBILITY_TIMEOUT / 3 * 2 left; the next heartbeat may get through
+            logger.warning(f"Heartbeat failed for job {job.id}: {e}")
+
+
+async def process_job(queue: ClaimJobQueue, client: Client, job: ClaimJob) -> None:
+    started = time.monotonic()
+    analysis = asyncio.create_task(run_claim_analysis(job.claim_id, client))
+    heartbeat = asyncio.create_task(keep_visible(queue, job, analysis))
+    try:
+        await analysis
+    except asyncio.CancelledError:
+        if heartbeat.done():
+            # Lost the job to another worker, which will write the result
+            return
+        raise
+    except PermanentClaimError as e:
+        logger.error(f"Claim {job.claim_id} failed permanently: {e}")
+        await asyncio.to_thread(queue.retry, job, str(e), True)
+        await asyncio.to_thread(mark_claim_failed, client, job.claim_id, e)
+    except Exception as e:
+        status = await asyncio.to_thread(queue.retry, job, str(e))
+        if status == "failed":
+            logger.error(f"Claim {job.claim_id} failed after {job.attempts} attempts: {e}", exc_info=True)
+            await asyncio.to_thread(mark_claim_failed, client, job.claim_id, e)
+        else:
+            logger.warning(f"Attempt {job.attempts}/{job.max_attempts} for claim {job.claim_id} failed, retrying: {e}")
+            try:
+                await asyncio.to_thread(
+                    client.table("claims").update({"status": ClaimStatus.PENDING.value}).eq("id", job.claim_id).execute
+                )
+            except Exception as db_e:
+                logger.error(f"Could not reset claim {job.claim_id} to PENDING: {db_e}")
+    else:
+        await asyncio.to_thread(queue.complete, job)
+        logger.info(f"Processed {job.lane} claim {job.claim_id} (job {job.id}, attempt {job.attempts}) in {time.monotonic() - started:.1f}s")
+    finally:
+        heartbeat.cancel()
+
+
+async def run_worker(index: int, concurrency: int, lanes: List[Lane]) -> None:
+    # One pooled service client and AI-service client per process, shared by all slots
+    client = get_service_client()
+    queue = ClaimJobQueue(client, worker_id=f"{socket.gethostname()}:{os.getpid()}")
+    scheduler = LaneScheduler(lanes, concurrency)
+    running: Set[asyncio.Task] = set()
+    stopping = asyncio.Event()
+    stop_wait = asyncio.ensure_future(stopping.wait())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    def start(lane: Lane, job: ClaimJob) -> None:
+        task = asyncio.create_task(process_job(queue, client, job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: scheduler.finished(lane))
+
+    lane_names = ", ".join(f"{lane.name}={lane.concurrency}" for lane in lanes)
+    logger.info(f"Claim worker {queue.worker_id} started with {concurrency} slots ({lane_names})")
+    last_recover = 0.0
+    while not stopping.is_set():
+        if time.monotonic() - last_recover >= CLAIM_QUEUE_RECOVER_SECONDS:
+            last_recover = time.monotonic()
+            if index == 0:
+                try:
+                    recovered = await asyncio.to_thread(queue.recover)
+                    if any(recovered.values()):
+                        logger.warning(f"Recovered stuck claims: {recovered}")
+                    logger.info(f"Claim queue stats: {await asyncio.to_thread(queue.stats)}")
+                except Exception as e:
+                    logger.error(f"Claim recovery failed: {e}")
+            logger.info(f"Connection pools: {pool_stats()}")
+
+        # Fill free slots lane by lane in fair-share order, until every lane is full or empty
+        empty: Set[str] = set()
+        while (lane := scheduler.next_lane(empty)) is not None:
+            # Take at most a weight's worth at a time, so busy lanes interleave
+            batch = min(scheduler.lane_free(lane), max(1, round(lane.weight)))
+            try:
+                jobs = await asyncio.to_thread(queue.dequeue, batch, lane.name)
+            except Exception as e:
+                logger.error(f"Could not take {lane.name} jobs from the claim queue: {e}")
+                jobs = []
+            if jobs:
+                scheduler.started(lane, len(jobs))
+                for job in jobs:
+                    start(lane, job)
+            if len(jobs) < batch:
+                empty.add(lane.name)
+
+        # Refill as soon as a claim finishes; poll for new jobs while lanes are empty
+        await asyncio.wait(
+            running | {stop_wait},
+            timeout=CLAIM_QUEUE_POLL_SECONDS if empty else CLAIM_QUEUE_RECOVER_SECONDS,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+
+    stop_wait.cancel()
+    if running:
+        logger.info(f"Waiting up to {CLAIM_WORKER_SHUTDOWN_GRACE:.0f}s for {len(running)} running claims")
+        await asyncio.wait(running, timeout=CLAIM_WORKER_SHUTDOWN_GRACE)
+        # Whatever is still running is picked up again once its lock lapses
+        for task in running:
+            task.cancel()
+    await close_clients()
+    logger.info(f"Claim worker {queue.worker_id} stopped")
+
+
+def worker_main(index: int, concurrency: int, lane_names: List[str]) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    asyncio.run(run_worker(index, concurrency, [LANES[name] for name in lane_names]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued claims")
+    parser.add_argument("--processes", type=int, default=CLAIM_WORKER_PROCESSES, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=CLAIM_WORKER_CONCURRENCY, help="Claims analyzed at once per process")
+    parser.add_argument("--lanes", default=",".join(LANES), help="Comma-separated lanes to process (fast, media, heavy)")
+    args = parser.parse_args()
+    lane_names = [name.strip() for name in args.lanes.split(",") if name.strip()]
+    unknown = [name for name in lane_names if name not in LANES]
+    if unknown or not lane_names:
+        parser.error(f"Unknown lanes {unknown}; choose from {', '.join(LANES)}")
+
+    if args.processes <= 1:
+        worker_main(0, args.concurrency, lane_names)
+        return
+
+    # Children get their own Supabase clients and event loops; nothing is shared across the fork
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=worker_main, args=(i, args.concurrency, lane_names), name=f"claim-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for proc in workers:
+        proc.start()
+
+    def forward(signum, frame):
+        for proc in workers:
+            if proc.is_alive():
+                proc.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C already reaches every child
+    for proc in workers:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
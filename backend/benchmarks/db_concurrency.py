@@ -0,0 +1,247 @@
+"""
+Backend read throughput against a slow database, by concurrency
+
+Starts a fake PostgREST (fixed latency per query) and the backend pointed at
+it, then drives the read endpoints (claim detail, search, browse, comments,
+public profile) at increasing concurrency and reports requests per second and
+latency percentiles at each level. With queries that block the event loop,
+throughput stays flat at about one query latency per request whatever the
+concurrency; with the async repository it grows with concurrency until the
+backend's CPU, the connection pool or the database becomes the limit. The fake,
+the backend and the load generator share the machine, so on few cores the
+backend runs out of CPU early.
+
+    cd backend
+    python -m benchmarks.db_concurrency --latency-ms 30 --concurrency 1,4,16,64
+
+--app-dir runs the backend from another checkout, to compare revisions.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import multiprocessing
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+from jose import jwt
+from fastapi import FastAPI, Request, Response
+
+NOW = datetime.now(timezone.utc).isoformat()
+USER_ID = str(uuid.uuid4())
+# Tokens are checked locally with this secret, so Supabase Auth is not part of the measurement
+JWT_SECRET = "benchmark-jwt-secret"
+
+
+def user_token() -> str:
+    claims = {"sub": USER_ID, "email": "bench@example.com", "aud": "authenticated", "exp": int(time.time()) + 3600}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+def _row(table: str) -> Dict:
+    """One plausible row per table, with the embedded resources the routers select."""
+    if table == "claims":
+        return {
+            "id": str(uuid.uuid4()), "user_id": USER_ID, "content": "Benchmark claim", "content_type": "text",
+            "original_url": None, "file_path": None, "status": "completed", "created_at": NOW, "updated_at": NOW,
+            "upvote_count": 0, "comment_count": 0, "claim_analyses": [], "claim_comments": [{"count": 0}],
+            "comments": [], "analysis": []
+        }
+    if table == "user_profiles":
+        return {"id": USER_ID, "email": "bench@example.com", "full_name": "Bench", "created_at": NOW}
+    if table == "claim_comments":
+        return {
+            "id": str(uuid.uuid4()), "claim_id": str(uuid.uuid4()), "user_id": USER_ID, "content": "Comment",
+            "upvotes": 0, "downvotes": 0, "is_expert_response": False, "parent_comment_id": None,
+            "created_at": NOW, "updated_at": NOW,
+            "user": {"id": USER_ID, "email": "bench@example.com", "created_at": NOW},
+            "claims": {"id": str(uuid.uuid4()), "content": "Benchmark claim"}
+        }
+    if table in ("claim_votes", "comment_votes"):
+        return {"comment_id": str(uuid.uuid4()), "claim_id": str(uuid.uuid4()), "user_id": USER_ID, "vote_type": "up"}
+    return {"claim_id": str(uuid.uuid4()), "verdict": "true", "confidence_score": 0.9}
+
+
+def create_fake_postgrest(latency_ms: float, counter: Dict[str, int]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/_queries")
+    async def queries():
+        return counter["queries"]
+
+    @app.api_route("/rest/v1/{path:path}", methods=["GET", "HEAD", "POST", "PATCH"])
+    async def postgrest(path: str, request: Request):
+        counter["queries"] += 1
+        await asyncio.sleep(latency_ms / 1000)
+        if path.startswith("rpc/"):
+            return Response(json.dumps({}), media_type="application/json")
+        count = 3 if request.method == "GET" else 1
+        if request.query_params.get("id", "").startswith("eq."):
+            count = 1
+        if "limit" in request.query_params:
+            count = min(count, int(request.query_params["limit"]))
+        rows = [_row(path) for _ in range(count)]
+        headers = {"Content-Range": f"0-{len(rows) - 1}/{len(rows)}"}
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            body = json.dumps(rows[0])
+        else:
+            body = json.dumps(rows)
+        if request.method == "HEAD":
+            return Response(headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    return app
+
+
+def _serve_fake_postgrest(latency_ms: float, port: int) -> None:
+    import uvicorn
+
+    uvicorn.run(create_fake_postgrest(latency_ms, {"queries": 0}), host="127.0.0.1", port=port, log_level="warning")
+
+
+class FakePostgrest:
+    """The fake in its own process, so it does not compete with the load generator for the GIL."""
+
+    def __init__(self, latency_ms: float, port: int):
+        self.base_url = f"http://127.0.0.1:{port}"
+        ctx = multiprocessing.get_context("spawn")
+        self._process = ctx.Process(target=_serve_fake_postgrest, args=(latency_ms, port), daemon=True)
+
+    def start(self) -> "FakePostgrest":
+        self._process.start()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                self.queries()
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        raise RuntimeError("Fake PostgREST failed to start")
+
+    def queries(self) -> int:
+        return httpx.get(f"{self.base_url}/_queries", timeout=5).json()
+
+    def stop(self) -> None:
+        self._process.terminate()
+        self._process.join(timeout=5)
+
+
+def start_backend(app_dir: str, port: int, supabase_url: str, verbose: bool = False) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": "benchmark",
+        "SUPABASE_SERVICE_KEY": "benchmark",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "AI_SERVICE_URL": "http://127.0.0.1:9",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env,
+        stdout=None if verbose else subprocess.DEVNULL, stderr=None if verbose else subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Backend failed to start")
+
+
+def endpoints() -> List[str]:
+    claim_id = uuid.uuid4()
+    return [
+        f"/api/v1/claims/{claim_id}",
+        "/api/v1/claims/?q=benchmark",
+        "/claims/browse?limit=20",
+        f"/api/v1/comments/{claim_id}",
+        f"/api/v1/users/{USER_ID}/profile",
+    ]
+
+
+async def run_level(base_url: str, concurrency: int, requests: int) -> Dict:
+    paths = endpoints()
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal next_index, errors
+        while next_index < requests:
+            path = paths[next_index % len(paths)]
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {user_token()}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend read throughput by concurrency against a slow fake database")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Latency of every fake PostgREST query")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    parser.add_argument("--app-dir", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), help="Backend directory to run")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the backend's logs")
+    args = parser.parse_args()
+
+    fake = FakePostgrest(args.latency_ms, args.port + 1).start()
+    backend = start_backend(args.app_dir, args.port, fake.base_url, args.verbose)
+    results = []
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(run_level(base_url, 1, 10))  # warm up
+        for level in [int(c) for c in args.concurrency.split(",")]:
+            queries_before = fake.queries()
+            result = asyncio.run(run_level(base_url, level, args.requests))
+            result["queries_per_request"] = round((fake.queries() - queries_before) / max(result["requests"], 1), 1)
+            results.append(result)
+            print(
+                f"concurrency {level:>3}: {result['rps']:>7} req/s  p50 {result['p50_ms']:>7} ms  "
+                f"p95 {result['p95_ms']:>7} ms  {result['queries_per_request']} queries/request  errors {result['errors']}"
+            )
+    finally:
+        backend.terminate()
+        backend.wait(timeout=10)
+        fake.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -159,4 +159,656 @@ CREATE POLICY "Users can change/delete their own votes." ON public.comment_votes
 -- Policies for rti_requests
 CREATE POLICY "Users can view their own RTI requests." ON public.rti_requests FOR SELECT USING (auth.uid() = user_id);
 CREATE POLICY "Users can create RTI requests." ON public.rti_requests FOR INSERT WITH CHECK (auth.uid() = user_id);
-CREATE POLICY "Users can update their own RTI requests." ON public.rti_requests FOR UPDATE USING (auth.uid() = user_id);
\ No newline at end of file
+CREATE POLICY "Users can update their own RTI requests." ON public.rti_requests FOR UPDATE USING (auth.uid() = user_id);
+
+-- 12. Knowledge Base (RAG)
+-- Articles and fact-checks searched by the AI service with pgvector.
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Partitioned by source_type, so verified fact-checks, web-search scrapes and auto-generated
+-- analyses are indexed and searched separately; the generated types are further split by
+-- quarter of created_at, so recency filters only search recent partitions.
+CREATE TABLE IF NOT EXISTS public.knowledge_base (
+    id uuid DEFAULT gen_random_uuid() NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    source_url TEXT,
+    source_type TEXT DEFAULT 'curated' NOT NULL,
+    verified BOOLEAN DEFAULT FALSE NOT NULL,
+    verdict verdict_type, -- Verdict of the claim a fact-check covers; votes in the AI service's fast path
+    claim_id TEXT, -- Claim whose analysis produced the row (auto-generated and fact-check); one fast-path vote per claim
+    embedding vector(384), -- sentence-transformers/all-MiniLM-L6-v2
+    embedded_text TEXT, -- Text the vectors were computed from when it is not "title content" (auto-generated rows use the claim); app.reembed re-encodes it
+    created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL, -- bumped when a near-duplicate analysis is merged in
+    retrieval_hits INTEGER DEFAULT 0 NOT NULL, -- times returned by match_articles; weighs eviction in compaction
+    last_retrieved_at TIMESTAMPTZ,
+    PRIMARY KEY (id, source_type, created_at) -- unique keys must include the partition keys
+) PARTITION BY LIST (source_type);
+COMMENT ON TABLE public.knowledge_base IS 'Knowledge base articles used for retrieval-augmented fact-checking.';
+-- Existing deployments created the table before verdicts were recorded
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS verdict verdict_type;
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS claim_id TEXT;
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS embedded_text TEXT;
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL;
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS retrieval_hits INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS last_retrieved_at TIMESTAMPTZ;
+
+-- Existing deployments have an unpartitioned table: set it aside (its rows are copied below)
+-- and create the partitioned table with the same columns
+DO $$
+DECLARE
+    index_name TEXT;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.knowledge_base'::regclass) THEN
+        ALTER TABLE public.knowledge_base RENAME TO knowledge_base_unpartitioned;
+        FOR index_name IN SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'knowledge_base_unpartitioned' LOOP
+            EXECUTE format('ALTER INDEX public.%I RENAME TO %I', index_name, left('unpartitioned_' || index_name, 63));
+        END LOOP;
+        UPDATE public.knowledge_base_unpartitioned SET source_type = 'curated' WHERE source_type IS NULL;
+        CREATE TABLE public.knowledge_base (LIKE public.knowledge_base_unpartitioned INCLUDING DEFAULTS) PARTITION BY LIST (source_type);
+        ALTER TABLE public.knowledge_base ALTER COLUMN source_type SET DEFAULT 'curated', ALTER COLUMN source_type SET NOT NULL;
+        ALTER TABLE public.knowledge_base ADD PRIMARY KEY (id, source_type, created_at);
+        COMMENT ON TABLE public.knowledge_base IS 'Knowledge base articles used for retrieval-augmented fact-checking.';
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.knowledge_base_fact_check PARTITION OF public.knowledge_base FOR VALUES IN ('fact-check') PARTITION BY RANGE (created_at);
+CREATE TABLE IF NOT EXISTS public.knowledge_base_fact_check_default PARTITION OF public.knowledge_base_fact_check DEFAULT;
+CREATE TABLE IF NOT EXISTS public.knowledge_base_auto_generated PARTITION OF public.knowledge_base FOR VALUES IN ('auto-generated') PARTITION BY RANGE (created_at);
+CREATE TABLE IF NOT EXISTS public.knowledge_base_auto_generated_default PARTITION OF public.knowledge_base_auto_generated DEFAULT;
+CREATE TABLE IF NOT EXISTS public.knowledge_base_web_search PARTITION OF public.knowledge_base FOR VALUES IN ('web_search') PARTITION BY RANGE (created_at);
+CREATE TABLE IF NOT EXISTS public.knowledge_base_web_search_default PARTITION OF public.knowledge_base_web_search DEFAULT;
+-- Curated articles and any other source type
+CREATE TABLE IF NOT EXISTS public.knowledge_base_curated PARTITION OF public.knowledge_base DEFAULT;
+-- Partitions are reachable through the API directly, so deny everything on them; reads go through the parent's policy
+ALTER TABLE public.knowledge_base_fact_check_default ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.knowledge_base_auto_generated_default ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.knowledge_base_web_search_default ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.knowledge_base_curated ENABLE ROW LEVEL SECURITY;
+
+-- Quarterly partitions for the time-split source types, from the quarter of `since` to
+-- quarters_ahead quarters past the current one. Rows outside them land in the _default
+-- partitions, and a quarter cannot be added once its default partition holds rows for it,
+-- so this runs ahead of time (the AI service's app.kb_maintenance calls it). Returns the
+-- number of partitions created.
+CREATE OR REPLACE FUNCTION public.ensure_knowledge_base_partitions(since timestamptz DEFAULT NOW(), quarters_ahead int DEFAULT 2)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    parent TEXT;
+    bucket timestamptz;
+    partition_name TEXT;
+    created integer := 0;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['knowledge_base_fact_check', 'knowledge_base_auto_generated', 'knowledge_base_web_search'] LOOP
+        bucket := date_trunc('quarter', since);
+        WHILE bucket <= date_trunc('quarter', NOW()) + make_interval(months => 3 * quarters_ahead) LOOP
+            partition_name := format('%s_%s_q%s', parent, extract(year FROM bucket)::int, extract(quarter FROM bucket)::int);
+            IF to_regclass('public.' || partition_name) IS NULL THEN
+                EXECUTE format('CREATE TABLE public.%I PARTITION OF public.%I FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, parent, bucket, bucket + interval '3 months');
+                EXECUTE format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', partition_name);
+                created := created + 1;
+            END IF;
+            bucket := bucket + interval '3 months';
+        END LOOP;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+REVOKE EXECUTE ON FUNCTION public.ensure_knowledge_base_partitions(timestamptz, int) FROM PUBLIC, anon, authenticated;
+SELECT public.ensure_knowledge_base_partitions();
+
+-- Copy the rows of an unpartitioned table set aside above; indexes are built after, in bulk
+DO $$
+BEGIN
+    IF to_regclass('public.knowledge_base_unpartitioned') IS NOT NULL THEN
+        PERFORM public.ensure_knowledge_base_partitions((SELECT coalesce(min(created_at), NOW()) FROM public.knowledge_base_unpartitioned));
+        INSERT INTO public.knowledge_base SELECT * FROM public.knowledge_base_unpartitioned;
+        DROP TABLE public.knowledge_base_unpartitioned;
+    END IF;
+END;
+$$;
+
+-- Fact-checks written before claim_id was recorded link to their claim in source_url
+UPDATE public.knowledge_base SET claim_id = substring(source_url FROM '/claims/([^/?#]+)$')
+WHERE source_type = 'fact-check' AND claim_id IS NULL AND source_url ~ '/claims/[^/?#]+$';
+
+-- Indexes on the parent are created on every partition, present and future
+CREATE INDEX IF NOT EXISTS knowledge_base_source_type_created_at_idx ON public.knowledge_base (source_type, created_at DESC);
+-- Approximate nearest-neighbour index for match_articles; kept small by the AI service's compaction job
+CREATE INDEX IF NOT EXISTS knowledge_base_embedding_idx ON public.knowledge_base USING hnsw (embedding vector_cosine_ops);
+-- Optional compact indexes for the AI service's KB_VECTOR_SEARCH=halfvec (float16, half the memory)
+-- or binary (1 bit per dimension); match_articles rescores their candidates with the full vectors.
+-- The full-precision index can then be dropped. (On a live table, build each partition's index
+-- CONCURRENTLY and ATTACH it to an index created ON ONLY the parent.)
+--   CREATE INDEX knowledge_base_embedding_half_idx ON public.knowledge_base USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops);
+--   CREATE INDEX knowledge_base_embedding_bit_idx ON public.knowledge_base USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops);
+-- Only content changes count as updates; retrieval-hit bookkeeping leaves updated_at alone
+DROP TRIGGER IF EXISTS on_knowledge_base_update ON public.knowledge_base;
+CREATE TRIGGER on_knowledge_base_update BEFORE UPDATE OF title, content, verified, verdict, embedding ON public.knowledge_base FOR EACH ROW EXECUTE PROCEDURE public.handle_updated_at();
+ALTER TABLE public.knowledge_base ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Anyone can read the knowledge base." ON public.knowledge_base;
+CREATE POLICY "Anyone can read the knowledge base." ON public.knowledge_base FOR SELECT USING (true);
+-- Articles are only written by the AI service with the service role key.
+
+-- Which knowledge_base column holds which embedding model's vectors. The AI service's
+-- app.reembed builds embedding_next for a new model while services dual-write it, then
+-- swaps it in; the replaced vectors stay in embedding_prev until retired.
+CREATE TABLE IF NOT EXISTS public.knowledge_base_embedding_models (
+    column_name TEXT PRIMARY KEY CHECK (column_name IN ('embedding', 'embedding_next', 'embedding_prev')),
+    model TEXT NOT NULL UNIQUE,
+    dimensions INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL
+);
+COMMENT ON TABLE public.knowledge_base_embedding_models IS 'Embedding model per knowledge_base vector column.';
+INSERT INTO public.knowledge_base_embedding_models (column_name, model, dimensions)
+VALUES ('embedding', 'sentence-transformers/all-MiniLM-L6-v2', 384)
+ON CONFLICT DO NOTHING;
+ALTER TABLE public.knowledge_base_embedding_models ENABLE ROW LEVEL SECURITY;
+-- Only read and written with the service role key.
+
+-- Similarity search used by the AI service's RAG system. query_model selects the
+-- column holding that model's vectors, so services on the old and the new model
+-- both get comparable vectors during a cutover; without it the active column is used.
+-- search_mode 'halfvec' or 'binary' takes candidate_count candidates from the compact
+-- index (by default 4x or 10x match_count) and ranks them by exact cosine similarity.
+-- source_types and since restrict the search to the matching partitions; verified_only
+-- skips unverified articles.
+DROP FUNCTION IF EXISTS public.match_articles(vector, float, int);
+DROP FUNCTION IF EXISTS public.match_articles(vector, float, int, text);
+DROP FUNCTION IF EXISTS public.match_articles(vector, float, int, text, text, int);
+-- Its result gained claim_id, which CREATE OR REPLACE cannot add
+DROP FUNCTION IF EXISTS public.match_articles(vector, float, int, text, text, int, text[], timestamptz, boolean);
+CREATE OR REPLACE FUNCTION public.match_articles(
+    query_embedding vector,
+    match_threshold float,
+    match_count int,
+    query_model text DEFAULT NULL,
+    search_mode text DEFAULT 'exact',
+    candidate_count int DEFAULT NULL,
+    source_types text[] DEFAULT NULL,
+    since timestamptz DEFAULT NULL,
+    verified_only boolean DEFAULT false
+)
+RETURNS TABLE (
+    id uuid,
+    title TEXT,
+    content TEXT,
+    source_url TEXT,
+    source_type TEXT,
+    verified BOOLEAN,
+    verdict verdict_type,
+    claim_id TEXT,
+    similarity float
+)
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+    target TEXT := 'embedding';
+    dims INTEGER;
+    candidates TEXT;
+    fetched INTEGER;
+    filters TEXT := '';
+BEGIN
+    IF query_model IS NOT NULL THEN
+        SELECT m.column_name, m.dimensions INTO target, dims FROM public.knowledge_base_embedding_models m WHERE m.model = query_model;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'No knowledge_base column holds % embeddings', query_model;
+        END IF;
+    ELSE
+        SELECT m.dimensions INTO dims FROM public.knowledge_base_embedding_models m WHERE m.column_name = target;
+    END IF;
+    -- Added only when set, so the planner can prune partitions by them
+    IF source_types IS NOT NULL THEN
+        filters := filters || ' AND kb.source_type = ANY($5)';
+    END IF;
+    IF since IS NOT NULL THEN
+        filters := filters || ' AND kb.created_at >= $6';
+    END IF;
+    IF verified_only THEN
+        filters := filters || ' AND kb.verified';
+    END IF;
+
+    IF search_mode = 'exact' THEN
+        RETURN QUERY EXECUTE format(
+            'SELECT kb.id, kb.title, kb.content, kb.source_url, kb.source_type, kb.verified, kb.verdict, kb.claim_id,
+                    1 - (kb.%1$I <=> $1) AS similarity
+             FROM public.knowledge_base kb
+             WHERE 1 - (kb.%1$I <=> $1) > $2 %2$s
+             ORDER BY kb.%1$I <=> $1
+             LIMIT $3', target, filters)
+        USING query_embedding, match_threshold, match_count, NULL::int, source_types, since;
+        RETURN;
+    END IF;
+
+    -- The ORDER BY expressions match the compact index definitions, so the index is used
+    IF search_mode = 'halfvec' THEN
+        fetched := coalesce(candidate_count, match_count * 4);
+        candidates := format('SELECT kb.id FROM public.knowledge_base kb WHERE true %3$s ORDER BY kb.%1$I::halfvec(%2$s) <=> $1::halfvec(%2$s) LIMIT $4', target, dims, filters);
+    ELSIF search_mode = 'binary' THEN
+        fetched := coalesce(candidate_count, match_count * 10);
+        candidates := format('SELECT kb.id FROM public.knowledge_base kb WHERE true %3$s ORDER BY binary_quantize(kb.%1$I)::bit(%2$s) <~> binary_quantize($1) LIMIT $4', target, dims, filters);
+    ELSE
+        RAISE EXCEPTION 'Unknown search_mode %', search_mode;
+    END IF;
+    -- HNSW returns at most ef_search rows per scan
+    PERFORM set_config('hnsw.ef_search', greatest(40, fetched)::text, true);
+    RETURN QUERY EXECUTE format(
+        'SELECT kb.id, kb.title, kb.content, kb.source_url, kb.source_type, kb.verified, kb.verdict, kb.claim_id,
+                1 - (kb.%1$I <=> $1) AS similarity
+         FROM public.knowledge_base kb
+         WHERE kb.id IN (%2$s) AND 1 - (kb.%1$I <=> $1) > $2 %3$s
+         ORDER BY kb.%1$I <=> $1
+         LIMIT $3', target, candidates, filters)
+    USING query_embedding, match_threshold, match_count, fetched, source_types, since;
+END;
+$$;
+
+-- match_articles with a partition hint, in one call: searches only the preferred filters
+-- (prefer_*) first, and the full filters only if those return fewer than match_count rows,
+-- to fill the remaining slots after the preferred matches.
+CREATE OR REPLACE FUNCTION public.match_articles_preferred(
+    query_embedding vector,
+    match_threshold float,
+    match_count int,
+    query_model text DEFAULT NULL,
+    search_mode text DEFAULT 'exact',
+    candidate_count int DEFAULT NULL,
+    source_types text[] DEFAULT NULL,
+    since timestamptz DEFAULT NULL,
+    verified_only boolean DEFAULT false,
+    prefer_source_types text[] DEFAULT NULL,
+    prefer_since timestamptz DEFAULT NULL,
+    prefer_verified_only boolean DEFAULT false
+)
+RETURNS TABLE (
+    id uuid,
+    title TEXT,
+    content TEXT,
+    source_url TEXT,
+    source_type TEXT,
+    verified BOOLEAN,
+    verdict verdict_type,
+    claim_id TEXT,
+    similarity float
+)
+LANGUAGE sql STABLE AS $$
+    WITH preferred AS MATERIALIZED (
+        SELECT * FROM public.match_articles(
+            query_embedding, match_threshold, match_count, query_model, search_mode, candidate_count,
+            prefer_source_types, prefer_since, prefer_verified_only)
+    ),
+    -- The count does not depend on the row, so the full search is skipped once and for all when it fails
+    rest AS (
+        SELECT r.* FROM public.match_articles(
+            query_embedding, match_threshold, match_count, query_model, search_mode, candidate_count,
+            source_types, since, verified_only) r
+        WHERE (SELECT count(*) FROM preferred) < match_count
+    )
+    SELECT m.id, m.title, m.content, m.source_url, m.source_type, m.verified, m.verdict, m.claim_id, m.similarity
+    FROM (
+        SELECT p.*, 0 AS tier FROM preferred p
+        UNION ALL
+        SELECT r.*, 1 AS tier FROM rest r WHERE r.id NOT IN (SELECT p.id FROM preferred p)
+    ) m
+    ORDER BY m.tier, m.similarity DESC
+    LIMIT match_count;
+$$;
+
+-- Adds retrieval hits batched by the AI service (one call per flush, not per search)
+CREATE OR REPLACE FUNCTION public.record_article_hits(article_ids uuid[], hit_counts int[])
+RETURNS void
+LANGUAGE sql AS $$
+    UPDATE public.knowledge_base kb
+    SET retrieval_hits = kb.retrieval_hits + h.hits, last_retrieved_at = NOW()
+    FROM unnest(article_ids, hit_counts) AS h(id, hits)
+    WHERE kb.id = h.id;
+$$;
+REVOKE EXECUTE ON FUNCTION public.record_article_hits(uuid[], int[]) FROM PUBLIC, anon, authenticated;
+
+-- Re-embedding (AI service app.reembed). Adds an empty embedding_next column for the new
+-- model; it is indexed while empty so backfilled rows are indexed as they are written
+-- instead of locking writes for a bulk index build. Calling it again for the same model resumes.
+CREATE OR REPLACE FUNCTION public.begin_embedding_migration(new_model text, new_dimensions int)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM public.knowledge_base_embedding_models WHERE model = new_model AND column_name = 'embedding_next') THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM public.knowledge_base_embedding_models WHERE model = new_model) THEN
+        RAISE EXCEPTION 'knowledge_base already holds % embeddings', new_model;
+    END IF;
+    DELETE FROM public.knowledge_base_embedding_models WHERE column_name = 'embedding_next';
+    ALTER TABLE public.knowledge_base DROP COLUMN IF EXISTS embedding_next;
+    EXECUTE format('ALTER TABLE public.knowledge_base ADD COLUMN embedding_next vector(%s)', new_dimensions);
+    CREATE INDEX knowledge_base_embedding_next_idx ON public.knowledge_base USING hnsw (embedding_next vector_cosine_ops);
+    -- Mirror whichever compact indexes the current column has
+    IF to_regclass('public.knowledge_base_embedding_half_idx') IS NOT NULL THEN
+        EXECUTE format('CREATE INDEX knowledge_base_embedding_next_half_idx ON public.knowledge_base USING hnsw ((embedding_next::halfvec(%s)) halfvec_cosine_ops)', new_dimensions);
+    END IF;
+    IF to_regclass('public.knowledge_base_embedding_bit_idx') IS NOT NULL THEN
+        EXECUTE format('CREATE INDEX knowledge_base_embedding_next_bit_idx ON public.knowledge_base USING hnsw ((binary_quantize(embedding_next)::bit(%s)) bit_hamming_ops)', new_dimensions);
+    END IF;
+    INSERT INTO public.knowledge_base_embedding_models (column_name, model, dimensions)
+    VALUES ('embedding_next', new_model, new_dimensions);
+END;
+$$;
+
+-- Writes a batch of vectors ("[...]" text) into one embedding column
+CREATE OR REPLACE FUNCTION public.store_article_embeddings(target_column text, article_ids uuid[], embeddings text[])
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    updated integer;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.knowledge_base_embedding_models WHERE column_name = target_column) THEN
+        RAISE EXCEPTION 'Unknown embedding column %', target_column;
+    END IF;
+    EXECUTE format(
+        'UPDATE public.knowledge_base kb SET %I = e.embedding::vector
+         FROM unnest($1, $2) AS e(id, embedding) WHERE kb.id = e.id', target_column)
+    USING article_ids, embeddings;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
+
+-- Swaps embedding_next in as embedding in one transaction, keeping the replaced vectors
+-- as embedding_prev. Returns the number of rows still missing a new vector (and changes
+-- nothing) if the backfill has not caught up; 0 once switched.
+CREATE OR REPLACE FUNCTION public.complete_embedding_migration(new_model text)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    missing integer;
+    suffix TEXT;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.knowledge_base_embedding_models WHERE model = new_model AND column_name = 'embedding_next') THEN
+        RAISE EXCEPTION 'No migration to % in progress', new_model;
+    END IF;
+    -- Blocks writes, not reads, so no row can be added without its new vector before the swap
+    LOCK TABLE public.knowledge_base IN SHARE ROW EXCLUSIVE MODE;
+    SELECT count(*) INTO missing FROM public.knowledge_base WHERE embedding_next IS NULL;
+    IF missing > 0 THEN
+        RETURN missing;
+    END IF;
+
+    ALTER TABLE public.knowledge_base DROP COLUMN IF EXISTS embedding_prev;
+    DELETE FROM public.knowledge_base_embedding_models WHERE column_name = 'embedding_prev';
+    ALTER TABLE public.knowledge_base RENAME COLUMN embedding TO embedding_prev;
+    ALTER TABLE public.knowledge_base RENAME COLUMN embedding_next TO embedding;
+    FOREACH suffix IN ARRAY ARRAY['', '_half', '_bit'] LOOP
+        EXECUTE format('ALTER INDEX IF EXISTS public.%I RENAME TO %I', 'knowledge_base_embedding' || suffix || '_idx', 'knowledge_base_embedding_prev' || suffix || '_idx');
+        EXECUTE format('ALTER INDEX IF EXISTS public.%I RENAME TO %I', 'knowledge_base_embedding_next' || suffix || '_idx', 'knowledge_base_embedding' || suffix || '_idx');
+    END LOOP;
+    UPDATE public.knowledge_base_embedding_models SET column_name = 'embedding_prev', updated_at = NOW() WHERE column_name = 'embedding';
+    UPDATE public.knowledge_base_embedding_models SET column_name = 'embedding', updated_at = NOW() WHERE column_name = 'embedding_next';
+    -- Column triggers follow the renamed column, so point the updated_at trigger at the new one
+    DROP TRIGGER IF EXISTS on_knowledge_base_update ON public.knowledge_base;
+    CREATE TRIGGER on_knowledge_base_update BEFORE UPDATE OF title, content, verified, verdict, embedding ON public.knowledge_base FOR EACH ROW EXECUTE PROCEDURE public.handle_updated_at();
+    RETURN 0;
+END;
+$$;
+
+-- Drops the replaced vectors once no service queries with the previous model
+CREATE OR REPLACE FUNCTION public.retire_previous_embedding()
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    ALTER TABLE public.knowledge_base DROP COLUMN IF EXISTS embedding_prev;
+    DELETE FROM public.knowledge_base_embedding_models WHERE column_name = 'embedding_prev';
+END;
+$$;
+REVOKE EXECUTE ON FUNCTION public.begin_embedding_migration(text, int) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.store_article_embeddings(text, uuid[], text[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_embedding_migration(text) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.retire_previous_embedding() FROM PUBLIC, anon, authenticated;
+
+-- 13. Claim Processing Queue
+-- Durable jobs for the backend's claim workers (backend app.worker). One job per claim;
+-- workers take jobs with dequeue_claim_jobs, hold them for a visibility timeout that they
+-- extend while working, and either complete them or schedule a retry with backoff. A job
+-- whose worker died becomes visible again when its timeout lapses.
+-- Jobs are split into lanes by expected cost (text and URLs, images, video or large files);
+-- workers give each lane its own slots so cheap claims never wait behind expensive ones.
+CREATE TABLE IF NOT EXISTS public.claim_jobs (
+    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    claim_id uuid NOT NULL UNIQUE REFERENCES public.claims(id) ON DELETE CASCADE,
+    lane TEXT DEFAULT 'fast' NOT NULL, -- 'fast', 'media' or 'heavy' (backend job_queue.classify_lane)
+    status TEXT DEFAULT 'queued' NOT NULL CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER DEFAULT 0 NOT NULL,
+    max_attempts INTEGER DEFAULT 5 NOT NULL,
+    run_after TIMESTAMPTZ DEFAULT NOW() NOT NULL, -- not taken before this (retry backoff)
+    locked_by TEXT,
+    locked_until TIMESTAMPTZ, -- visibility timeout of a running job
+    last_error TEXT,
+    enqueued_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
+    started_at TIMESTAMPTZ, -- start of the latest attempt
+    finished_at TIMESTAMPTZ
+);
+COMMENT ON TABLE public.claim_jobs IS 'Claim analysis jobs processed by the backend workers.';
+
+-- Lane of a claim from its content type alone, for jobs queued without a file size
+CREATE OR REPLACE FUNCTION public.claim_job_lane(ct content_type)
+RETURNS text
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE ct WHEN 'video' THEN 'heavy' WHEN 'image' THEN 'media' ELSE 'fast' END;
+$$;
+
+-- Existing queues: add the lane column and classify the jobs already in it
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'claim_jobs' AND column_name = 'lane'
+    ) THEN
+        ALTER TABLE public.claim_jobs ADD COLUMN lane TEXT DEFAULT 'fast' NOT NULL;
+        UPDATE public.claim_jobs j SET lane = public.claim_job_lane(c.content_type)
+        FROM public.claims c WHERE c.id = j.claim_id;
+    END IF;
+END;
+$$;
+
+-- Only jobs that can be taken are indexed, so the index stays small however many are done
+DROP INDEX IF EXISTS public.claim_jobs_ready_idx;
+CREATE INDEX IF NOT EXISTS claim_jobs_lane_ready_idx ON public.claim_jobs (lane, run_after) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS claim_jobs_running_idx ON public.claim_jobs (locked_until) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS claim_jobs_finished_at_idx ON public.claim_jobs (finished_at) WHERE finished_at IS NOT NULL;
+-- Only read and written with the service role key.
+ALTER TABLE public.claim_jobs ENABLE ROW LEVEL SECURITY;
+
+DROP FUNCTION IF EXISTS public.enqueue_claim_job(uuid, int);
+DROP FUNCTION IF EXISTS public.dequeue_claim_jobs(text, int, int);
+DROP FUNCTION IF EXISTS public.claim_job_stats(int);
+
+-- Queues a claim on job_lane (by default the lane of its content type); a claim that
+-- already has a job keeps it
+CREATE OR REPLACE FUNCTION public.enqueue_claim_job(job_claim_id uuid, job_max_attempts int DEFAULT 5, job_lane text DEFAULT NULL)
+RETURNS bigint
+LANGUAGE sql AS $$
+    INSERT INTO public.claim_jobs (claim_id, max_attempts, lane)
+    SELECT job_claim_id, job_max_attempts, coalesce(job_lane, public.claim_job_lane(c.content_type))
+    FROM public.claims c WHERE c.id = job_claim_id
+    ON CONFLICT (claim_id) DO UPDATE SET claim_id = EXCLUDED.claim_id
+    RETURNING id;
+$$;
+
+-- Takes up to batch_size jobs of job_lane (any lane if NULL) that are due, or running with
+-- a lapsed visibility timeout, oldest first. SKIP LOCKED lets concurrent workers take
+-- disjoint jobs without waiting.
+CREATE OR REPLACE FUNCTION public.dequeue_claim_jobs(worker text, batch_size int, visibility_seconds int, job_lane text DEFAULT NULL)
+RETURNS SETOF public.claim_jobs
+LANGUAGE sql AS $$
+    UPDATE public.claim_jobs j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = worker,
+        locked_until = NOW() + make_interval(secs => visibility_seconds),
+        started_at = NOW()
+    WHERE j.id IN (
+        SELECT id FROM public.claim_jobs
+        WHERE ((status = 'queued' AND run_after <= NOW())
+            OR (status = 'running' AND locked_until < NOW() AND attempts < max_attempts))
+          AND (job_lane IS NULL OR lane = job_lane)
+        ORDER BY run_after
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*;
+$$;
+
+-- Heartbeat: keeps a running job invisible to other workers. False if the job is no
+-- longer held by this worker (its timeout lapsed and another worker took it).
+CREATE OR REPLACE FUNCTION public.extend_claim_job(job_id bigint, worker text, visibility_seconds int)
+RETURNS boolean
+LANGUAGE sql AS $$
+    WITH extended AS (
+        UPDATE public.claim_jobs SET locked_until = NOW() + make_interval(secs => visibility_seconds)
+        WHERE id = job_id AND locked_by = worker AND status = 'running'
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM extended);
+$$;
+
+CREATE OR REPLACE FUNCTION public.complete_claim_job(job_id bigint, worker text)
+RETURNS boolean
+LANGUAGE sql AS $$
+    WITH completed AS (
+        UPDATE public.claim_jobs
+        SET status = 'done', finished_at = NOW(), locked_by = NULL, locked_until = NULL, last_error = NULL
+        WHERE id = job_id AND locked_by = worker
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM completed);
+$$;
+
+-- Records a failed attempt: requeues the job after delay_seconds, or fails it for good
+-- once it has used max_attempts (or at once with give_up, for errors a retry cannot fix).
+-- Returns the job's new status ('queued' or 'failed').
+CREATE OR REPLACE FUNCTION public.retry_claim_job(job_id bigint, worker text, error text, delay_seconds float, give_up boolean DEFAULT false)
+RETURNS text
+LANGUAGE sql AS $$
+    UPDATE public.claim_jobs
+    SET status = CASE WHEN give_up OR attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+        run_after = NOW() + make_interval(secs => delay_seconds),
+        finished_at = CASE WHEN give_up OR attempts >= max_attempts THEN NOW() END,
+        locked_by = NULL,
+        locked_until = NULL,
+        last_error = left(error, 2000)
+    WHERE id = job_id AND locked_by = worker
+    RETURNING status;
+$$;
+
+-- Stuck-job recovery, run periodically by one worker:
+-- * running jobs whose timeout lapsed on their last attempt are failed, with their claim;
+-- * claims left pending or processing for stale_seconds whose job finished take its
+--   outcome (the worker's own status update was lost); they are not analyzed again;
+-- * such claims without any job (submitted before the queue existed, or lost between
+--   insert and enqueue) are queued.
+-- Returns the number of jobs failed, claims synced from their job and claims queued.
+-- Its result gained synced, which CREATE OR REPLACE cannot add
+DROP FUNCTION IF EXISTS public.recover_claim_jobs(int, int);
+CREATE OR REPLACE FUNCTION public.recover_claim_jobs(stale_seconds int, job_max_attempts int DEFAULT 5)
+RETURNS TABLE (failed integer, synced integer, requeued integer)
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH exhausted AS (
+        UPDATE public.claim_jobs
+        SET status = 'failed', finished_at = NOW(), locked_by = NULL, locked_until = NULL,
+            last_error = coalesce(last_error, 'Visibility timeout lapsed on the last attempt')
+        WHERE status = 'running' AND locked_until < NOW() AND attempts >= max_attempts
+        RETURNING claim_id
+    ), failed_claims AS (
+        UPDATE public.claims c SET status = 'failed' FROM exhausted e WHERE c.id = e.claim_id
+        RETURNING 1
+    )
+    SELECT count(*)::int INTO failed FROM exhausted;
+
+    -- A claim whose job finished but whose own status update was lost takes the job's
+    -- outcome; only claims that never got a job are queued
+    WITH stale AS (
+        SELECT c.id, c.content_type, j.status AS job_status FROM public.claims c
+        LEFT JOIN public.claim_jobs j ON j.claim_id = c.id
+        WHERE c.status IN ('pending', 'processing')
+          AND c.updated_at < NOW() - make_interval(secs => stale_seconds)
+          AND (j.id IS NULL OR j.status IN ('done', 'failed'))
+    ), synced_claims AS (
+        UPDATE public.claims c
+        SET status = (CASE s.job_status WHEN 'done' THEN 'completed' ELSE 'failed' END)::claim_status
+        FROM stale s WHERE c.id = s.id AND s.job_status IS NOT NULL
+        RETURNING 1
+    ), queued AS (
+        INSERT INTO public.claim_jobs (claim_id, max_attempts, lane)
+        SELECT id, job_max_attempts, public.claim_job_lane(content_type) FROM stale WHERE job_status IS NULL
+        ON CONFLICT (claim_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT count(*)::int FROM synced_claims), (SELECT count(*)::int FROM queued) INTO synced, requeued;
+    RETURN NEXT;
+END;
+$$;
+
+-- Queue depth and latency for metrics, overall and per lane: jobs per status, age of the
+-- oldest due job, and wait (enqueue to start of the last attempt) and turnaround (enqueue
+-- to finish) percentiles of the jobs finished within the last window_seconds. lane_slo maps
+-- lanes to a turnaround target in seconds; within_slo is the share of a lane's finished
+-- jobs that completed within it.
+CREATE OR REPLACE FUNCTION public.claim_job_stats(window_seconds int DEFAULT 3600, lane_slo jsonb DEFAULT '{}'::jsonb)
+RETURNS jsonb
+LANGUAGE sql STABLE AS $$
+    WITH jobs AS (
+        SELECT lane, status, attempts,
+               status = 'queued' AND run_after <= NOW() AS due,
+               enqueued_at,
+               finished_at > NOW() - make_interval(secs => window_seconds) AS recent,
+               extract(epoch FROM started_at - enqueued_at) AS wait,
+               extract(epoch FROM finished_at - enqueued_at) AS turnaround
+        FROM public.claim_jobs
+        WHERE status IN ('queued', 'running') OR finished_at > NOW() - make_interval(secs => window_seconds)
+    ), per_lane AS (
+        SELECT lane, jsonb_build_object(
+            'queued', count(*) FILTER (WHERE status = 'queued'),
+            'running', count(*) FILTER (WHERE status = 'running'),
+            'due', count(*) FILTER (WHERE due),
+            'oldest_due_seconds', coalesce(extract(epoch FROM NOW() - min(enqueued_at) FILTER (WHERE due)), 0),
+            'done', count(*) FILTER (WHERE recent AND status = 'done'),
+            'failed', count(*) FILTER (WHERE recent AND status = 'failed'),
+            'retried', count(*) FILTER (WHERE recent AND attempts > 1),
+            'wait_p50_seconds', percentile_cont(0.5) WITHIN GROUP (ORDER BY wait) FILTER (WHERE recent),
+            'wait_p95_seconds', percentile_cont(0.95) WITHIN GROUP (ORDER BY wait) FILTER (WHERE recent),
+            'turnaround_p50_seconds', percentile_cont(0.5) WITHIN GROUP (ORDER BY turnaround) FILTER (WHERE recent),
+            'turnaround_p95_seconds', percentile_cont(0.95) WITHIN GROUP (ORDER BY turnaround) FILTER (WHERE recent),
+            'slo_seconds', (lane_slo ->> lane)::float,
+            'within_slo', count(*) FILTER (WHERE recent AND status = 'done' AND turnaround <= (lane_slo ->> lane)::float)::float
+                          / nullif(count(*) FILTER (WHERE recent), 0)
+        ) AS stats
+        FROM jobs GROUP BY lane
+    )
+    SELECT jsonb_build_object(
+        'depth', jsonb_build_object(
+            'queued', (SELECT count(*) FROM jobs WHERE status = 'queued'),
+            'running', (SELECT count(*) FROM jobs WHERE status = 'running')),
+        'due', (SELECT count(*) FROM jobs WHERE due),
+        'oldest_due_seconds', (SELECT coalesce(extract(epoch FROM NOW() - min(enqueued_at)), 0) FROM jobs WHERE due),
+        'finished', (SELECT jsonb_build_object(
+                         'done', count(*) FILTER (WHERE status = 'done'),
+                         'failed', count(*) FILTER (WHERE status = 'failed'),
+                         'retried', count(*) FILTER (WHERE attempts > 1),
+                         'wait_p50_seconds', percentile_cont(0.5) WITHIN GROUP (ORDER BY wait),
+                         'wait_p95_seconds', percentile_cont(0.95) WITHIN GROUP (ORDER BY wait),
+                         'turnaround_p50_seconds', percentile_cont(0.5) WITHIN GROUP (ORDER BY turnaround),
+                         'turnaround_p95_seconds', percentile_cont(0.95) WITHIN GROUP (ORDER BY turnaround))
+                     FROM jobs WHERE recent),
+        'lanes', (SELECT coalesce(jsonb_object_agg(lane, stats), '{}'::jsonb) FROM per_lane)
+    );
+$$;
+REVOKE EXECUTE ON FUNCTION public.enqueue_claim_job(uuid, int, text) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.dequeue_claim_jobs(text, int, int, text) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.extend_claim_job(bigint, text, int) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_claim_job(bigint, text) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.retry_claim_job(bigint, text, text, float, boolean) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.recover_claim_jobs(int, int) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_job_stats(int, jsonb) FROM PUBLIC, anon, authenticated;